@@ -1,16 +1,36 @@
-from typing import List, Tuple
+import io
+import os
+import gzip
+import multiprocessing
+import json
+import time
+import threading
+import functools
+import inspect
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from fractions import Fraction
+from typing import List, Optional, Tuple
 from psycopg2 import sql
 from datetime import date, datetime
+from decimal import Decimal
 import Utility.DBConnector as Connector
 from Utility.ReturnValue import ReturnValue
 from Utility.Exceptions import DatabaseException
+from Utility.Scheduler import AdmissionScheduler
+from Utility.Retry import RetryPolicy
+from Utility.ResultCache import ResultCache
+from Utility.Backend import Backend, PAGE_SIZE, MENU_SYNC_COUNTS, DELETE_BATCH_SIZE
+from Utility.ColumnarSnapshot import ColumnarSnapshot
+from Utility.ChangeListener import ChangeListener, FLUSH_PAYLOAD
+from Utility.RecommendationJob import similarity_components, component_recommendations
+from Utility.WriteBehindBuffer import WriteBehindBuffer
+from Utility.HeavyHitters import SlidingHeavyHitters
 from Business.Customer import Customer, BadCustomer
 from Business.Order import Order, BadOrder
 from Business.Dish import Dish, BadDish
 from Business.OrderDish import OrderDish
 
-DEBUG_FLAG = False
-
 # ---------------------------- Tables Declarations: -----------------------------
 CUSTOMER_TABLE = '''
 Customers
@@ -158,15 +178,974 @@ VIEWS = [ORDER_TOTAL_PRICE_VIEW, CUSTOMER_AVG_SPENDING_VIEW, DISHES_ORDERED_AMOU
 Views_Names = ['Order_Total_Price_View', 'Customer_Avg_Spending_View', 'Dishes_Ordered_Amount_View', 'Dish_Avg_Rating_View', 'Customer_Ordered_Dishes_View', 'Avg_Profit_Per_Order', 'Monthly_Profit_View', 'SimilarRelation']
 
 
+# ---------------------------- Derived Tables Declarations: -----------------------------
+# Aggregates kept current by triggers on the tables they are computed from, so the heavy queries read them
+# instead of re-aggregating every row. DERIVED holds the statements creating them (and their triggers),
+# REBUILD_DERIVED recomputes them from scratch (after a bulk load that ran with the triggers disabled).
+
+# get_customers_spent_max_avg_amount_money
+#   One row per customer with at least one order: the number of orders and their total price (delivery fee included).
+#   Order_Details writes apply the price difference, any other change recomputes the customer's row from its orders.
+CUSTOMER_SPENDING_STATS_TABLE = '''
+CREATE TABLE Customer_Spending_Stats
+(
+    Cust_id             		INTEGER         					NOT NULL,
+    Order_count                 INTEGER                             NOT NULL, CHECK (Order_count > 0),
+    Total_spent                 DECIMAL                             NOT NULL,
+    PRIMARY KEY (Cust_id)
+)'''
+
+CUSTOMER_SPENDING_STATS_INDEXES = '''
+CREATE INDEX Customer_Spending_Stats_Avg_Index ON Customer_Spending_Stats ((Total_spent / Order_count));
+CREATE INDEX Reservations_Cust_id_Index ON Reservations (Cust_id)
+'''
+
+# The writes of the spending of a customer are serialized (transaction level advisory locks), so a refresh
+# recomputes after the refreshes and the Order_Details changes before it committed - every statement of the
+# functions takes a new snapshot. The locks are taken order first, then customer:
+#  - Order_Details writes lock their order, then the customers that reserved it
+#  - Reservations writes lock their order, then the refresh locks the customer
+REFRESH_CUSTOMER_SPENDING_FUNCTION = '''
+CREATE FUNCTION Fn_Refresh_Customer_Spending(p_cust_id INTEGER)
+RETURNS VOID LANGUAGE SQL AS $$
+    SELECT pg_advisory_xact_lock(hashtext('Customer_Spending_Stats'), p_cust_id);
+    INSERT INTO Customer_Spending_Stats
+    SELECT R.Cust_id, COUNT(*), SUM(OTP.Total_Price)
+    FROM Reservations R JOIN Orders O ON R.Order_id = O.Order_id,
+         LATERAL (SELECT COALESCE(SUM(OD.Dish_price * OD.Dish_amount), 0) + O.Delivery_fee AS Total_Price
+                  FROM Order_Details OD WHERE OD.Order_id = O.Order_id) OTP
+    WHERE R.Cust_id = p_cust_id
+    GROUP BY R.Cust_id
+    ON CONFLICT (Cust_id) DO UPDATE SET Order_count = EXCLUDED.Order_count, Total_spent = EXCLUDED.Total_spent;
+    DELETE FROM Customer_Spending_Stats S
+    WHERE S.Cust_id = p_cust_id AND NOT EXISTS (SELECT 1 FROM Reservations R WHERE R.Cust_id = p_cust_id);
+$$
+'''
+
+SPENDING_RESERVATIONS_TRIGGER = '''
+CREATE FUNCTION Trg_Spending_Reservations()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Orders'), OLD.Order_id);
+        PERFORM Fn_Refresh_Customer_Spending(OLD.Cust_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Orders'), NEW.Order_id);
+        PERFORM Fn_Refresh_Customer_Spending(NEW.Cust_id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER Spending_Reservations AFTER INSERT OR UPDATE OR DELETE ON Reservations
+    FOR EACH ROW EXECUTE FUNCTION Trg_Spending_Reservations()
+'''
+
+SPENDING_ORDERS_TRIGGER = '''
+CREATE FUNCTION Trg_Spending_Orders()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM Fn_Refresh_Customer_Spending(R.Cust_id) FROM Reservations R WHERE R.Order_id = NEW.Order_id;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER Spending_Orders AFTER UPDATE OF Delivery_fee ON Orders
+    FOR EACH ROW EXECUTE FUNCTION Trg_Spending_Orders()
+'''
+
+# an order removed with its Order_Details may have already lost its reservation, then there is nothing to update
+SPENDING_ORDER_DETAILS_TRIGGER = '''
+CREATE FUNCTION Trg_Spending_Order_Details()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Orders'), OLD.Order_id);
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Stats'), R.Cust_id)
+        FROM Reservations R WHERE R.Order_id = OLD.Order_id;
+        UPDATE Customer_Spending_Stats S SET Total_spent = S.Total_spent - OLD.Dish_price * OLD.Dish_amount
+        FROM Reservations R WHERE R.Order_id = OLD.Order_id AND S.Cust_id = R.Cust_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Orders'), NEW.Order_id);
+        PERFORM pg_advisory_xact_lock(hashtext('Customer_Spending_Stats'), R.Cust_id)
+        FROM Reservations R WHERE R.Order_id = NEW.Order_id;
+        UPDATE Customer_Spending_Stats S SET Total_spent = S.Total_spent + NEW.Dish_price * NEW.Dish_amount
+        FROM Reservations R WHERE R.Order_id = NEW.Order_id AND S.Cust_id = R.Cust_id;
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER Spending_Order_Details AFTER INSERT OR UPDATE OR DELETE ON Order_Details
+    FOR EACH ROW EXECUTE FUNCTION Trg_Spending_Order_Details()
+'''
+
+REBUILD_CUSTOMER_SPENDING_STATS = '''
+INSERT INTO Customer_Spending_Stats
+SELECT R.Cust_id, COUNT(*), SUM(OTP.Total_Price)
+FROM Reservations R JOIN Order_Total_Price_View OTP ON R.Order_id = OTP.Order_id
+GROUP BY R.Cust_id
+'''
+
+# get_most_ordered_dish_in_period
+#   The amount of every dish ordered on every day, and the number of order lines it comes from
+#   (a dish that was ordered with amount 0 still takes part in the period's ranking).
+#   An order is removed BEFORE its rows are, while its date can still be read, its Order_Details then find no order.
+DISH_DAILY_SALES_TABLE = '''
+CREATE TABLE Dish_Daily_Sales
+(
+    Sale_day                    DATE                                NOT NULL,
+    Dish_id             		INTEGER								NOT NULL,
+    Amount                      BIGINT                              NOT NULL,
+    Line_count                  INTEGER                             NOT NULL,
+    PRIMARY KEY (Sale_day, Dish_id)
+)'''
+
+DISH_DAILY_SALES_INDEXES = '''
+CREATE INDEX Orders_Date_Index ON Orders (Date)
+'''
+
+ADD_DISH_DAILY_SALES_FUNCTION = '''
+CREATE FUNCTION Fn_Add_Dish_Daily_Sales(p_day DATE, p_dish_id INTEGER, p_amount BIGINT, p_lines INTEGER)
+RETURNS VOID LANGUAGE SQL AS $$
+    INSERT INTO Dish_Daily_Sales VALUES (p_day, p_dish_id, p_amount, p_lines)
+    ON CONFLICT (Sale_day, Dish_id) DO UPDATE
+    SET Amount = Dish_Daily_Sales.Amount + EXCLUDED.Amount, Line_count = Dish_Daily_Sales.Line_count + EXCLUDED.Line_count;
+    DELETE FROM Dish_Daily_Sales WHERE Sale_day = p_day AND Dish_id = p_dish_id AND Line_count = 0;
+$$
+'''
+
+DAILY_SALES_ORDER_DETAILS_TRIGGER = '''
+CREATE FUNCTION Trg_Daily_Sales_Order_Details()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM Fn_Add_Dish_Daily_Sales(O.Date::DATE, OLD.Dish_id, -OLD.Dish_amount, -1)
+        FROM Orders O WHERE O.Order_id = OLD.Order_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM Fn_Add_Dish_Daily_Sales(O.Date::DATE, NEW.Dish_id, NEW.Dish_amount, 1)
+        FROM Orders O WHERE O.Order_id = NEW.Order_id;
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER Daily_Sales_Order_Details AFTER INSERT OR UPDATE OR DELETE ON Order_Details
+    FOR EACH ROW EXECUTE FUNCTION Trg_Daily_Sales_Order_Details()
+'''
+
+DAILY_SALES_ORDERS_TRIGGER = '''
+CREATE FUNCTION Trg_Daily_Sales_Orders()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM Fn_Add_Dish_Daily_Sales(OLD.Date::DATE, OD.Dish_id, -OD.Dish_amount, -1)
+    FROM Order_Details OD WHERE OD.Order_id = OLD.Order_id;
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM Fn_Add_Dish_Daily_Sales(NEW.Date::DATE, OD.Dish_id, OD.Dish_amount, 1)
+        FROM Order_Details OD WHERE OD.Order_id = NEW.Order_id;
+        RETURN NULL;
+    END IF;
+    RETURN OLD;
+END
+$$;
+CREATE TRIGGER Daily_Sales_Orders_Delete BEFORE DELETE ON Orders
+    FOR EACH ROW EXECUTE FUNCTION Trg_Daily_Sales_Orders();
+CREATE TRIGGER Daily_Sales_Orders_Update AFTER UPDATE OF Date ON Orders
+    FOR EACH ROW EXECUTE FUNCTION Trg_Daily_Sales_Orders()
+'''
+
+REBUILD_DISH_DAILY_SALES = '''
+INSERT INTO Dish_Daily_Sales
+SELECT Order_Date::DATE, Dish_id, SUM(Ordered_Amount), COUNT(*)
+FROM Dishes_Ordered_Amount_View
+GROUP BY Order_Date::DATE, Dish_id
+'''
+
+# get_non_worth_price_increase
+#   One row per price a dish was ordered at (a price epoch): the sum of the amounts and the number of order lines,
+#   so the average amount per order at every price is read without going over the order lines.
+#   The price of an order line is the one it was ordered at, so only Order_Details writes change the epochs.
+DISH_PRICE_EPOCHS_TABLE = '''
+CREATE TABLE Dish_Price_Epochs
+(
+    Dish_id             		INTEGER								NOT NULL,
+    Dish_price                  DECIMAL                             NOT NULL,
+    Amount_sum                  BIGINT                              NOT NULL,
+    Line_count                  INTEGER                             NOT NULL,
+    PRIMARY KEY (Dish_id, Dish_price)
+)'''
+
+ADD_DISH_PRICE_EPOCH_FUNCTION = '''
+CREATE FUNCTION Fn_Add_Dish_Price_Epoch(p_dish_id INTEGER, p_dish_price DECIMAL, p_amount BIGINT, p_lines INTEGER)
+RETURNS VOID LANGUAGE SQL AS $$
+    INSERT INTO Dish_Price_Epochs VALUES (p_dish_id, p_dish_price, p_amount, p_lines)
+    ON CONFLICT (Dish_id, Dish_price) DO UPDATE
+    SET Amount_sum = Dish_Price_Epochs.Amount_sum + EXCLUDED.Amount_sum,
+        Line_count = Dish_Price_Epochs.Line_count + EXCLUDED.Line_count;
+    DELETE FROM Dish_Price_Epochs WHERE Dish_id = p_dish_id AND Dish_price = p_dish_price AND Line_count = 0;
+$$
+'''
+
+PRICE_EPOCHS_ORDER_DETAILS_TRIGGER = '''
+CREATE FUNCTION Trg_Price_Epochs_Order_Details()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM Fn_Add_Dish_Price_Epoch(OLD.Dish_id, OLD.Dish_price, -OLD.Dish_amount, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM Fn_Add_Dish_Price_Epoch(NEW.Dish_id, NEW.Dish_price, NEW.Dish_amount, 1);
+    END IF;
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER Price_Epochs_Order_Details AFTER INSERT OR UPDATE OR DELETE ON Order_Details
+    FOR EACH ROW EXECUTE FUNCTION Trg_Price_Epochs_Order_Details()
+'''
+
+REBUILD_DISH_PRICE_EPOCHS = '''
+INSERT INTO Dish_Price_Epochs
+SELECT Dish_id, Dish_price, SUM(Dish_amount), COUNT(*)
+FROM Order_Details
+GROUP BY Dish_id, Dish_price
+'''
+
+DERIVED = [CUSTOMER_SPENDING_STATS_TABLE, CUSTOMER_SPENDING_STATS_INDEXES, REFRESH_CUSTOMER_SPENDING_FUNCTION,
+           SPENDING_RESERVATIONS_TRIGGER, SPENDING_ORDERS_TRIGGER, SPENDING_ORDER_DETAILS_TRIGGER,
+           DISH_DAILY_SALES_TABLE, DISH_DAILY_SALES_INDEXES, ADD_DISH_DAILY_SALES_FUNCTION,
+           DAILY_SALES_ORDER_DETAILS_TRIGGER, DAILY_SALES_ORDERS_TRIGGER,
+           DISH_PRICE_EPOCHS_TABLE, ADD_DISH_PRICE_EPOCH_FUNCTION, PRICE_EPOCHS_ORDER_DETAILS_TRIGGER]
+REBUILD_DERIVED = [REBUILD_CUSTOMER_SPENDING_STATS, REBUILD_DISH_DAILY_SALES, REBUILD_DISH_PRICE_EPOCHS]
+# The indexes besides the primary keys (which the foreign keys need), a bulk load drops them and creates them again
+# once the data is in, one sort per index instead of an index update per row
+SECONDARY_INDEXES = [CUSTOMER_SPENDING_STATS_INDEXES, DISH_DAILY_SALES_INDEXES]
+Secondary_Indexes_Names = ['Customer_Spending_Stats_Avg_Index', 'Reservations_Cust_id_Index', 'Orders_Date_Index']
+Derived_Tables_Names = ['Customer_Spending_Stats', 'Dish_Daily_Sales', 'Dish_Price_Epochs']
+Derived_Functions_Names = ['Trg_Spending_Reservations', 'Trg_Spending_Orders', 'Trg_Spending_Order_Details',
+                           'Fn_Refresh_Customer_Spending', 'Trg_Daily_Sales_Order_Details', 'Trg_Daily_Sales_Orders',
+                           'Fn_Add_Dish_Daily_Sales', 'Trg_Price_Epochs_Order_Details', 'Fn_Add_Dish_Price_Epoch']
+
+# ---------------------------- Precomputed Tables Declarations: -----------------------------
+# Results of the batch jobs of the BULK API, as of the last run of the job (they are not maintained by triggers).
+
+# precompute_recommendations - get_potential_dish_recommendations of every customer, and the customers the current
+# run already wrote (so an interrupted run can be resumed)
+CUSTOMER_RECOMMENDATIONS_TABLE = '''
+CREATE TABLE Customer_Recommendations
+(
+    Cust_id             		INTEGER								NOT NULL,
+    Dish_id             		INTEGER								NOT NULL,
+    PRIMARY KEY (Cust_id, Dish_id)
+)'''
+
+RECOMMENDATIONS_DONE_TABLE = '''
+CREATE TABLE Recommendations_Done
+(
+    Cust_id             		INTEGER								NOT NULL,
+    PRIMARY KEY (Cust_id)
+)'''
+
+PRECOMPUTED = [CUSTOMER_RECOMMENDATIONS_TABLE, RECOMMENDATIONS_DONE_TABLE]
+Precomputed_Tables_Names = ['Customer_Recommendations', 'Recommendations_Done']
+
+# ---------------------------- Sharding Tables Declarations: -----------------------------
+# Created on every shard of a sharded database only (see SHARDING).
+
+# The shard every order is on now, kept on the order's home shard - the shard it is created on, by its Order_id
+ORDER_SHARDS_TABLE = '''
+CREATE TABLE Order_Shards
+(
+    Order_id               		INTEGER		                        NOT NULL,
+    Shard                       INTEGER                             NOT NULL,
+    PRIMARY KEY (Order_id)
+)'''
+
+SHARDING = [ORDER_SHARDS_TABLE]
+Sharding_Tables_Names = ['Order_Shards']
+
+# ---------------------------- Change Notifications: -----------------------------
+# Every row written to a table is announced with NOTIFY '<table>:<I|U|D>:<key>' on CHANGES_CHANNEL (the key columns
+# are the trigger's arguments, comma separated), so the caches of the other processes can drop what it changed
+# (see CHANGE_LISTENER). The messages are sent at commit, the identical ones of a transaction only once.
+CHANGES_CHANNEL = 'yummy_changes'
+
+NOTIFY_CHANGE_FUNCTION = f'''
+CREATE FUNCTION Trg_Notify_Change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    changed JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed := to_jsonb(OLD);
+    ELSE
+        changed := to_jsonb(NEW);
+    END IF;
+    PERFORM pg_notify('{CHANGES_CHANNEL}', TG_TABLE_NAME || ':' || left(TG_OP, 1) || ':' ||
+        (SELECT string_agg(changed ->> Key.Column_name, ',' ORDER BY Key.Position)
+         FROM unnest(TG_ARGV) WITH ORDINALITY AS Key(Column_name, Position)));
+    RETURN NULL;
+END
+$$
+'''
+
+# the primary key columns of every table
+TABLES_KEYS = {'Customers': ['cust_id'], 'Orders': ['order_id'], 'Dishes': ['dish_id'], 'Reservations': ['order_id'],
+               'Order_Details': ['order_id', 'dish_id'], 'Customer_Ratings': ['cust_id', 'dish_id']}
+NOTIFY_CHANGE_TRIGGERS = [f'''
+CREATE TRIGGER Notify_{table} AFTER INSERT OR UPDATE OR DELETE ON {table}
+    FOR EACH ROW EXECUTE FUNCTION Trg_Notify_Change({', '.join(f"'{column}'" for column in keys)})
+''' for table, keys in TABLES_KEYS.items()]
+
+# every listener drops all of its cached results, for changes made without the triggers (bulk loads, recreated tables)
+NOTIFY_FLUSH = f"SELECT pg_notify('{CHANGES_CHANNEL}', '{FLUSH_PAYLOAD}')"
+
+NOTIFICATIONS = [NOTIFY_CHANGE_FUNCTION] + NOTIFY_CHANGE_TRIGGERS
+Notifications_Functions_Names = ['Trg_Notify_Change']
+
+# ---------------------------- Functions Declarations: -----------------------------
+# The Basic and Advanced API queries are installed as SQL functions with typed parameters,
+# so a call ships only "SELECT ... FROM Fn_X(args)" instead of the whole query text.
+# SQL (and not PL/pgSQL) functions, so the planner can inline them into the calling query.
+ORDER_TOTAL_PRICE_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Order_Total_Price(p_order_id INTEGER)
+RETURNS TABLE (Total_Price DECIMAL) LANGUAGE SQL STABLE AS $$
+    SELECT Total_Price FROM Order_Total_Price_View WHERE Order_id = p_order_id
+$$
+'''
+
+CUSTOMERS_SPENT_MAX_AVG_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Customers_Spent_Max_Avg_Amount_Money()
+RETURNS TABLE (Cust_id INTEGER) LANGUAGE SQL STABLE AS $$
+    SELECT Cust_id FROM Customer_Spending_Stats
+    WHERE Total_spent / Order_count = (SELECT MAX(Total_spent / Order_count) FROM Customer_Spending_Stats)
+$$
+'''
+
+# get_most_ordered_dish_in_period - the amount of every dish ordered in the period
+# (the partial aggregate of a shard, see SHARDING)
+DISH_AMOUNTS_IN_PERIOD_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Dish_Amounts_In_Period(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS TABLE (Dish_id INTEGER, Amount NUMERIC) LANGUAGE SQL STABLE AS $$
+    -- the days fully inside the period come from the daily rollup, only the partial first / last days read the orders
+    WITH Full_Days AS (
+        SELECT CASE WHEN p_start = date_trunc('day', p_start) THEN p_start
+                    ELSE date_trunc('day', p_start) + INTERVAL '1 day' END AS First_day,
+               date_trunc('day', p_end) AS End_day
+    )
+    SELECT Dish_id, SUM(Amount) FROM
+        (SELECT DDS.Dish_id, DDS.Amount
+         FROM Dish_Daily_Sales DDS, Full_Days FD
+         WHERE DDS.Sale_day >= FD.First_day AND DDS.Sale_day < FD.End_day
+         UNION ALL
+         SELECT DOA.Dish_id, DOA.Ordered_Amount
+         FROM Dishes_Ordered_Amount_View DOA, Full_Days FD
+         WHERE DOA.Order_Date BETWEEN p_start AND p_end
+           AND (DOA.Order_Date < FD.First_day OR DOA.Order_Date >= FD.End_day)) Period_Sales
+    GROUP BY Dish_id
+$$
+'''
+
+MOST_ORDERED_DISH_IN_PERIOD_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Most_Ordered_Dish_In_Period(p_start TIMESTAMP, p_end TIMESTAMP)
+RETURNS SETOF Dishes LANGUAGE SQL STABLE AS $$
+    SELECT * FROM Dishes WHERE Dish_id =
+        (SELECT Dish_id FROM Fn_Get_Dish_Amounts_In_Period(p_start, p_end)
+         ORDER BY Amount DESC, Dish_id ASC
+         LIMIT 1)
+$$
+'''
+
+# the ties between dishes with the same average rating go to the lower dish_id
+ORDERED_TOP_RATED_DISHES_FUNCTION = '''
+CREATE FUNCTION Fn_Did_Customer_Order_Top_Rated_Dishes(p_cust_id INTEGER)
+RETURNS TABLE (Ordered_Top_Rated BOOLEAN) LANGUAGE SQL STABLE AS $$
+    SELECT EXISTS (
+        SELECT * FROM Customer_Ordered_Dishes_View
+        WHERE Cust_id = p_cust_id AND Dish_id IN
+            (SELECT Dish_id FROM Dish_Avg_Rating_View ORDER BY Avg_rating DESC, Dish_id ASC LIMIT 5))
+$$
+'''
+
+CUSTOMERS_RATED_BUT_NOT_ORDERED_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Customers_Rated_But_Not_Ordered()
+RETURNS TABLE (Cust_id INTEGER) LANGUAGE SQL STABLE AS $$
+    SELECT DISTINCT CR.Cust_id FROM Customer_Ratings CR
+    WHERE
+        CR.Rating < 3
+        AND CR.Dish_id IN (SELECT DAR.Dish_id FROM Dish_Avg_Rating_View DAR ORDER BY DAR.Avg_rating ASC, DAR.Dish_id ASC LIMIT 5)
+        AND NOT EXISTS (
+            SELECT COD.Dish_id FROM Customer_Ordered_Dishes_View COD
+            WHERE COD.Cust_id = CR.Cust_id AND COD.Dish_id = CR.Dish_id
+        )
+$$
+'''
+
+# The average profit per order at every price is read from the price epochs (see Dish_Price_Epochs),
+# so the cost grows with the number of price changes and not with the number of orders
+NON_WORTH_PRICE_INCREASE_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Non_Worth_Price_Increase()
+RETURNS TABLE (Dish_id INTEGER) LANGUAGE SQL STABLE AS $$
+    WITH ap AS (
+        SELECT E.Dish_id, E.Dish_price, (E.Amount_sum::DECIMAL / E.Line_count) * E.Dish_price AS val
+        FROM Dish_Price_Epochs E
+    )
+    SELECT curr.Dish_id
+    FROM
+        ap JOIN
+        (SELECT D.Dish_id AS Dish_id, D.Price AS Price, appo.val AS val
+         FROM ap appo JOIN Dishes D ON (D.Dish_id = appo.Dish_id AND D.Price = appo.dish_price)
+         WHERE D.Is_active = true) AS curr
+        ON (ap.Dish_id = curr.dish_id)
+    WHERE curr.Price > ap.dish_price AND curr.val < ap.val
+$$
+'''
+
+# The profit of every month of the year is aggregated once, and accumulated with a window over the months
+CUMULATIVE_PROFIT_PER_MONTH_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Cumulative_Profit_Per_Month(p_year INTEGER)
+RETURNS TABLE (Month INTEGER, Cumulative_Profit DECIMAL) LANGUAGE SQL STABLE AS $$
+    SELECT
+        months_series.MonthNum,
+        COALESCE(SUM(COALESCE(mp.Profit, 0)) OVER (ORDER BY months_series.MonthNum), 0)
+    FROM
+        generate_series(1, 12) AS months_series(MonthNum)
+        LEFT JOIN (
+            SELECT mpv.Month, SUM(COALESCE(mpv.Monthly_Profit, 0)) AS Profit
+            FROM Monthly_Profit_View mpv
+            WHERE mpv.Year = p_year
+            GROUP BY mpv.Month
+        ) mp ON mp.Month = months_series.MonthNum
+$$
+'''
+
+# The similarity closure is only expanded from the given customer, not for every pair of customers
+POTENTIAL_DISH_RECOMMENDATIONS_FUNCTION = '''
+CREATE FUNCTION Fn_Get_Potential_Dish_Recommendations(p_cust_id INTEGER)
+RETURNS TABLE (Dish_id INTEGER) LANGUAGE SQL STABLE AS $$
+    WITH RECURSIVE a_similar_b AS (
+        SELECT a, b FROM SimilarRelation WHERE a = p_cust_id
+        UNION
+        SELECT a_to_b.a, b_to_c.b
+        FROM a_similar_b a_to_b JOIN SimilarRelation b_to_c ON a_to_b.b = b_to_c.a
+    )
+    SELECT dr.Dish_id
+    FROM a_similar_b rs JOIN Customer_Ratings dr ON dr.Cust_id = rs.b
+    WHERE rs.a != rs.b AND dr.Rating >= 4
+    EXCEPT
+    SELECT Dish_id FROM Customer_Ordered_Dishes_View WHERE Cust_id = p_cust_id
+$$
+'''
+
+# batch_calls - runs the statements one by one, each in its own subtransaction so a failing one is rolled back alone,
+# and returns per statement its rows as JSON (a SELECT) or its row count, or the SQLSTATE it failed with.
+# A deadlock or a serialization failure fails the whole batch, so it is retried like a call of its own (see RETRY_POLICY)
+RUN_BATCH_FUNCTION = '''
+CREATE FUNCTION Fn_Run_Batch(p_statements TEXT[])
+RETURNS TABLE (Statement_no INTEGER, Rows_affected BIGINT, Result TEXT, Error_code TEXT, Error_message TEXT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    statement TEXT;
+BEGIN
+    FOR i IN 1 .. COALESCE(array_length(p_statements, 1), 0) LOOP
+        statement := regexp_replace(p_statements[i], ';\\s*$', '');
+        Statement_no := i;
+        Rows_affected := 0;
+        Result := NULL;
+        Error_code := NULL;
+        Error_message := NULL;
+        BEGIN
+            IF statement ~* '^\\s*(SELECT|WITH)\\M' THEN
+                EXECUTE 'SELECT json_agg(Batch_Row)::TEXT FROM (' || statement || ') Batch_Row' INTO Result;
+                Rows_affected := COALESCE(json_array_length(Result::JSON), 0);
+            ELSE
+                EXECUTE statement;
+                GET DIAGNOSTICS Rows_affected = ROW_COUNT;
+            END IF;
+        EXCEPTION WHEN deadlock_detected OR serialization_failure THEN
+            RAISE;
+        WHEN OTHERS THEN
+            Error_code := SQLSTATE;
+            Error_message := SQLERRM;
+        END;
+        RETURN NEXT;
+    END LOOP;
+END
+$$
+'''
+
+FUNCTIONS = [ORDER_TOTAL_PRICE_FUNCTION, CUSTOMERS_SPENT_MAX_AVG_FUNCTION, DISH_AMOUNTS_IN_PERIOD_FUNCTION,
+             MOST_ORDERED_DISH_IN_PERIOD_FUNCTION, ORDERED_TOP_RATED_DISHES_FUNCTION, CUSTOMERS_RATED_BUT_NOT_ORDERED_FUNCTION,
+             NON_WORTH_PRICE_INCREASE_FUNCTION, CUMULATIVE_PROFIT_PER_MONTH_FUNCTION, POTENTIAL_DISH_RECOMMENDATIONS_FUNCTION,
+             RUN_BATCH_FUNCTION]
+Functions_Names = ['Fn_Get_Order_Total_Price', 'Fn_Get_Customers_Spent_Max_Avg_Amount_Money', 'Fn_Get_Dish_Amounts_In_Period',
+                   'Fn_Get_Most_Ordered_Dish_In_Period', 'Fn_Did_Customer_Order_Top_Rated_Dishes',
+                   'Fn_Get_Customers_Rated_But_Not_Ordered', 'Fn_Get_Non_Worth_Price_Increase',
+                   'Fn_Get_Cumulative_Profit_Per_Month', 'Fn_Get_Potential_Dish_Recommendations', 'Fn_Run_Batch']
+
+# ---------------------------------- Call Tags: ----------------------------------
+# The API functions are tagged with decorators, handle_query reads the tags of the call it is running in.
+_call_tags = threading.local()
+
+
+def _get_call_tag(name: str, default=None):
+    return getattr(_call_tags, name, default)
+
+
+# the code inside the with block runs with the tag set to value
+@contextmanager
+def _call_tag(name: str, value):
+    had_tag = hasattr(_call_tags, name)
+    previous = _get_call_tag(name)
+    setattr(_call_tags, name, value)
+    try:
+        yield
+    finally:
+        if had_tag:
+            setattr(_call_tags, name, previous)
+        else:
+            delattr(_call_tags, name)
+
+
+def _tag_call(name: str, value):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _call_tag(name, value):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# The function only reads, so its queries may be routed to a read replica (see DBConnector routing)
+read_only = _tag_call('read_only', True)
+# The function is a heavy aggregation, it is admitted through the analytic lane of the SCHEDULER
+# so it can not take the connections of the interactive calls
+analytic = _tag_call('lane', AdmissionScheduler.ANALYTIC)
+
+# Admission control for every query, see SCHEDULER.configure / SCHEDULER.metrics()
+SCHEDULER = AdmissionScheduler()
+# Retries of the transient failures (deadlocks, serialization failures, dropped connections), see RETRY_POLICY.metrics()
+RETRY_POLICY = RetryPolicy()
+# Count / time of every query by its fingerprint and the slow query log, see QUERY_LOG.stats() / QUERY_LOG.configure
+# (the failed queries are logged to the 'yummy.queries' logger at DEBUG level)
+QUERY_LOG = Connector.DBConnector.QUERY_LOG
+
+# Results of the analytic functions, served until one of the tables they read is written, see RESULT_CACHE.stats()
+# Writes that do not go through this module must be reported with RESULT_CACHE.bump(tables) / RESULT_CACHE.flush()
+RESULT_CACHE = ResultCache()
+# The function's result is cached until one of the given tables changes
+cached = RESULT_CACHE.cached
+# The function writes the given tables (including the ones reached by ON DELETE CASCADE)
+writes = RESULT_CACHE.writes
+# A replica is taken to have applied the writes of this process that are older than this many seconds. A result read
+# from a replica sooner after a write may miss it, so it is not cached (the cache would serve it until the next write)
+REPLICA_LAG = 10.0
+
+# The call of a batch running in this thread (see batch_calls)
+_batch = threading.local()
+
+# Analytics mode, off by default - ANALYTICS.enable(max_age) answers the functions tagged columnar from a NumPy
+# snapshot of the tables refreshed every max_age seconds, instead of querying them. See ANALYTICS.stats() for its staleness
+ANALYTICS = ColumnarSnapshot()
+# The function has a vectorized kernel in ANALYTICS
+columnar = ANALYTICS.serves
+
+# Invalidates RESULT_CACHE on the writes of the other processes (see Change Notifications), started with
+# CHANGE_LISTENER.start() in every process that shares the database, see CHANGE_LISTENER.stats()
+CHANGE_LISTENER = ChangeListener(RESULT_CACHE, CHANGES_CHANNEL)
+
+# The dishes ordered the most lately, counted from the order_contains_dish calls of this process (see get_trending_dishes),
+# emptied with the tables
+TRENDING = SlidingHeavyHitters()
+
+# The Backend serving the API instead of PostgreSQL, None while PostgreSQL serves it (see use_backend)
+_backend = None
+
+
+# Serve the API with the given Backend (e.g. Utility.MemoryBackend for tests without a database), None to go back to PostgreSQL
+def use_backend(backend: Backend = None) -> None:
+    global _backend
+    _backend = backend
+    # the cached results were computed by the previous backend
+    RESULT_CACHE.flush()
+
+
+# The function is a part of the Backend interface, it is sent to the backend in use (outermost, before any other tag)
+# Its queries are logged as run for it (see QUERY_LOG)
+def backend_api(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with QUERY_LOG.calling(func.__name__, args, kwargs):
+            backend = _backend
+            if backend is not None:
+                return getattr(backend, func.__name__)(*args, **kwargs)
+            return func(*args, **kwargs)
+    return wrapper
+
+
+# ---------------------------------- SHARDING: ----------------------------------
+# With shards configured (DBConnector.configure_routing(shards=...) or the [postgresql_shard*] sections of
+# database.ini) every shard holds the whole schema, and the rows are spread so all the rows of a customer are on one shard:
+#   Customers, Reservations and Customer_Ratings are on the shard of their Cust_id.
+#   An order is created on its home shard (by its Order_id), and moves with its Order_Details to the shard of the
+#   customer that places it. Order_Shards on the home shard tells where the order is now.
+#   Dishes is written to every shard.
+# The calls about one customer / order / dish run on its shard (on_shard), the analytics run on all the shards at once
+# and merge their partial aggregates (sharded). The writes that span shards (placing an order that has to move, the
+# Dishes writes) commit on each shard separately, there is no two phase commit.
+# CHANGE_LISTENER and the snapshots / precompute_recommendations of the BULK API serve the unsharded database only,
+# ANALYTICS and batch_calls make the queries of their calls one by one on a sharded database.
+
+# a call that runs on all the shards (see on_shard)
+EVERY_SHARD = -1
+
+
+def _shard_of(key) -> int:
+    # a key that is not a number fails on shard 0 like it does on the unsharded database
+    if isinstance(key, int) and not isinstance(key, bool):
+        return key % Connector.DBConnector.shard_count()
+    return 0
+
+
+def _customer_shard(cust_id) -> int:
+    return _shard_of(cust_id)
+
+
+def _order_home_shard(order_id) -> int:
+    return _shard_of(order_id)
+
+
+# the shard the order is on now, from its Order_Shards row (the home shard for an order that does not exist)
+def _order_shard(order_id) -> int:
+    home = _order_home_shard(order_id)
+    query = sql.SQL('SELECT Shard FROM Order_Shards WHERE Order_id = {order_id};').format(order_id=sql.Literal(order_id))
+    with _call_tag('shard', home):
+        _, rowsAmount, resultRows, _ = handle_query(query)
+    return resultRows[0]['Shard'] if rowsAmount == 1 else home
+
+
+def _scatter(func, shards: Optional[List[int]] = None) -> list:
+    """
+    Runs func(shard) for all the shards (or the given ones) at once, each in a thread of its own that has the
+    call tags of the caller and its shard's tag.
+
+    :return: The results, in the order of the shards.
+    """
+    shards = list(range(Connector.DBConnector.shard_count())) if shards is None else shards
+    tags = dict(vars(_call_tags))
+
+    def run(shard: int):
+        with ExitStack() as stack:
+            for name, value in tags.items():
+                stack.enter_context(_call_tag(name, value))
+            stack.enter_context(_call_tag('shard', shard))
+            return func(shard)
+
+    if len(shards) <= 1:
+        return [run(shard) for shard in shards]
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return list(executor.map(run, shards))
+
+
+# the ResultSets of the query on all the shards (or the given ones), None if it failed on any of them
+def _scatter_query(query: sql.Composable, shards: Optional[List[int]] = None) -> Optional[List[Connector.ResultSet]]:
+    results = _scatter(lambda shard: handle_query(query), shards)
+    if any(exp is not None for _, _, _, exp in results):
+        # the answer of the caller is the one of a failed query, and it is not cached (the failures were in other threads)
+        RESULT_CACHE.skip_store()
+        return None
+    return [resultRows for _, _, resultRows, _ in results]
+
+
+def on_shard(shard_of):
+    """
+    When the database is sharded, the call runs on the shard shard_of(<the first argument of the call>) returns,
+    or on all of them for EVERY_SHARD - on shard 0 first, then on the others at once only if it succeeded there.
+    A call on all the shards answers ERROR if they did not all answer the same.
+    """
+    def decorator(func):
+        first = next(iter(inspect.signature(func).parameters), None)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not Connector.DBConnector.shard_count():
+                return func(*args, **kwargs)
+            shard = shard_of(args[0] if args else kwargs.get(first))
+            if shard != EVERY_SHARD:
+                with _call_tag('shard', shard):
+                    return func(*args, **kwargs)
+
+            with _call_tag('shard', 0):
+                result = func(*args, **kwargs)
+            if result not in (None, ReturnValue.OK):
+                return result
+            others = _scatter(lambda _: func(*args, **kwargs), list(range(1, Connector.DBConnector.shard_count())))
+            return ReturnValue.ERROR if any(other != result for other in others) else result
+        return wrapper
+    return decorator
+
+
+# The call runs on all the shards (the schema, the writes of Dishes)
+every_shard = on_shard(lambda _: EVERY_SHARD)
+
+
+def sharded(implementation):
+    """
+    When the database is sharded, the call is answered by implementation(func, *args, **kwargs) instead,
+    func is the decorated function (to run it on a shard).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if Connector.DBConnector.shard_count():
+                return implementation(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _delete_order(func, order_id: int) -> ReturnValue:
+    with _call_tag('shard', _order_shard(order_id)):
+        retVal = func(order_id)
+    if retVal == ReturnValue.OK:
+        # the id can be used again (see add_order)
+        query = sql.SQL('DELETE FROM Order_Shards WHERE Order_id = {order_id};').format(order_id=sql.Literal(order_id))
+        with _call_tag('shard', _order_home_shard(order_id)):
+            handle_query(query)
+    return retVal
+
+
+def _place_order(func, customer_id: int, order_id: int) -> ReturnValue:
+    source, target = _order_shard(order_id), _customer_shard(customer_id)
+    if source == target:
+        with _call_tag('shard', target):
+            return func(customer_id, order_id)
+    return _move_order(order_id, source, target, customer_id)
+
+
+def _move_order(order_id: int, source: int, target: int, customer_id: int) -> ReturnValue:
+    """
+    Places the order on the shard of its customer - copies it there with its Order_Details and the reservation,
+    removes it from the shard it was on and points its Order_Shards row (on its home shard) to the new one.
+    The transactions of the shards are committed after all of them succeeded, the target's first, so a failure in
+    between leaves the order on both shards rather than on none.
+    """
+    retVal = ReturnValue.OK
+    conns = {}
+    order = sql.Literal(order_id)
+    try:
+        with SCHEDULER.admit(AdmissionScheduler.INTERACTIVE, priority=0):
+            for shard in (target, source, _order_home_shard(order_id)):
+                if shard not in conns:
+                    conns[shard] = Connector.DBConnector(shard=shard)
+
+            # locked, so a concurrent call can not move it too
+            _, orders = conns[source].execute(sql.SQL('SELECT * FROM Orders WHERE Order_id = {order_id} FOR UPDATE;')
+                                              .format(order_id=order), commit=False)
+            if orders.isEmpty():
+                return ReturnValue.NOT_EXISTS
+            _, reservations = conns[source].execute(sql.SQL('SELECT Cust_id FROM Reservations WHERE Order_id = {order_id};')
+                                                    .format(order_id=order), commit=False)
+            if not reservations.isEmpty():
+                return ReturnValue.ALREADY_EXISTS
+            _, details = conns[source].execute(sql.SQL('SELECT * FROM Order_Details WHERE Order_id = {order_id};')
+                                               .format(order_id=order), commit=False)
+
+            statement = sql.SQL('INSERT INTO Orders VALUES {order};').format(order=sql.Literal(orders.rows[0]))
+            if not details.isEmpty():
+                statement += sql.SQL(' INSERT INTO Order_Details VALUES {details};').format(
+                    details=sql.SQL(', ').join(sql.Literal(row) for row in details.rows))
+            statement += sql.SQL(' INSERT INTO Reservations VALUES ({order_id}, {cust_id});').format(
+                order_id=order, cust_id=sql.Literal(customer_id))
+            conns[target].execute(statement, commit=False)
+            conns[source].execute(sql.SQL('DELETE FROM Orders WHERE Order_id = {order_id};').format(order_id=order),
+                                  commit=False)
+            conns[_order_home_shard(order_id)].execute(
+                sql.SQL('INSERT INTO Order_Shards VALUES ({order_id}, {shard}) '
+                        'ON CONFLICT (Order_id) DO UPDATE SET Shard = EXCLUDED.Shard;')
+                .format(order_id=order, shard=sql.Literal(target)), commit=False)
+            for conn in conns.values():
+                conn.commit()
+    except Exception as e:
+        QUERY_LOG.failure(f'customer_placed_order({customer_id}, {order_id})', e)
+        retVal = handle_database_exceptions(sql.SQL(f'customer_placed_order({customer_id}, {order_id})'), e)
+    finally:
+        # the connections that were not committed roll back
+        for conn in conns.values():
+            conn.close()
+
+    return retVal
+
+
+def _gather_customers_spent_max_avg_amount_money(func) -> List[int]:
+    # the customers of the maximal average of every shard
+    query = sql.SQL('SELECT Cust_id, Total_spent / Order_count AS Avg_spent FROM Customer_Spending_Stats '
+                    'WHERE Total_spent / Order_count = (SELECT MAX(Total_spent / Order_count) FROM Customer_Spending_Stats);')
+    partials = _scatter_query(query)
+    if partials is None:
+        return []
+    rows = [row for resultRows in partials for row in resultRows.rows]
+    if not rows:
+        return []
+    top = max(avg_spent for _, avg_spent in rows)
+    return sorted(cust_id for cust_id, avg_spent in rows if avg_spent == top)
+
+
+def _gather_most_ordered_dish_in_period(func, start: datetime, end: datetime) -> Dish:
+    query = sql.SQL('SELECT Dish_id, Amount FROM Fn_Get_Dish_Amounts_In_Period({start}, {end});').format(
+        start=sql.Literal(start), end=sql.Literal(end))
+    partials = _scatter_query(query)
+    if partials is None:
+        return BadDish()
+    amounts = {}
+    for resultRows in partials:
+        for dish_id, amount in resultRows.rows:
+            amounts[dish_id] = amounts.get(dish_id, 0) + amount
+    if not amounts:
+        return BadDish()
+    return get_dish(min(amounts, key=lambda dish_id: (-amounts[dish_id], dish_id)))
+
+
+# Dish_Avg_Rating_View of all the shards (every shard has every dish and the ratings of its customers),
+# dish_id -> the exact average rating, None on failure
+def _dish_avg_ratings() -> Optional[dict]:
+    query = sql.SQL('SELECT D.Dish_id, SUM(CR.Rating) AS Rating_sum, COUNT(CR.Rating) AS Rating_count '
+                    'FROM Dishes D LEFT JOIN Customer_Ratings CR ON D.Dish_id = CR.Dish_id GROUP BY D.Dish_id;')
+    partials = _scatter_query(query)
+    if partials is None:
+        return None
+    totals = {}
+    for resultRows in partials:
+        for dish_id, rating_sum, rating_count in resultRows.rows:
+            total = totals.setdefault(dish_id, [0, 0])
+            total[0] += rating_sum or 0
+            total[1] += rating_count
+    # a dish that no one rated has the average rating 3
+    return {dish_id: Fraction(rating_sum, rating_count) if rating_count else Fraction(3)
+            for dish_id, (rating_sum, rating_count) in totals.items()}
+
+
+def _gather_did_customer_order_top_rated_dishes(func, cust_id: int) -> bool:
+    ratings = _dish_avg_ratings()
+    if ratings is None:
+        return False
+    top_rated = sorted(ratings, key=lambda dish_id: (-ratings[dish_id], dish_id))[:5]
+    query = sql.SQL('SELECT EXISTS (SELECT * FROM Customer_Ordered_Dishes_View '
+                    'WHERE Cust_id = {cust_id} AND Dish_id = ANY({dishes})) AS Ordered_Top_Rated;').format(
+        cust_id=sql.Literal(cust_id), dishes=sql.Literal(top_rated))
+    partials = _scatter_query(query, [_customer_shard(cust_id)])
+    return partials is not None and bool(partials[0][0]['Ordered_Top_Rated'])
+
+
+def _gather_customers_rated_but_not_ordered(func) -> List[int]:
+    ratings = _dish_avg_ratings()
+    if ratings is None:
+        return []
+    lowest_rated = sorted(ratings, key=lambda dish_id: (ratings[dish_id], dish_id))[:5]
+    query = sql.SQL('SELECT DISTINCT CR.Cust_id FROM Customer_Ratings CR '
+                    'WHERE CR.Rating < 3 AND CR.Dish_id = ANY({dishes}) AND NOT EXISTS ('
+                    'SELECT * FROM Customer_Ordered_Dishes_View COD WHERE COD.Cust_id = CR.Cust_id AND COD.Dish_id = CR.Dish_id);'
+                    ).format(dishes=sql.Literal(lowest_rated))
+    partials = _scatter_query(query)
+    if partials is None:
+        return []
+    return sorted(cust_id for resultRows in partials for cust_id, in resultRows.rows)
+
+
+def _gather_non_worth_price_increase(func) -> List[int]:
+    # the price epochs of all the shards, with the current price of their dish
+    query = sql.SQL('SELECT E.Dish_id, E.Dish_price, E.Amount_sum, E.Line_count, D.Price, D.Is_active '
+                    'FROM Dish_Price_Epochs E JOIN Dishes D ON D.Dish_id = E.Dish_id;')
+    partials = _scatter_query(query)
+    if partials is None:
+        return []
+    epochs = {}
+    current_prices = {}
+    for resultRows in partials:
+        for dish_id, dish_price, amount_sum, line_count, price, is_active in resultRows.rows:
+            total = epochs.setdefault(dish_id, {}).setdefault(dish_price, [0, 0])
+            total[0] += amount_sum
+            total[1] += line_count
+            if is_active:
+                current_prices[dish_id] = price
+
+    resultList = []
+    for dish_id, price in current_prices.items():
+        values = {dish_price: Fraction(amount_sum, line_count) * Fraction(dish_price)
+                  for dish_price, (amount_sum, line_count) in epochs[dish_id].items()}
+        if price in values:
+            # once for every lower price that made more per order, like Fn_Get_Non_Worth_Price_Increase
+            resultList.extend(dish_id for dish_price, value in values.items() if price > dish_price and values[price] < value)
+    return sorted(resultList)
+
+
+def _gather_cumulative_profit_per_month(func, year: int) -> List[Tuple[int, float]]:
+    # the groups of Monthly_Profit_View before they are summed over the shards - the orders of a month with the same
+    # delivery fee are one group, its fee is counted once (and not at all when none of its orders has a dish)
+    query = sql.SQL('SELECT EXTRACT(MONTH FROM O.Date)::INTEGER AS Month, O.Delivery_fee, '
+                    'SUM(OD.Dish_price * OD.Dish_amount) AS Dishes_price '
+                    'FROM Orders O LEFT JOIN Order_Details OD ON O.Order_id = OD.Order_id '
+                    'WHERE EXTRACT(YEAR FROM O.Date) = {year} GROUP BY 1, 2;').format(year=sql.Literal(year))
+    partials = _scatter_query(query)
+    if partials is None:
+        return []
+    groups = {}
+    for resultRows in partials:
+        for month, delivery_fee, dishes_price in resultRows.rows:
+            previous = groups.get((month, delivery_fee))
+            if dishes_price is None:
+                groups[(month, delivery_fee)] = previous
+            else:
+                groups[(month, delivery_fee)] = dishes_price if previous is None else previous + dishes_price
+    profits = [Decimal(0)] * 13
+    for (month, delivery_fee), dishes_price in groups.items():
+        if dishes_price is not None:
+            profits[month] += dishes_price + delivery_fee
+
+    resultList = []
+    cumulative = Decimal(0)
+    for month in range(1, 13):
+        cumulative += profits[month]
+        resultList.append((month, float(cumulative)))
+    return resultList[::-1]
+
+
+def _gather_potential_dish_recommendations(func, cust_id: int) -> List[int]:
+    # the similarity closure needs the likes of all the customers, it is computed here (see Utility.RecommendationJob)
+    # over the component of the customer
+    likes = _scatter_query(sql.SQL('SELECT Cust_id, Dish_id FROM Customer_Ratings WHERE Rating >= 4;'))
+    ordered = _scatter_query(sql.SQL('SELECT DISTINCT Dish_id FROM Customer_Ordered_Dishes_View WHERE Cust_id = {cust_id};')
+                             .format(cust_id=sql.Literal(cust_id)), [_customer_shard(cust_id)])
+    if likes is None or ordered is None:
+        return []
+    liked = {}
+    for resultRows in likes:
+        for liker, dish_id in resultRows.rows:
+            liked.setdefault(liker, set()).add(dish_id)
+    if cust_id not in liked:
+        return []
+    component = next(customers for customers in similarity_components(liked) if cust_id in customers)
+    work = {other: (liked[other], set()) for other in component}
+    work[cust_id] = (liked[cust_id], {dish_id for dish_id, in ordered[0].rows})
+    return component_recommendations(work)[cust_id]
+
+
+def _gather_customers_rated_but_not_ordered_page(func, after_cust_id: int = 0, page_size: int = PAGE_SIZE) -> List[int]:
+    if page_size <= 0:
+        return []
+    return [cust_id for cust_id in _gather_customers_rated_but_not_ordered(func) if cust_id > after_cust_id][:page_size]
+
+
+def _gather_potential_dish_recommendations_page(func, cust_id: int, after_dish_id: int = 0,
+                                                page_size: int = PAGE_SIZE) -> List[int]:
+    if page_size <= 0:
+        return []
+    return [dish_id for dish_id in _gather_potential_dish_recommendations(func, cust_id) if dish_id > after_dish_id][:page_size]
+
+
 # ---------------------------------- CRUD API: ----------------------------------
 # Basic database functions
-def handle_database_exceptions(query: sql.SQL, e: Exception, print_flag = False) -> ReturnValue:
+def handle_database_exceptions(query: sql.SQL, e: Exception) -> ReturnValue:
     result = ReturnValue.ERROR
-    if print_flag:
-        print('Database Raised An Exception!')
-        print(f'The Query that is responsible for the exception - {query}')
-        print(e)
-
     if isinstance(e, DatabaseException.NOT_NULL_VIOLATION):
         result = ReturnValue.BAD_PARAMS
     elif isinstance(e, DatabaseException.CHECK_VIOLATION):
@@ -181,33 +1160,88 @@ def handle_database_exceptions(query: sql.SQL, e: Exception, print_flag = False)
         result = ReturnValue.ERROR
     elif isinstance(e, DatabaseException.database_ini_ERROR):
         result = ReturnValue.ERROR
+    elif isinstance(e, DatabaseException.ADMISSION_REJECTED):
+        result = ReturnValue.ERROR
+    elif isinstance(e, DatabaseException.SERIALIZATION_FAILURE):
+        result = ReturnValue.ERROR
+    elif isinstance(e, DatabaseException.DEADLOCK_DETECTED):
+        result = ReturnValue.ERROR
 
     return result
 
 def handle_query(query: sql.SQL) -> Tuple[ReturnValue, int, Connector.ResultSet, Exception]:
+    # the call is a part of a batch, its query is sent / its result was received with the batch (see batch_calls)
+    batched = getattr(_batch, 'call', None)
+    if batched is not None:
+        _batch.call = None
+        return batched.handle_query(query)
+
+    # a read can always run again, a write only when it was surely not applied (see RetryPolicy)
+    idempotent = _get_call_tag('read_only', False)
+    retried_codes = []
+    attempt = 0
+
+    while True:
+        query_result, rows_amount, result, recieved_exp = _run_query(query)
+        if recieved_exp is None or not RETRY_POLICY.should_retry(recieved_exp, attempt, idempotent):
+            break
+        retried_codes.append(RetryPolicy.sqlstate(recieved_exp))
+        time.sleep(RETRY_POLICY.backoff(attempt))
+        attempt += 1
+
+    RETRY_POLICY.record(retried_codes, recieved_exp is not None and RETRY_POLICY.is_retryable(recieved_exp, idempotent),
+                        succeeded=recieved_exp is None)
+    if recieved_exp is not None:
+        # an answer built from a failed query must not be served from the cache
+        RESULT_CACHE.skip_store()
+        errors = _get_call_tag('query_errors')
+        if errors is not None:
+            errors.append(recieved_exp)
+    return query_result, rows_amount, result, recieved_exp
+
+def _run_query(query: sql.SQL) -> Tuple[ReturnValue, int, Connector.ResultSet, Exception]:
     query_result = ReturnValue.OK
     rows_amount = 0
     result = None
     recieved_exp = None
-    conn = Connector.DBConnector()
 
     try:
-        rows_amount, result = conn.execute(query)
-        conn.commit()
+        # within a lane the writes (e.g. a checkout) go before the reads
+        is_read_only = _get_call_tag('read_only', False)
+        with SCHEDULER.admit(_get_call_tag('lane', AdmissionScheduler.INTERACTIVE), priority=int(is_read_only)):
+            conn = Connector.DBConnector(read_only=is_read_only, shard=_get_call_tag('shard'))
+            try:
+                rows_amount, result = conn.execute(query)
+                conn.commit()
+                if conn.on_replica:
+                    _replica_read()
+            finally:
+                conn.close()
     except Exception as e:
         recieved_exp = e
         query_result = handle_database_exceptions(query, e)
-    finally:
-        conn.close()
 
     return query_result, rows_amount, result, recieved_exp
 
+
+def _replica_read():
+    since_last_write = Connector.DBConnector.since_last_write()
+    if since_last_write is None or since_last_write >= REPLICA_LAG:
+        return
+    RESULT_CACHE.skip_store()
+    # the calls of a batch are answered after its query (see batch_calls)
+    lagged = _get_call_tag('replica_lagged')
+    if lagged is not None:
+        lagged.append(True)
+
 def return_Value_select(qstatus:ReturnValue, rows_effected)-> ReturnValue:
         if qstatus == ReturnValue.OK and rows_effected == 0:
             return ReturnValue.NOT_EXISTS
         return qstatus
 
 
+@backend_api
+@every_shard
 def create_tables() -> None:
     query_string = ''
     for table in TABLES:
@@ -216,36 +1250,64 @@ def create_tables() -> None:
     for view in VIEWS:
         query_string += f'{view};\n'
 
+    for derived in DERIVED:
+        query_string += f'{derived};\n'
+
+    for precomputed in PRECOMPUTED:
+        query_string += f'{precomputed};\n'
+
+    if Connector.DBConnector.shard_count():
+        for sharding in SHARDING:
+            query_string += f'{sharding};\n'
+
+    for notification in NOTIFICATIONS:
+        query_string += f'{notification};\n'
+
+    for function in FUNCTIONS:
+        query_string += f'{function};\n'
+    query_string += f'{NOTIFY_FLUSH};\n'
+
     # print(query_string)
 
     query = sql.SQL(query_string)
     _, _, _, exp = handle_query(query)
-    if(DEBUG_FLAG and None != exp):
-        print('create_tables')
-        print(exp)
+    RESULT_CACHE.flush()
+    TRENDING.clear()
 
+@backend_api
+@every_shard
 def clear_tables() -> None:
-    query_string = '\n'.join([f"DELETE FROM {table} CASCADE;" for table in Tables_Names])
+    sharding_tables = Sharding_Tables_Names if Connector.DBConnector.shard_count() else []
+    query_string = '\n'.join([f"DELETE FROM {table} CASCADE;"
+                              for table in Tables_Names + Derived_Tables_Names + Precomputed_Tables_Names + sharding_tables])
     query = sql.SQL(query_string)
     _, _, _, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('clear_tables')
-        print(exp)
+    RESULT_CACHE.flush()
+    TRENDING.clear()
 
 
+@backend_api
+@every_shard
 def drop_tables() -> None:
-    query_string = '\n'.join([f"DROP VIEW IF EXISTS {view} CASCADE;" for view in Views_Names])
+    query_string = '\n'.join([f"DROP FUNCTION IF EXISTS {function} CASCADE;"
+                              for function in Functions_Names + Derived_Functions_Names + Notifications_Functions_Names])
+    query_string += '\n'.join([f"DROP TABLE IF EXISTS {table} CASCADE;"
+                               for table in Derived_Tables_Names + Precomputed_Tables_Names + Sharding_Tables_Names])
+    query_string += '\n'.join([f"DROP VIEW IF EXISTS {view} CASCADE;" for view in Views_Names])
     query_string += '\n'.join([f"DROP TABLE IF EXISTS {table} CASCADE;" for table in Tables_Names])
+    query_string += f'\n{NOTIFY_FLUSH};'
 
     query = sql.SQL(query_string)
     _, _, _, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('drop_tables')
-        print(exp)
+    RESULT_CACHE.flush()
+    TRENDING.clear()
 
 
 # CRUD API
 
+@backend_api
+@writes('Customers')
+@on_shard(lambda customer: _customer_shard(customer.get_cust_id()))
 def add_customer(customer: Customer) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = 'INSERT INTO Customers VALUES ({cust_id}, {full_name}, {age}, {phone_num});'
@@ -258,13 +1320,12 @@ def add_customer(customer: Customer) -> ReturnValue:
     )
     retVal, _, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('add_customer')
-        print(exp)
-
     return retVal
 
 
+@backend_api
+@read_only
+@on_shard(_customer_shard)
 def get_customer(customer_id: int) -> Customer:
     # TODO - Check Legal Params (Should be done by the DB)
     resultCustomer = BadCustomer()
@@ -273,9 +1334,6 @@ def get_customer(customer_id: int) -> Customer:
                    f"WHERE Cust_id = {customer_id};"
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_customer')
-        print(exp)
 
     if(1 == rowsAmount):
         resultCustomer = Customer(resultRows[0]['Cust_id'], resultRows[0]['Full_name'], resultRows[0]['Age'], resultRows[0]['Phone_num'])
@@ -283,6 +1341,9 @@ def get_customer(customer_id: int) -> Customer:
     return resultCustomer
 
 
+@backend_api
+@writes('Customers', 'Reservations', 'Customer_Ratings')
+@on_shard(_customer_shard)
 def delete_customer(customer_id: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     retVal = ReturnValue.OK
@@ -292,35 +1353,37 @@ def delete_customer(customer_id: int) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('delete_customer')
-        print(exp)
-
     if (0 == rowsAffected):
         retVal = ReturnValue.NOT_EXISTS
 
     return retVal
 
 
+@backend_api
+@writes('Orders')
+@on_shard(lambda order: _order_home_shard(order.get_order_id()))
 def add_order(order: Order) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = 'INSERT INTO Orders VALUES ({order_id}, {order_date}, {order_delivery_fee}, {order_address});'
+    if Connector.DBConnector.shard_count():
+        # registered on its home shard in the same transaction, so the id of an order that moved is ALREADY_EXISTS too
+        query_string += ' INSERT INTO Order_Shards VALUES ({order_id}, {shard});'
 
     query = sql.SQL(query_string).format(
         order_id=sql.Literal(order.get_order_id()),
         order_date=sql.Literal(order.get_datetime()),
         order_delivery_fee=sql.Literal(order.get_delivery_fee()),
-        order_address=sql.Literal(order.get_delivery_address())
+        order_address=sql.Literal(order.get_delivery_address()),
+        shard=sql.Literal(_get_call_tag('shard'))
     )
     retVal, _, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('add_order')
-        print(exp)
-
     return retVal
 
 
+@backend_api
+@read_only
+@on_shard(_order_shard)
 def get_order(order_id: int) -> Order:
     # TODO - Check Legal Params (Should be done by the DB)
     resultOrder = BadOrder()
@@ -329,9 +1392,6 @@ def get_order(order_id: int) -> Order:
                    f"WHERE Order_id = {order_id};"
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_order')
-        print(exp)
 
     if(1 == rowsAmount):
         resultOrder = Order(resultRows[0]['Order_id'], resultRows[0]['Date'], resultRows[0]['Delivery_fee'], resultRows[0]['Delivery_address'])
@@ -339,6 +1399,9 @@ def get_order(order_id: int) -> Order:
     return resultOrder
 
 
+@backend_api
+@writes('Orders', 'Reservations', 'Order_Details')
+@sharded(_delete_order)
 def delete_order(order_id: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     retVal = ReturnValue.OK
@@ -348,16 +1411,15 @@ def delete_order(order_id: int) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('delete_order')
-        print(exp)
-
     if (0 == rowsAffected):
         retVal = ReturnValue.NOT_EXISTS
 
     return retVal
 
 
+@backend_api
+@writes('Dishes')
+@every_shard
 def add_dish(dish: Dish) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = 'INSERT INTO Dishes VALUES ({dish_id}, {dish_name}, {dish_price}, {is_active});'
@@ -370,13 +1432,12 @@ def add_dish(dish: Dish) -> ReturnValue:
     )
     retVal, _, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('add_dish')
-        print(exp)
-
     return retVal
 
 
+@backend_api
+@read_only
+@on_shard(_shard_of)
 def get_dish(dish_id: int) -> Dish:
     # TODO - Check Legal Params (Should be done by the DB)
     resultDish = BadDish()
@@ -385,9 +1446,6 @@ def get_dish(dish_id: int) -> Dish:
                    f"WHERE Dish_id = {dish_id};"
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_dish')
-        print(exp)
 
     if(1 == rowsAmount):
         resultDish = Dish(resultRows[0]['Dish_id'], resultRows[0]['Name'], resultRows[0]['Price'], resultRows[0]['Is_active'])
@@ -395,6 +1453,9 @@ def get_dish(dish_id: int) -> Dish:
     return resultDish
 
 
+@backend_api
+@writes('Dishes')
+@every_shard
 def update_dish_price(dish_id: int, price: float) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = (f'UPDATE Dishes SET Price = {price} WHERE Dish_id = {dish_id} AND Is_active = TRUE;')
@@ -402,25 +1463,21 @@ def update_dish_price(dish_id: int, price: float) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('update_dish_price')
-        print(exp)
-
     if (0 == rowsAffected and ReturnValue.OK == retVal):
         retVal = ReturnValue.NOT_EXISTS
 
     return retVal
 
 
+@backend_api
+@writes('Dishes')
+@every_shard
 def update_dish_active_status(dish_id: int, is_active: bool) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = f'UPDATE Dishes SET Is_active = {is_active} ' \
                    f"WHERE Dish_id = {dish_id};"
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('update_dish_active_status')
-        print(exp)
 
     if (0 == rowsAffected  and ReturnValue.OK == retVal):
         retVal = ReturnValue.NOT_EXISTS
@@ -428,18 +1485,21 @@ def update_dish_active_status(dish_id: int, is_active: bool) -> ReturnValue:
     return retVal
 
 
+@backend_api
+@writes('Reservations')
+@sharded(_place_order)
 def customer_placed_order(customer_id: int, order_id: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = f'INSERT INTO Reservations VALUES ({order_id}, {customer_id});'
     query = sql.SQL(query_string)
     retVal, _, _, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('customer_placed_order')
-        print(exp)
 
     return retVal
 
 
+@backend_api
+@read_only
+@on_shard(_order_shard)
 def get_customer_that_placed_order(order_id: int) -> Customer:
     # TODO - Check Legal Params (Should be done by the DB)
     resultCustomer = BadCustomer()
@@ -450,9 +1510,6 @@ def get_customer_that_placed_order(order_id: int) -> Customer:
                    f"WHERE Order_id = {order_id});"
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_customer_that_placed_order')
-        print(exp)
 
     if(1 == rowsAmount):
         resultCustomer = Customer(resultRows[0]['Cust_id'], resultRows[0]['Full_name'], resultRows[0]['Age'], resultRows[0]['Phone_num'])
@@ -460,6 +1517,9 @@ def get_customer_that_placed_order(order_id: int) -> Customer:
     return resultCustomer
 
 
+@backend_api
+@writes('Order_Details')
+@on_shard(_order_shard)
 def order_contains_dish(order_id: int, dish_id: int, amount: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = f'INSERT INTO Order_Details ' \
@@ -471,13 +1531,15 @@ def order_contains_dish(order_id: int, dish_id: int, amount: int) -> ReturnValue
 
     if isinstance(exp, DatabaseException.NOT_NULL_VIOLATION):
         retVal = ReturnValue.NOT_EXISTS
-    elif (DEBUG_FLAG and None != exp):
-        print('order_contains_dish')
-        print(exp)
+    elif retVal == ReturnValue.OK:
+        TRENDING.add(dish_id, amount)
 
     return retVal
 
 
+@backend_api
+@writes('Order_Details')
+@on_shard(_order_shard)
 def order_does_not_contain_dish(order_id: int, dish_id: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     retVal = ReturnValue.OK
@@ -487,16 +1549,15 @@ def order_does_not_contain_dish(order_id: int, dish_id: int) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('order_does_not_contain_dish')
-        print(exp)
-
     if (0 == rowsAffected):
         retVal = ReturnValue.NOT_EXISTS
 
     return retVal
 
 
+@backend_api
+@read_only
+@on_shard(_order_shard)
 def get_all_order_items(order_id: int) -> List[OrderDish]:
     # TODO - Check Legal Params (Should be done by the DB)
     resultList = []
@@ -504,9 +1565,6 @@ def get_all_order_items(order_id: int) -> List[OrderDish]:
                    f'WHERE order_id = {order_id};'
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_all_order_items')
-        print(exp)
 
     # In case nothing was found the amount of rows will be 0 and the following loop will do nothing,
     # which will mean that the list is empty as initialized
@@ -516,6 +1574,9 @@ def get_all_order_items(order_id: int) -> List[OrderDish]:
     return resultList
 
 
+@backend_api
+@writes('Customer_Ratings')
+@on_shard(_customer_shard)
 def customer_rated_dish(cust_id: int, dish_id: int, rating: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     query_string = f'INSERT INTO Customer_Ratings VALUES ({cust_id}, {dish_id}, {rating});'
@@ -523,13 +1584,12 @@ def customer_rated_dish(cust_id: int, dish_id: int, rating: int) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, _, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('customer_rated_dish')
-        print(exp)
-
     return retVal
 
 
+@backend_api
+@writes('Customer_Ratings')
+@on_shard(_customer_shard)
 def customer_deleted_rating_on_dish(cust_id: int, dish_id: int) -> ReturnValue:
     # TODO - Check Legal Params (Should be done by the DB)
     retVal = ReturnValue.OK
@@ -539,15 +1599,14 @@ def customer_deleted_rating_on_dish(cust_id: int, dish_id: int) -> ReturnValue:
     query = sql.SQL(query_string)
     retVal, rowsAffected, _, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('order_does_not_contain_dish')
-        print(exp)
-
     if (0 == rowsAffected):
         retVal = ReturnValue.NOT_EXISTS
 
     return retVal
 
+@backend_api
+@read_only
+@on_shard(_customer_shard)
 def get_all_customer_ratings(cust_id: int) -> List[Tuple[int, int]]:
     # TODO - Check Legal Params (Should be done by the DB)
     resultList = []
@@ -556,9 +1615,6 @@ def get_all_customer_ratings(cust_id: int) -> List[Tuple[int, int]]:
                    f'ORDER BY Dish_id ASC;'
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
-    if (DEBUG_FLAG and None != exp):
-        print('get_all_customer_ratings')
-        print(exp)
 
     # In case nothing was found, the number of rows will be 0, and the following loop will do nothing.
     # This means that the list is empty as initialized
@@ -572,6 +1628,9 @@ def get_all_customer_ratings(cust_id: int) -> List[Tuple[int, int]]:
 # Basic API
 
 
+@backend_api
+@read_only
+@on_shard(_order_shard)
 def get_order_total_price(order_id: int) -> float:
     """
     Retrieves the total price of a given order, including the delivery fee.
@@ -583,15 +1642,11 @@ def get_order_total_price(order_id: int) -> float:
     # TODO - Check Legal Params (Should be done by the DB)
     totalPriceResult = 0.0
 
-    query_string = f'SELECT Total_Price FROM Order_Total_Price_View WHERE order_id = {order_id};'
+    query_string = 'SELECT Total_Price FROM Fn_Get_Order_Total_Price({order_id});'
 
-    query = sql.SQL(query_string)
+    query = sql.SQL(query_string).format(order_id=sql.Literal(order_id))
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_order_total_price')
-        print(exp)
-
     if 1 == rowsAmount:
         # According to the assignment this won't happen...
         totalPriceResult = float(resultRows[0]['Total_Price'])
@@ -599,6 +1654,12 @@ def get_order_total_price(order_id: int) -> float:
     return totalPriceResult
 
 
+@backend_api
+@columnar
+@cached('Customers', 'Reservations', 'Orders', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_customers_spent_max_avg_amount_money)
 def get_customers_spent_max_avg_amount_money() -> List[int]:
     """
     Retrieves the IDs of customers who have spent the maximum average amount of money on orders.
@@ -607,16 +1668,10 @@ def get_customers_spent_max_avg_amount_money() -> List[int]:
     :return: A list of customer IDs. Returns an empty list if no customers are found or an error occurs.
     """
     resultList = []
-    query_string = f'SELECT DISTINCT Cust_id FROM Customer_Avg_Spending_View ' \
-                   f'WHERE Avg_Spending = (SELECT MAX(Avg_Spending) FROM Customer_Avg_Spending_View) ' \
-                   f'ORDER BY Cust_id ASC;'
+    query_string = 'SELECT Cust_id FROM Fn_Get_Customers_Spent_Max_Avg_Amount_Money() ORDER BY Cust_id ASC;'
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_customers_spent_max_avg_amount_money')
-        print(exp)
-
     # In case nothing was found, the number of rows will be 0, and the following loop will do nothing.
     # This means that the list is empty as initialized
     for i in range(rowsAmount):
@@ -627,6 +1682,12 @@ def get_customers_spent_max_avg_amount_money() -> List[int]:
 
 # Dishes_Ordered_Amount_View
 # Use the View and select the max ordered dish_id (addtional order by dish_id (desc order))
+@backend_api
+@columnar
+@cached('Orders', 'Order_Details', 'Dishes')
+@analytic
+@read_only
+@sharded(_gather_most_ordered_dish_in_period)
 def get_most_ordered_dish_in_period(start: datetime, end: datetime) -> Dish:  
     """
     Retrieves the dish that was ordered the most within a specified time period.
@@ -637,20 +1698,11 @@ def get_most_ordered_dish_in_period(start: datetime, end: datetime) -> Dish:
     """
     resultDish = BadDish()
 
-    query_string = (f'SELECT * FROM Dishes WHERE Dish_id = '
-                    f'(SELECT Dish_id FROM Dishes_Ordered_Amount_View '
-                    f"WHERE Order_Date BETWEEN '{start}' AND '{end}' "
-                    f'GROUP BY Dish_id '
-                    f'ORDER BY SUM(Ordered_Amount) DESC, Dish_id ASC '
-                    f'LIMIT 1);') # ,  AS Tot_Amount
+    query_string = 'SELECT * FROM Fn_Get_Most_Ordered_Dish_In_Period({start}, {end});'
 
-    query = sql.SQL(query_string)
+    query = sql.SQL(query_string).format(start=sql.Literal(start), end=sql.Literal(end))
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_most_ordered_dish_in_period')
-        print(exp)
-
     # In case nothing was found, the number of rows will be 0, and the following loop will do nothing.
     # This means that the list is empty as initialized
     if 1 == rowsAmount:
@@ -667,6 +1719,11 @@ def get_most_ordered_dish_in_period(start: datetime, end: datetime) -> Dish:
 # 2. Select the rows that represent the given customer id
 # 3. Check if one of the dishes that are in the result, are included in the DishesRatings view (LIMITED TO 5)
 # FALSE - in case customer doesn't exist, has no orders related to him or there are no dishes in the DB
+@backend_api
+@cached('Dishes', 'Customer_Ratings', 'Reservations', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_did_customer_order_top_rated_dishes)
 def did_customer_order_top_rated_dishes(cust_id: int) -> bool:
     """
     Checks if a customer has ordered any of the top-rated dishes (dishes with an average rating of 5).
@@ -676,18 +1733,12 @@ def did_customer_order_top_rated_dishes(cust_id: int) -> bool:
     """
     result = False
 
-    query_string = (f'SELECT * FROM Customer_Ordered_Dishes_View '
-                    f'WHERE Cust_id = {cust_id} AND Dish_id IN '
-                    f'(SELECT Dish_id FROM Dish_Avg_Rating_View ORDER BY Avg_rating DESC LIMIT 5)')
+    query_string = 'SELECT Ordered_Top_Rated FROM Fn_Did_Customer_Order_Top_Rated_Dishes({cust_id});'
 
-    query = sql.SQL(query_string)
+    query = sql.SQL(query_string).format(cust_id=sql.Literal(cust_id))
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('did_customer_order_top_rated_dishes')
-        print(exp)
-
-    if 0 < rowsAmount:
+    if 1 == rowsAmount and resultRows[0]['Ordered_Top_Rated']:
         result = True
 
     return result
@@ -701,6 +1752,11 @@ def did_customer_order_top_rated_dishes(cust_id: int) -> bool:
 # Find all the dishes that were rated by the customer
 # Find all the dishes that were ordered by the customer (View)
 # (Rated - Ordered) is in (Lowest 5)? on all customers
+@backend_api
+@cached('Dishes', 'Customer_Ratings', 'Reservations', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_customers_rated_but_not_ordered)
 def get_customers_rated_but_not_ordered() -> List[int]:
     """
     Retrieves the IDs of customers who have rated dishes but have not placed any orders.
@@ -710,29 +1766,23 @@ def get_customers_rated_but_not_ordered() -> List[int]:
     """
     resultList = []
 
-    query_string = (f'SELECT DISTINCT CR.Cust_id FROM Customer_Ratings CR '
-                    f'WHERE '
-                        f'CR.Rating < 3 '
-                        f'AND CR.Dish_id IN (SELECT DAR.Dish_id FROM Dish_Avg_Rating_View DAR ORDER BY DAR.Avg_rating ASC LIMIT 5) '
-                        f'AND NOT EXISTS ('
-                                f'SELECT COD.Dish_id FROM Customer_Ordered_Dishes_View COD '
-                                f'WHERE COD.Cust_id = CR.Cust_id AND COD.Dish_id = CR.Dish_id '
-                        f') '
-                    f'ORDER BY CR.Cust_id ASC')
+    query_string = 'SELECT Cust_id FROM Fn_Get_Customers_Rated_But_Not_Ordered() ORDER BY Cust_id ASC;'
 
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('did_customer_order_top_rated_dishes')
-        print(exp)
-
     for i in range(rowsAmount):
         resultList.append(resultRows[i]['Cust_id'])
 
     return resultList
 
 
+@backend_api
+@columnar
+@cached('Dishes', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_non_worth_price_increase)
 def get_non_worth_price_increase() -> List[int]:
     """
     Retrieves the IDs of dishes that are not worth a price increase.
@@ -743,24 +1793,11 @@ def get_non_worth_price_increase() -> List[int]:
     """
     resultList = []
 
-    query_string = (f'SELECT curr.Dish_id '
-                    f'FROM '
-                        f'Avg_Profit_Per_Order ap JOIN '
-                        f'(SELECT D.Dish_id AS Dish_id ,D.Price AS Price ,appo.val AS val '
-                            f'FROM Avg_Profit_Per_Order appo JOIN '
-                                f'Dishes D ON (D.Dish_id = appo.Dish_id AND D.Price= appo.dish_price) '
-                                f'WHERE D.Is_active=true) AS curr '
-                        f'ON(ap.Dish_id = curr.dish_id) '
-                        f'WHERE curr.Price > ap.dish_price AND curr.val < ap.val '
-                        f'ORDER BY curr.dish_id ASC')
+    query_string = 'SELECT Dish_id FROM Fn_Get_Non_Worth_Price_Increase() ORDER BY Dish_id ASC;'
 
     query = sql.SQL(query_string)
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_non_worth_price_increase')
-        print(exp)
-
     for i in range(rowsAmount):
         resultList.append(resultRows[i]['Dish_id'])
 
@@ -769,6 +1806,12 @@ def get_non_worth_price_increase() -> List[int]:
 
 # A View that holds all the profit in each month per years
 # And each month will be the sum of itself and the month before them in the same year
+@backend_api
+@columnar
+@cached('Orders', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_cumulative_profit_per_month)
 def get_cumulative_profit_per_month(year: int) -> List[Tuple[int, float]]:
     """
     Calculates the cumulative profit per month for a given year.
@@ -781,44 +1824,11 @@ def get_cumulative_profit_per_month(year: int) -> List[Tuple[int, float]]:
     """
     resultList = []
 
-    query_string = (f'''
-        SELECT
-            months_series.MonthNum AS month,
-            COALESCE(
-                (
-                    SELECT SUM(COALESCE(mpv.Monthly_Profit, 0))
-                    FROM Monthly_Profit_View mpv
-                    WHERE mpv.Year = {year}
-                      AND mpv.Month <= months_series.MonthNum
-                ),
-                0
-            ) AS cumulative_profit
-        FROM
-            (
-                SELECT 1 AS MonthNum UNION ALL
-                SELECT 2 UNION ALL
-                SELECT 3 UNION ALL
-                SELECT 4 UNION ALL
-                SELECT 5 UNION ALL
-                SELECT 6 UNION ALL
-                SELECT 7 UNION ALL
-                SELECT 8 UNION ALL
-                SELECT 9 UNION ALL
-                SELECT 10 UNION ALL
-                SELECT 11 UNION ALL
-                SELECT 12
-            ) AS months_series
-        ORDER BY
-            months_series.MonthNum DESC;
-        ''')
+    query_string = 'SELECT Month, Cumulative_Profit FROM Fn_Get_Cumulative_Profit_Per_Month({year}) ORDER BY Month DESC;'
 
-    query = sql.SQL(query_string)
+    query = sql.SQL(query_string).format(year=sql.Literal(year))
     retVal, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_cumulative_profit_per_month')
-        print(exp)
-
     for i in range(rowsAmount):
         resultList.append((resultRows[i]['Month'], float(resultRows[i]['Cumulative_Profit'])))
 
@@ -826,6 +1836,11 @@ def get_cumulative_profit_per_month(year: int) -> List[Tuple[int, float]]:
 
 
 #
+@backend_api
+@cached('Customer_Ratings', 'Reservations', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_potential_dish_recommendations)
 def get_potential_dish_recommendations(cust_id: int) -> List[int]:
     """
     Retrieves potential dish recommendations for a given customer.
@@ -837,31 +1852,856 @@ def get_potential_dish_recommendations(cust_id: int) -> List[int]:
     """
     resultList = []
 
-    query_string = (
-        f'SELECT * FROM '
-        f'( '
-            f'(SELECT Dish_id FROM '
-            f'( '
-                f'(SELECT b FROM '
-                    f'(WITH RECURSIVE a_similar_b AS ( '
-                        f'SELECT * FROM SimilarRelation '
-                        f'UNION SELECT a_to_b.a, b_to_c.b '
-                        f'FROM a_similar_b a_to_b JOIN SimilarRelation b_to_c ON a_to_b.b = b_to_c.a '
-                    f') SELECT * FROM a_similar_b where a != b) '
-                f'WHERE a = {cust_id}) '
-            f') rs JOIN Customer_Ratings dr ON dr.Cust_id = rs.b '
-            f'WHERE dr.Rating >= 4) '
-            f'EXCEPT (SELECT Dish_id FROM Customer_Ordered_Dishes_View WHERE Cust_id = {cust_id}) '
-        f') ORDER BY dish_id ASC;')
+    query_string = 'SELECT Dish_id FROM Fn_Get_Potential_Dish_Recommendations({cust_id}) ORDER BY Dish_id ASC;'
 
-    query = sql.SQL(query_string)
+    query = sql.SQL(query_string).format(cust_id=sql.Literal(cust_id))
     _, rowsAmount, resultRows, exp = handle_query(query)
 
-    if (DEBUG_FLAG and None != exp):
-        print('get_cumulative_profit_per_month')
-        print(exp)
+    for i in range(rowsAmount):
+        resultList.append(resultRows[i]['Dish_id'])
+
+    return resultList
+
+
+# ---------------------------------- PAGINATION API: ----------------------------------
+
+# The list returning functions in pages - every page is the next page_size rows after the last id of the previous
+# page (keyset pagination), read in the order of the primary key index, so a page costs the same no matter how deep it is.
+# The iter_* generators fetch the pages lazily, one query per page, and raise the DatabaseException of a page
+# query that failed - an empty page is the end of the rows only when it was read.
+
+
+def _iterate_pages(get_page, get_key, page_size: int):
+    after = 0
+    while True:
+        errors = []
+        with _call_tag('query_errors', errors):
+            page = get_page(after, page_size)
+        if errors:
+            raise errors[0]
+        yield from page
+        if len(page) < page_size:
+            return
+        after = get_key(page[-1])
+
+
+@backend_api
+@read_only
+@on_shard(_order_shard)
+def get_order_items_page(order_id: int, after_dish_id: int = 0, page_size: int = PAGE_SIZE) -> List[OrderDish]:
+    """
+    Retrieves the next page of the items of an order, ordered by dish ID in ascending order.
+
+    :param order_id: The ID of the order.
+    :param after_dish_id: The dish ID of the last item of the previous page (0 for the first page).
+    :param page_size: The maximum number of items in the page.
+    :return: A list of up to page_size OrderDish, with dish IDs greater than after_dish_id.
+             Returns an empty list after the last page, for an illegal page_size or if an error occurs.
+    """
+    resultList = []
+    if page_size <= 0:
+        return resultList
+
+    query_string = 'SELECT * FROM Order_Details WHERE Order_id = {order_id} AND Dish_id > {after} ' \
+                   'ORDER BY Dish_id ASC LIMIT {page_size};'
+    query = sql.SQL(query_string).format(order_id=sql.Literal(order_id), after=sql.Literal(after_dish_id),
+                                         page_size=sql.Literal(page_size))
+    retVal, rowsAmount, resultRows, exp = handle_query(query)
+
+    for i in range(rowsAmount):
+        resultList.append(OrderDish(resultRows[i]['Dish_id'], resultRows[i]['Dish_amount'], resultRows[i]['Dish_price']))
+
+    return resultList
+
+
+def iter_order_items(order_id: int, page_size: int = PAGE_SIZE):
+    return _iterate_pages(lambda after, size: get_order_items_page(order_id, after, size),
+                          OrderDish.get_dish_id, page_size)
+
+
+@backend_api
+@read_only
+@on_shard(_customer_shard)
+def get_customer_ratings_page(cust_id: int, after_dish_id: int = 0, page_size: int = PAGE_SIZE) -> List[Tuple[int, int]]:
+    """
+    Retrieves the next page of the ratings of a customer, ordered by dish ID in ascending order.
+
+    :param cust_id: The ID of the customer.
+    :param after_dish_id: The dish ID of the last rating of the previous page (0 for the first page).
+    :param page_size: The maximum number of ratings in the page.
+    :return: A list of up to page_size tuples (dish_id, rating), with dish IDs greater than after_dish_id.
+             Returns an empty list after the last page, for an illegal page_size or if an error occurs.
+    """
+    resultList = []
+    if page_size <= 0:
+        return resultList
+
+    query_string = 'SELECT Dish_id, Rating FROM Customer_Ratings WHERE Cust_id = {cust_id} AND Dish_id > {after} ' \
+                   'ORDER BY Dish_id ASC LIMIT {page_size};'
+    query = sql.SQL(query_string).format(cust_id=sql.Literal(cust_id), after=sql.Literal(after_dish_id),
+                                         page_size=sql.Literal(page_size))
+    retVal, rowsAmount, resultRows, exp = handle_query(query)
+
+    for i in range(rowsAmount):
+        resultList.append((resultRows[i]['Dish_id'], resultRows[i]['Rating']))
+
+    return resultList
+
+
+def iter_customer_ratings(cust_id: int, page_size: int = PAGE_SIZE):
+    return _iterate_pages(lambda after, size: get_customer_ratings_page(cust_id, after, size),
+                          lambda rating: rating[0], page_size)
+
+
+@backend_api
+@cached('Dishes', 'Customer_Ratings', 'Reservations', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_customers_rated_but_not_ordered_page)
+def get_customers_rated_but_not_ordered_page(after_cust_id: int = 0, page_size: int = PAGE_SIZE) -> List[int]:
+    """
+    The next page of get_customers_rated_but_not_ordered.
+
+    :param after_cust_id: The last customer ID of the previous page (0 for the first page).
+    :param page_size: The maximum number of customer IDs in the page.
+    :return: A list of up to page_size customer IDs greater than after_cust_id, in ascending order.
+             Returns an empty list after the last page, for an illegal page_size or if an error occurs.
+    """
+    resultList = []
+    if page_size <= 0:
+        return resultList
+
+    query_string = 'SELECT Cust_id FROM Fn_Get_Customers_Rated_But_Not_Ordered() WHERE Cust_id > {after} ' \
+                   'ORDER BY Cust_id ASC LIMIT {page_size};'
+    query = sql.SQL(query_string).format(after=sql.Literal(after_cust_id), page_size=sql.Literal(page_size))
+    retVal, rowsAmount, resultRows, exp = handle_query(query)
+
+    for i in range(rowsAmount):
+        resultList.append(resultRows[i]['Cust_id'])
+
+    return resultList
+
+
+def iter_customers_rated_but_not_ordered(page_size: int = PAGE_SIZE):
+    return _iterate_pages(get_customers_rated_but_not_ordered_page, lambda cust_id: cust_id, page_size)
+
+
+@backend_api
+@cached('Customer_Ratings', 'Reservations', 'Order_Details')
+@analytic
+@read_only
+@sharded(_gather_potential_dish_recommendations_page)
+def get_potential_dish_recommendations_page(cust_id: int, after_dish_id: int = 0,
+                                            page_size: int = PAGE_SIZE) -> List[int]:
+    """
+    The next page of get_potential_dish_recommendations.
+
+    :param cust_id: The ID of the customer.
+    :param after_dish_id: The last dish ID of the previous page (0 for the first page).
+    :param page_size: The maximum number of dish IDs in the page.
+    :return: A list of up to page_size dish IDs greater than after_dish_id, in ascending order.
+             Returns an empty list after the last page, for an illegal page_size or if an error occurs.
+    """
+    resultList = []
+    if page_size <= 0:
+        return resultList
+
+    query_string = 'SELECT Dish_id FROM Fn_Get_Potential_Dish_Recommendations({cust_id}) WHERE Dish_id > {after} ' \
+                   'ORDER BY Dish_id ASC LIMIT {page_size};'
+    query = sql.SQL(query_string).format(cust_id=sql.Literal(cust_id), after=sql.Literal(after_dish_id),
+                                         page_size=sql.Literal(page_size))
+    _, rowsAmount, resultRows, exp = handle_query(query)
 
     for i in range(rowsAmount):
         resultList.append(resultRows[i]['Dish_id'])
 
     return resultList
+
+
+def iter_potential_dish_recommendations(cust_id: int, page_size: int = PAGE_SIZE):
+    return _iterate_pages(lambda after, size: get_potential_dish_recommendations_page(cust_id, after, size),
+                          lambda dish_id: dish_id, page_size)
+
+
+# ---------------------------------- BATCH API: ----------------------------------
+
+# A batch sends the queries of several API calls to the server together, as one statement (see Fn_Run_Batch),
+# so they cost one round trip instead of one each. Every call runs twice: once to capture its query (it stops at
+# handle_query), and once more when the results are back, to build its answer from its own result
+# (handle_query returns it), so the results and the ReturnValues are the ones of separate calls.
+# A call that does not reach a query (a cached result, another backend) is answered by its first run.
+
+# Columns whose JSON value is not of the type the driver returns for them
+BATCH_COLUMN_TYPES = {
+    'date': datetime.fromisoformat,
+    'delivery_fee': Decimal, 'price': Decimal, 'dish_price': Decimal, 'total_price': Decimal, 'cumulative_profit': Decimal,
+}
+
+
+class _QueryCaptured(BaseException):
+    # stops the first run of a batched call at its query, not an Exception so nothing on the way catches it
+    pass
+
+
+class _BatchColumn:
+    # a column description like the cursor's, for the ResultSet of a batched query
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _BatchQueryText(sql.Composable):
+    # the text of a query as a string literal, rendered with the connection that sends the batch
+    def as_string(self, context) -> str:
+        return sql.Literal(self._wrapped.as_string(context)).as_string(context)
+
+
+class _BatchedCall:
+    def __init__(self, func, args: tuple, kwargs: dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.query = None
+        self.read_only = False
+        self.lane = AdmissionScheduler.INTERACTIVE
+        self.result = None
+        # the cache versions of the first run, the answer is of the query captured then
+        self.versions = {}
+        # the answer was read from a replica that may miss a recent write (see REPLICA_LAG)
+        self.lagged = False
+
+    def handle_query(self, query: sql.SQL):
+        if self.result is None:
+            self.query = query
+            self.read_only = _get_call_tag('read_only', False)
+            self.lane = _get_call_tag('lane', AdmissionScheduler.INTERACTIVE)
+            raise _QueryCaptured()
+        if self.result[3] is not None or self.lagged:
+            RESULT_CACHE.skip_store()
+        return self.result
+
+    def run(self):
+        _batch.call = self
+        try:
+            with RESULT_CACHE.pin_versions(self.versions):
+                return self.func(*self.args, **self.kwargs)
+        finally:
+            _batch.call = None
+
+
+def _batch_result(query: sql.SQL, row) -> Tuple[ReturnValue, int, Connector.ResultSet, Exception]:
+    if row['Error_code'] is not None:
+        e = Connector.DBConnector.exception_for(row['Error_code'], row['Error_message'])
+        return handle_database_exceptions(query, e), 0, None, e
+    if row['Result'] is None:
+        return ReturnValue.OK, row['Rows_affected'], Connector.ResultSet(), None
+    # the rows as lists of (column, value), a query may return two columns of the same name
+    rows = json.loads(row['Result'], parse_float=Decimal, object_pairs_hook=list)
+    columns = [column for column, _ in rows[0]]
+    decoders = [BATCH_COLUMN_TYPES.get(column) for column in columns]
+    values = [tuple(value if decoder is None or value is None else decoder(value)
+                    for (_, value), decoder in zip(batch_row, decoders)) for batch_row in rows]
+    return ReturnValue.OK, row['Rows_affected'], \
+        Connector.ResultSet([_BatchColumn(column) for column in columns], values), None
+
+
+def batch_calls(calls: List[tuple]) -> list:
+    """
+    Runs several API calls with a single round trip to the database.
+    The queries run in the given order, in one transaction, each in its own subtransaction -
+    a call that fails is rolled back alone and gets the ReturnValue / empty answer it gets when called by itself.
+    A deadlock or a serialization failure fails the whole batch, and it is retried (see RETRY_POLICY) like
+    a call of its own. A batch of reads is also retried on a connection lost during its commit.
+
+    :param calls: (function, *args) of every call, e.g. [(get_dish, 1), (get_all_customer_ratings, 2)].
+    :return: The results of the calls, in the same order.
+    """
+    # the calls of a sharded database go to different shards, they are made one by one
+    if Connector.DBConnector.shard_count():
+        return [call[0](*call[1:]) for call in calls]
+
+    batched = [_BatchedCall(call[0], call[1:], {}) for call in calls]
+    results = [None] * len(batched)
+    pending = []
+    for index, call in enumerate(batched):
+        try:
+            results[index] = call.run()
+        except _QueryCaptured:
+            pending.append(index)
+    if not pending:
+        return results
+
+    read_only = all(batched[index].read_only for index in pending)
+    analytic = any(batched[index].lane == AdmissionScheduler.ANALYTIC for index in pending)
+    query = sql.SQL('SELECT * FROM Fn_Run_Batch(ARRAY[{statements}]::TEXT[]) ORDER BY Statement_no;').format(
+        statements=sql.SQL(', ').join(_BatchQueryText(batched[index].query) for index in pending))
+
+    lagged = []
+
+    @_tag_call('read_only', read_only)
+    @_tag_call('lane', AdmissionScheduler.ANALYTIC if analytic else AdmissionScheduler.INTERACTIVE)
+    @_tag_call('replica_lagged', lagged)
+    def send():
+        return handle_query(query)
+
+    retVal, rowsAmount, resultRows, exp = send()
+
+    for position, index in enumerate(pending):
+        call = batched[index]
+        call.lagged = bool(lagged)
+        if exp is not None or rowsAmount != len(pending):
+            call.result = (retVal if exp is not None else ReturnValue.ERROR), 0, None, exp
+        else:
+            call.result = _batch_result(call.query, resultRows[position])
+        results[index] = call.run()
+    return results
+
+
+# ---------------------------------- BUFFERED WRITES: ----------------------------------
+
+# Buffered ingestion of ratings, for the bursts that come after the deliveries: customer_rated_dish_buffered queues
+# the rating in RATINGS_BUFFER and returns right away, the buffer inserts the queued ratings in batches, one multi-row
+# INSERT per batch (per shard), see RATINGS_BUFFER.configure / RATINGS_BUFFER.stats().
+# When a rating of the batch breaks the INSERT (it exists already, its customer or dish does not...) the batch is
+# rolled back and its ratings are inserted again by batch_calls, each in its own subtransaction, so every rating gets
+# the ReturnValue customer_rated_dish returns for it. The ratings are inserted in the order they were queued.
+
+
+def _insert_ratings(ratings: List[Tuple[int, int, int]]) -> List[ReturnValue]:
+    if _backend is None:
+        values = ', '.join(f'({cust_id}, {dish_id}, {rating})' for cust_id, dish_id, rating in ratings)
+        query = sql.SQL(f'INSERT INTO Customer_Ratings VALUES {values};')
+        retVal, _, _, exp = handle_query(query)
+        if exp is None:
+            return [ReturnValue.OK] * len(ratings)
+        # whether the insert was applied is unknown, or the database turns away work - a row at a time would not help
+        if isinstance(exp, (DatabaseException.ConnectionInvalid, DatabaseException.ADMISSION_REJECTED)):
+            return [retVal] * len(ratings)
+    return batch_calls([(customer_rated_dish, cust_id, dish_id, rating) for cust_id, dish_id, rating in ratings])
+
+
+@writes('Customer_Ratings')
+def _apply_ratings(ratings: List[Tuple[int, int, int]]) -> List[ReturnValue]:
+    with QUERY_LOG.calling('customer_rated_dish_buffered', (f'{len(ratings)} ratings',)):
+        if not Connector.DBConnector.shard_count():
+            return _insert_ratings(ratings)
+        by_shard = {}
+        for index, (cust_id, _, _) in enumerate(ratings):
+            by_shard.setdefault(_customer_shard(cust_id), []).append(index)
+        results = [None] * len(ratings)
+        for shard, indexes in by_shard.items():
+            with _call_tag('shard', shard):
+                for index, result in zip(indexes, _insert_ratings([ratings[index] for index in indexes])):
+                    results[index] = result
+        return results
+
+
+# The ratings queued by customer_rated_dish_buffered, applied from a background thread (everything queued is applied
+# at exit, or by RATINGS_BUFFER.flush() / RATINGS_BUFFER.close())
+RATINGS_BUFFER = WriteBehindBuffer(_apply_ratings, name='ratings-buffer')
+
+
+def customer_rated_dish_buffered(cust_id: int, dish_id: int, rating: int) -> Future:
+    """
+    customer_rated_dish, applied later with the other queued ratings (see RATINGS_BUFFER).
+    Blocks while the buffer is full.
+
+    :return: A Future of the ReturnValue customer_rated_dish returns for the rating (ERROR right away when the
+             buffer stayed full for longer than its put_timeout).
+    """
+    try:
+        return RATINGS_BUFFER.submit((cust_id, dish_id, rating))
+    except DatabaseException.ADMISSION_REJECTED as e:
+        future = Future()
+        future.set_result(handle_database_exceptions(None, e))
+        return future
+
+
+# ---------------------------------- TRENDING: ----------------------------------
+
+# "Trending now" - the dishes ordered the most in the last minutes, answered from the TRENDING sketch in memory
+# (a SlidingHeavyHitters of 256 counters per minute, for up to an hour) without a query.
+# It counts the Dish_amount of every successful order_contains_dish of this process, when it was called (not the
+# Date of the order), and the details deleted later are not taken back.
+# See get_most_ordered_dish_in_period for the exact answer of any period.
+
+
+def get_trending_dishes(window: float = 900, k: int = 10) -> List[Tuple[int, int]]:
+    """
+    Retrieves the dishes ordered the most in the last window seconds (at most an hour).
+    The window is counted in whole minutes, the ones that started in it, so up to a minute of its oldest part
+    is left out.
+    The amounts are estimates - an amount is never below the true one and at most N / 256 above it,
+    N the total amount ordered in the window, and every dish ordered more than N / 256 times is counted.
+
+    :param window: The seconds back from now, e.g. 900 for the last 15 minutes.
+    :param k: The number of dishes.
+    :return: (dish_id, amount) of the k dishes ordered the most, by descending amount then ascending dish_id.
+    """
+    return [(dish_id, amount) for dish_id, amount, _ in TRENDING.top(k, window)]
+
+
+# ---------------------------------- BULK API: ----------------------------------
+
+# Snapshots are a directory holding one gzip compressed COPY stream per table and a manifest.
+# Every stream goes through COPY ... TO/FROM STDOUT in chunks, so a snapshot of any size
+# is exported and restored with constant client memory.
+# The BULK API serves the unsharded database only, it answers ERROR when the database is sharded (see SHARDING),
+# except sync_menu and the bulk deletes (delete_customers, delete_orders, purge_orders), which serve every shard.
+SNAPSHOT_FORMATS = {
+    'binary': '(FORMAT binary)',
+    'csv': '(FORMAT csv, HEADER true)',
+}
+SNAPSHOT_MANIFEST = 'manifest.json'
+# The fastest gzip level, the point is to keep up with the disk, not to get the smallest file
+SNAPSHOT_COMPRESS_LEVEL = 1
+
+
+def _snapshot_file(path: str, table: str, fmt: str) -> str:
+    return os.path.join(path, f'{table}.{fmt}.gz')
+
+
+def export_snapshot(path: str, fmt: str = 'binary') -> ReturnValue:
+    """
+    Streams all the tables into the directory `path` using COPY ... TO STDOUT.
+    All the tables are read in a single REPEATABLE READ transaction, so the snapshot is consistent.
+
+    :param path: The directory to write the snapshot into, it is created if missing.
+    :param fmt: 'binary' or 'csv'.
+    :return: OK on success, BAD_PARAMS for an unknown format, ERROR on any other failure.
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        return ReturnValue.BAD_PARAMS
+    if Connector.DBConnector.shard_count():
+        return ReturnValue.ERROR
+
+    retVal = ReturnValue.OK
+    manifest = {'format': fmt, 'tables': {}}
+    conn = None
+    try:
+        os.makedirs(path, exist_ok=True)
+        conn = Connector.DBConnector()
+        conn.set_read_only_snapshot()
+        for table in Tables_Names:
+            with gzip.open(_snapshot_file(path, table, fmt), 'wb', compresslevel=SNAPSHOT_COMPRESS_LEVEL) as stream:
+                manifest['tables'][table] = conn.copy(f'COPY {table} TO STDOUT {SNAPSHOT_FORMATS[fmt]}', stream)
+        conn.commit()
+
+        with open(os.path.join(path, SNAPSHOT_MANIFEST), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+    except Exception as e:
+        QUERY_LOG.failure(f'export_snapshot({path})', e)
+        retVal = handle_database_exceptions(sql.SQL(f'export_snapshot({path})'), e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return retVal
+
+
+def restore_snapshot(path: str) -> ReturnValue:
+    """
+    Replaces the content of all the tables with a snapshot written by export_snapshot.
+    The tables are loaded in foreign key dependency order (the reverse of Tables_Names) inside one transaction,
+    with their triggers disabled and without their secondary indexes - the derived tables are rebuilt and the
+    secondary indexes created once the data is in, instead of row by row.
+    (The primary keys are kept, COPY maintains them as it loads.)
+
+    :param path: The snapshot directory.
+    :return: OK on success, NOT_EXISTS if there is no snapshot in `path`, ERROR on any other failure
+             (in which case the tables are left untouched).
+    """
+    try:
+        with open(os.path.join(path, SNAPSHOT_MANIFEST)) as manifest_file:
+            manifest = json.load(manifest_file)
+    except OSError:
+        return ReturnValue.NOT_EXISTS
+
+    fmt = manifest.get('format')
+    if fmt not in SNAPSHOT_FORMATS:
+        return ReturnValue.BAD_PARAMS
+    if Connector.DBConnector.shard_count():
+        return ReturnValue.ERROR
+
+    retVal = ReturnValue.OK
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        # TRUNCATE in the same transaction as the COPY also lets the server skip most of the WAL
+        # the precomputed results are of the replaced content, they are gone until their jobs run again
+        conn.execute(f'TRUNCATE {", ".join(Tables_Names + Derived_Tables_Names + Precomputed_Tables_Names)};', commit=False)
+        conn.execute(f'DROP INDEX {", ".join(Secondary_Indexes_Names)};', commit=False)
+        # the derived tables are rebuilt once at the end, instead of by their triggers row by row
+        for table in Tables_Names:
+            conn.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER;', commit=False)
+        for table in reversed(Tables_Names):
+            with gzip.open(_snapshot_file(path, table, fmt), 'rb') as stream:
+                conn.copy(f'COPY {table} FROM STDIN {SNAPSHOT_FORMATS[fmt]}', stream)
+        for table in Tables_Names:
+            conn.execute(f'ALTER TABLE {table} ENABLE TRIGGER USER;', commit=False)
+        for rebuild in REBUILD_DERIVED:
+            conn.execute(rebuild, commit=False)
+        for indexes in SECONDARY_INDEXES:
+            conn.execute(indexes, commit=False)
+        # the rows were loaded without the change notifications
+        conn.execute(NOTIFY_FLUSH, commit=False)
+        conn.commit()
+
+        # refresh the planner statistics for the new content
+        conn.execute(' '.join([f'ANALYZE {table};' for table in Tables_Names + Derived_Tables_Names]))
+    except Exception as e:
+        QUERY_LOG.failure(f'restore_snapshot({path})', e)
+        retVal = handle_database_exceptions(sql.SQL(f'restore_snapshot({path})'), e)
+    finally:
+        if conn is not None:
+            conn.close()
+        RESULT_CACHE.flush()
+
+    return retVal
+
+
+# Work units per process, so a process that got the big components does not hold up the end of the run
+RECOMMENDATION_PARTITIONS_PER_PROCESS = 4
+
+
+def _recommendation_partitions(components: List[List[int]], partitions: int) -> List[List[int]]:
+    # the biggest components first, each to the partition with the fewest customers so far
+    loads = [[0, []] for _ in range(max(1, min(partitions, len(components))))]
+    for component in sorted(components, key=len, reverse=True):
+        lightest = min(loads, key=lambda load: load[0])
+        lightest[0] += len(component)
+        lightest[1].extend(component)
+    return [customers for _, customers in loads if customers]
+
+
+def _copy_rows(conn: Connector.DBConnector, table: str, rows) -> None:
+    stream = io.StringIO(''.join('\t'.join(str(value) for value in row) + '\n' for row in rows))
+    conn.copy(f'COPY {table} FROM STDIN', stream)
+
+
+def precompute_recommendations(processes: int = None, resume: bool = False, progress=None) -> ReturnValue:
+    """
+    Computes get_potential_dish_recommendations of every customer into Customer_Recommendations (Cust_id, Dish_id).
+    The ratings and the orders are read once, in one consistent snapshot, the similarity components are spread over
+    a pool of processes (see Utility.RecommendationJob) and every finished part is written with COPY in its own
+    transaction, along with its customers in Recommendations_Done.
+    A run that was interrupted is continued with resume=True - the customers already written are skipped
+    (a part whose customers changed since is computed again), a run without it starts over.
+
+    :param processes: The size of the process pool, the number of CPUs by default (1 computes in this process).
+    :param resume: Continue the previous run instead of replacing its results.
+    :param progress: Called with (customers done, customers in total) after every part is written.
+    :return: OK on success, ERROR on any failure (the parts written until then are kept for resume).
+    """
+    if Connector.DBConnector.shard_count():
+        return ReturnValue.ERROR
+    processes = processes or os.cpu_count() or 1
+    retVal = ReturnValue.OK
+    conn = None
+    pool = None
+    try:
+        conn = Connector.DBConnector()
+        if resume:
+            _, resultRows = conn.execute('SELECT Cust_id FROM Recommendations_Done')
+            done = set(resultRows['Cust_id'])
+        else:
+            conn.execute(f'TRUNCATE {", ".join(Precomputed_Tables_Names)};')
+            done = set()
+
+        reader = Connector.DBConnector(read_only=True)
+        try:
+            reader.set_read_only_snapshot()
+            _, likes = reader.execute('SELECT Cust_id, Dish_id FROM Customer_Ratings WHERE Rating >= 4', commit=False)
+            _, ordered_dishes = reader.execute('SELECT DISTINCT Cust_id, Dish_id FROM Customer_Ordered_Dishes_View',
+                                               commit=False)
+            reader.commit()
+        finally:
+            reader.close()
+        liked, ordered = {}, {}
+        for cust_id, dish_id in likes.rows:
+            liked.setdefault(cust_id, set()).add(dish_id)
+        for cust_id, dish_id in ordered_dishes.rows:
+            ordered.setdefault(cust_id, set()).add(dish_id)
+
+        # a customer that likes nothing reaches no one, it has no recommendations
+        components = [component for component in similarity_components(liked) if not done.issuperset(component)]
+        total = len(liked)
+        finished = total - sum(len(component) for component in components)
+        work = [{cust_id: (liked[cust_id], ordered.get(cust_id, set())) for cust_id in customers}
+                for customers in _recommendation_partitions(components, processes * RECOMMENDATION_PARTITIONS_PER_PROCESS)]
+        if processes > 1 and len(work) > 1:
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(component_recommendations, work)
+        else:
+            results = map(component_recommendations, work)
+
+        for recommendations in results:
+            customers = sql.SQL(', ').join(sql.Literal(cust_id) for cust_id in recommendations)
+            # the customers of a part that was written before they changed
+            conn.execute(sql.SQL('DELETE FROM Customer_Recommendations WHERE Cust_id IN ({customers});'
+                                 'DELETE FROM Recommendations_Done WHERE Cust_id IN ({customers});')
+                         .format(customers=customers), commit=False)
+            _copy_rows(conn, 'Customer_Recommendations',
+                       ((cust_id, dish_id) for cust_id, dishes in recommendations.items() for dish_id in dishes))
+            _copy_rows(conn, 'Recommendations_Done', ((cust_id,) for cust_id in recommendations))
+            conn.commit()
+            finished += len(recommendations)
+            if progress is not None:
+                progress(finished, total)
+    except Exception as e:
+        QUERY_LOG.failure('precompute_recommendations()', e)
+        retVal = handle_database_exceptions(sql.SQL('precompute_recommendations()'), e)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if conn is not None:
+            conn.close()
+
+    return retVal
+
+
+def _sync_menu_on(shard: Optional[int], dishes: List[Dish], deactivate_missing: bool) -> Tuple[ReturnValue, dict]:
+    retVal = ReturnValue.OK
+    summary = {}
+    conn = None
+    try:
+        conn = Connector.DBConnector(shard=shard)
+        # the staging table has the constraints of Dishes, so a bad dish fails the sync before anything is changed
+        staging = sql.SQL('CREATE TEMP TABLE Menu_Sync (LIKE Dishes INCLUDING ALL) ON COMMIT DROP;')
+        if dishes:
+            staging += sql.SQL('INSERT INTO Menu_Sync VALUES {rows};').format(rows=sql.SQL(', ').join(
+                sql.SQL('({})').format(sql.SQL(', ').join(sql.Literal(value) for value in (
+                    dish.get_dish_id(), dish.get_name(), dish.get_price(), dish.get_is_active())))
+                for dish in dishes))
+        # the other writes of Dishes wait until the sync commits, so the counts are of the rows it changed
+        staging += sql.SQL('LOCK TABLE Dishes IN SHARE ROW EXCLUSIVE MODE;')
+        conn.execute(staging, commit=False)
+
+        _, resultRows = conn.execute(f'''
+            SELECT COUNT(*) FILTER (WHERE D.Dish_id IS NULL) AS Inserted,
+                   COUNT(*) FILTER (WHERE D.Price <> M.Price AND M.Is_active) AS Price_changed,
+                   COUNT(*) FILTER (WHERE D.Name <> M.Name) AS Renamed,
+                   COUNT(*) FILTER (WHERE NOT D.Is_active AND M.Is_active) AS Activated,
+                   COUNT(*) FILTER (WHERE D.Is_active AND NOT M.Is_active)
+                   + (SELECT COUNT(*) FROM Dishes WHERE {deactivate_missing} AND Is_active
+                      AND Dish_id NOT IN (SELECT Dish_id FROM Menu_Sync)) AS Deactivated,
+                   COUNT(*) FILTER (WHERE (D.Name, D.Is_active) = (M.Name, M.Is_active)
+                                    AND (D.Price = M.Price OR NOT M.Is_active)) AS Unchanged
+            FROM Menu_Sync M LEFT JOIN Dishes D ON D.Dish_id = M.Dish_id;''', commit=False)
+        summary = {count: int(resultRows[0][count]) for count in MENU_SYNC_COUNTS}
+
+        # the rows that are the same are not written (no new row version, no trigger, no notification),
+        # and like update_dish_price, the price of a dish that is inactive after the sync is kept
+        update = '''
+            INSERT INTO Dishes AS D SELECT * FROM Menu_Sync
+            ON CONFLICT (Dish_id) DO UPDATE SET Name = EXCLUDED.Name, Is_active = EXCLUDED.Is_active,
+                Price = CASE WHEN EXCLUDED.Is_active THEN EXCLUDED.Price ELSE D.Price END
+            WHERE (D.Name, D.Is_active) IS DISTINCT FROM (EXCLUDED.Name, EXCLUDED.Is_active)
+                OR (EXCLUDED.Is_active AND D.Price <> EXCLUDED.Price);'''
+        if deactivate_missing:
+            update += '''
+            UPDATE Dishes SET Is_active = FALSE WHERE Is_active AND Dish_id NOT IN (SELECT Dish_id FROM Menu_Sync);'''
+        conn.execute(update, commit=False)
+        conn.commit()
+    except Exception as e:
+        QUERY_LOG.failure(f'sync_menu({len(dishes)} dishes)', e)
+        retVal = handle_database_exceptions(sql.SQL('sync_menu()'), e)
+        # a dish that is in the catalog twice
+        if retVal == ReturnValue.ALREADY_EXISTS:
+            retVal = ReturnValue.BAD_PARAMS
+        summary = {}
+    finally:
+        if conn is not None:
+            conn.close()
+
+    return retVal, summary
+
+
+@backend_api
+@writes('Dishes')
+def sync_menu(dishes: List[Dish], deactivate_missing: bool = False) -> Tuple[ReturnValue, dict]:
+    """
+    Makes Dishes hold the given catalog, in a few round trips whatever its size, instead of an add_dish /
+    update_dish_price / update_dish_active_status call per dish.
+    The catalog is loaded into a staging table, and the difference is applied on the server by one
+    INSERT ... ON CONFLICT DO UPDATE that writes only the dishes that are new or changed.
+    Like update_dish_price, the price of a dish that is inactive after the sync is not changed.
+    On a sharded database the catalog is synced on every shard (see SHARDING).
+
+    :param dishes: The whole catalog, every dish at most once.
+    :param deactivate_missing: Deactivate the active dishes that are not in the catalog.
+    :return: (ReturnValue, summary) - OK and the number of dishes by MENU_SYNC_COUNTS (a dish can be counted for a
+             new price and a new status together), BAD_PARAMS if a dish is not legal or appears twice,
+             ERROR on any other failure. Unless it is OK the summary is empty, and nothing was changed
+             (but on a sharded database, the shards synced before the one that failed stay synced).
+    """
+    shards = list(range(Connector.DBConnector.shard_count())) or [None]
+    summaries = []
+    for shard in shards:
+        retVal, summary = _sync_menu_on(shard, dishes, deactivate_missing)
+        if retVal != ReturnValue.OK:
+            return retVal, {}
+        summaries.append(summary)
+    # the shards hold the same Dishes, a shard that did not change the same dishes was not in sync
+    if any(summary != summaries[0] for summary in summaries):
+        return ReturnValue.ERROR, {}
+    return ReturnValue.OK, summaries[0]
+
+
+def _batches(keys, batch_size: int) -> List[list]:
+    # in key order, so concurrent bulk deletes lock the rows they share in the same order
+    keys = sorted(set(keys))
+    return [keys[start:start + batch_size] for start in range(0, len(keys), batch_size)]
+
+
+# runs the DELETE ... RETURNING <key> query on the shard (None for the unsharded database) in a transaction of its own
+def _delete_batch(shard: Optional[int], query: sql.Composable) -> Tuple[ReturnValue, List[int]]:
+    with _call_tag('shard', shard):
+        retVal, _, resultRows, exp = handle_query(query)
+    return retVal, ([key for key, in resultRows.rows] if exp is None else [])
+
+
+# the Order_Shards rows of the deleted orders, so their ids can be used again (see add_order)
+def _unregister_orders(order_ids: List[int]) -> ReturnValue:
+    by_home = {}
+    for order_id in order_ids:
+        by_home.setdefault(_order_home_shard(order_id), []).append(order_id)
+    for home, ids in by_home.items():
+        retVal, _ = _delete_batch(home, sql.SQL('DELETE FROM Order_Shards WHERE Order_id = ANY({ids}) '
+                                                'RETURNING Order_id;').format(ids=sql.Literal(ids)))
+        if retVal != ReturnValue.OK:
+            return retVal
+    return ReturnValue.OK
+
+
+# the shards of the existing orders of order_ids -> their order ids there
+def _orders_by_shard(order_ids: List[int]) -> Tuple[ReturnValue, dict]:
+    by_home = {}
+    for order_id in order_ids:
+        by_home.setdefault(_order_home_shard(order_id), []).append(order_id)
+    by_shard = {}
+    for home, ids in by_home.items():
+        query = sql.SQL('SELECT Order_id, Shard FROM Order_Shards WHERE Order_id = ANY({ids});').format(ids=sql.Literal(ids))
+        with _call_tag('shard', home):
+            retVal, _, resultRows, exp = handle_query(query)
+        if exp is not None:
+            return retVal, {}
+        for order_id, shard in resultRows.rows:
+            by_shard.setdefault(shard, []).append(order_id)
+    return ReturnValue.OK, by_shard
+
+
+@backend_api
+@writes('Customers', 'Reservations', 'Customer_Ratings')
+def delete_customers(customer_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                     progress=None) -> Tuple[ReturnValue, int]:
+    """
+    delete_customer of many customers (e.g. a GDPR purge), batch_size customers per DELETE and per transaction,
+    with their reservations and ratings (ON DELETE CASCADE). The ids of customers that do not exist are skipped.
+
+    :param customer_ids: The customers to delete.
+    :param batch_size: The customers per transaction.
+    :param progress: Called with (customers done, customers in total) after every batch.
+    :return: (ReturnValue, the number of customers deleted) - OK, or the ReturnValue of the batch that failed,
+             the batches before it stay deleted.
+    """
+    shards = Connector.DBConnector.shard_count()
+    by_shard = {}
+    for cust_id in set(customer_ids):
+        by_shard.setdefault(_customer_shard(cust_id) if shards else None, []).append(cust_id)
+    total = sum(len(ids) for ids in by_shard.values())
+    done = deleted = 0
+    for shard, ids in by_shard.items():
+        for batch in _batches(ids, batch_size):
+            query = sql.SQL('DELETE FROM Customers WHERE Cust_id = ANY({ids}) RETURNING Cust_id;').format(
+                ids=sql.Literal(batch))
+            retVal, keys = _delete_batch(shard, query)
+            if retVal != ReturnValue.OK:
+                return retVal, deleted
+            done += len(batch)
+            deleted += len(keys)
+            if progress is not None:
+                progress(done, total)
+    return ReturnValue.OK, deleted
+
+
+@backend_api
+@writes('Orders', 'Reservations', 'Order_Details')
+def delete_orders(order_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                  progress=None) -> Tuple[ReturnValue, int]:
+    """
+    delete_order of many orders, batch_size orders per DELETE and per transaction, with their reservations and
+    order details (ON DELETE CASCADE). The ids of orders that do not exist are skipped.
+
+    :param order_ids: The orders to delete.
+    :param batch_size: The orders per transaction.
+    :param progress: Called with (orders done, orders in total) after every batch.
+    :return: (ReturnValue, the number of orders deleted) - OK, or the ReturnValue of the batch that failed,
+             the batches before it stay deleted.
+    """
+    batches = _batches(order_ids, batch_size)
+    total = sum(len(batch) for batch in batches)
+    done = deleted = 0
+    for batch in batches:
+        if Connector.DBConnector.shard_count():
+            retVal, by_shard = _orders_by_shard(batch)
+            if retVal != ReturnValue.OK:
+                return retVal, deleted
+        else:
+            by_shard = {None: batch}
+        for shard, ids in by_shard.items():
+            query = sql.SQL('DELETE FROM Orders WHERE Order_id = ANY({ids}) RETURNING Order_id;').format(
+                ids=sql.Literal(ids))
+            retVal, keys = _delete_batch(shard, query)
+            if retVal == ReturnValue.OK and shard is not None:
+                retVal = _unregister_orders(keys)
+            if retVal != ReturnValue.OK:
+                return retVal, deleted
+            deleted += len(keys)
+        done += len(batch)
+        if progress is not None:
+            progress(done, total)
+    return ReturnValue.OK, deleted
+
+
+@backend_api
+@writes('Orders', 'Reservations', 'Order_Details')
+def purge_orders(before: datetime, batch_size: int = DELETE_BATCH_SIZE, progress=None) -> Tuple[ReturnValue, int]:
+    """
+    Deletes the orders dated before `before`, oldest first, batch_size orders per transaction
+    (found through the index on Orders.Date), with their reservations and order details.
+
+    :param before: The orders of any earlier date are deleted.
+    :param batch_size: The orders per transaction.
+    :param progress: Called with (orders deleted, orders to delete) after every batch - the orders to delete are
+                     the ones that were older than `before` when the purge started.
+    :return: (ReturnValue, the number of orders deleted) - OK, or the ReturnValue of the batch that failed,
+             the batches before it stay deleted.
+    """
+    shards = [None] if not Connector.DBConnector.shard_count() else list(range(Connector.DBConnector.shard_count()))
+    older = sql.SQL('Date < {before}').format(before=sql.Literal(before))
+    total = 0
+    for shard in shards:
+        with _call_tag('shard', shard):
+            retVal, _, resultRows, exp = handle_query(sql.SQL('SELECT COUNT(*) AS Orders FROM Orders WHERE {older};')
+                                                      .format(older=older))
+        if exp is not None:
+            return retVal, 0
+        total += resultRows[0]['Orders']
+
+    deleted = 0
+    for shard in shards:
+        query = sql.SQL('DELETE FROM Orders WHERE Order_id IN '
+                        '(SELECT Order_id FROM Orders WHERE {older} ORDER BY Date LIMIT {limit}) '
+                        'RETURNING Order_id;').format(older=older, limit=sql.Literal(batch_size))
+        while True:
+            retVal, keys = _delete_batch(shard, query)
+            if retVal == ReturnValue.OK and shard is not None:
+                retVal = _unregister_orders(keys)
+            if retVal != ReturnValue.OK:
+                return retVal, deleted
+            deleted += len(keys)
+            if progress is not None and keys:
+                progress(deleted, total)
+            if len(keys) < batch_size:
+                break
+    return ReturnValue.OK, deleted
@@ -0,0 +1,190 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer
+from Business.Order import Order
+from Business.Dish import Dish, BadDish
+
+'''
+    The Basic and Advanced API over one small data set, with the answers worked out by hand
+'''
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for cust_id in (1, 2, 3):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, f'name{cust_id}', 30, "0123456789")))
+        for dish in (Dish(1, 'Pizza', 10, True), Dish(2, 'Pasta', 20, True), Dish(3, 'Salad', 5, True), Dish(4, 'Soup', 7, True)):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(dish))
+        orders = [Order(1, datetime(2024, 1, 10, 12, 0), 5, 'Haifa street'),
+                  Order(2, datetime(2024, 2, 15, 18, 0), 0, 'Haifa street'),
+                  Order(3, datetime(2024, 2, 20, 9, 0), 2.5, 'Haifa street'),
+                  Order(4, datetime(2025, 1, 1, 0, 0), 1, 'Haifa street')]
+        for order in orders:
+            self.assertEqual(ReturnValue.OK, Solution.add_order(order))
+        for cust_id, order_id in ((1, 1), (1, 2), (2, 3)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(cust_id, order_id))
+        for order_id, dish_id, amount in ((1, 1, 2), (1, 2, 1), (2, 3, 4), (3, 2, 1), (3, 1, 1)):
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, dish_id, amount))
+        # order 4 is made after Pizza got more expensive
+        self.assertEqual(ReturnValue.OK, Solution.update_dish_price(1, 12))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(4, 1, 1))
+        for cust_id, dish_id, rating in ((1, 1, 5), (1, 2, 4), (2, 1, 4), (2, 3, 1), (3, 3, 2), (3, 2, 5), (3, 4, 5)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, dish_id, rating))
+
+    def test_basic_api(self) -> None:
+        self.assertAlmostEqual(45.0, Solution.get_order_total_price(1))
+        self.assertAlmostEqual(32.5, Solution.get_order_total_price(3))
+        self.assertEqual([1, 2], Solution.get_customers_spent_max_avg_amount_money())
+        self.assertEqual(Dish(1, 'Pizza', 12, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 1), datetime(2024, 1, 31)))
+        self.assertEqual(Dish(3, 'Salad', 5, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 1), datetime(2024, 12, 31)))
+        # only order 3 is inside the period, its two dishes tie and the lower id wins
+        self.assertEqual(Dish(1, 'Pizza', 12, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 2, 15, 18, 0, 1), datetime(2024, 2, 20, 9, 0)))
+        self.assertEqual(BadDish(), Solution.get_most_ordered_dish_in_period(datetime(2023, 1, 1), datetime(2023, 12, 31)))
+        self.assertTrue(Solution.did_customer_order_top_rated_dishes(1))
+        self.assertFalse(Solution.did_customer_order_top_rated_dishes(3))
+
+    def test_advanced_api(self) -> None:
+        self.assertEqual([2, 3], Solution.get_customers_rated_but_not_ordered())
+        self.assertEqual([1], Solution.get_non_worth_price_increase())
+        self.assertEqual([(12, 97.5), (11, 97.5), (10, 97.5), (9, 97.5), (8, 97.5), (7, 97.5), (6, 97.5), (5, 97.5),
+                          (4, 97.5), (3, 97.5), (2, 97.5), (1, 45.0)], Solution.get_cumulative_profit_per_month(2024))
+        self.assertEqual([4], Solution.get_potential_dish_recommendations(1))
+        self.assertEqual([], Solution.get_potential_dish_recommendations(3))
+
+    def test_spending_follows_order_changes(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(3, 4, 1))
+        self.assertEqual([2], Solution.get_customers_spent_max_avg_amount_money())
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(3, 4))
+        self.assertEqual([1, 2], Solution.get_customers_spent_max_avg_amount_money())
+        # an order that is placed after its dishes were added counts with them
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(4, 2, 2))
+        self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(3, 4))
+        self.assertEqual([3], Solution.get_customers_spent_max_avg_amount_money())
+
+    def test_concurrent_orders_of_a_customer(self) -> None:
+        # two transactions place orders of the same customer at once, with and without a spending row of the customer
+        for order_id in (5, 6, 7, 8):
+            self.assertEqual(ReturnValue.OK, Solution.add_order(Order(order_id, datetime(2024, 3, 1), 1, 'Haifa street')))
+        for cust_id, first, second in ((3, 5, 6), (1, 7, 8)):
+            conns = [Connector.DBConnector(), Connector.DBConnector()]
+            errors = []
+
+            def place_second():
+                try:
+                    conns[1].execute(f'INSERT INTO Reservations VALUES ({second}, {cust_id});')
+                except Exception as e:
+                    errors.append(e)
+
+            try:
+                conns[0].execute(f'INSERT INTO Reservations VALUES ({first}, {cust_id});', commit=False)
+                second_thread = threading.Thread(target=place_second)
+                second_thread.start()
+                # the second one waits for the first one's refresh of the customer
+                time.sleep(0.2)
+                conns[0].commit()
+                second_thread.join()
+            finally:
+                for conn in conns:
+                    conn.close()
+            self.assertEqual([], errors)
+
+        conn = Connector.DBConnector()
+        try:
+            _, stats = conn.execute('SELECT Cust_id, Order_count, Total_spent FROM Customer_Spending_Stats ORDER BY Cust_id')
+        finally:
+            conn.close()
+        self.assertEqual([(1, 4, 67), (2, 1, 32.5), (3, 2, 2)], [(cust_id, count, float(spent)) for cust_id, count, spent in stats.rows])
+
+    def test_order_details_race_a_reservation(self) -> None:
+        # a line is added to an order of a customer while another order of the customer is placed, then a line is
+        # added to an order while the order is placed
+        for order_id in (5, 6):
+            self.assertEqual(ReturnValue.OK, Solution.add_order(Order(order_id, datetime(2024, 3, 1), 1, 'Haifa street')))
+        for detail, reservation in (('(3, 3, 2, 5)', '(5, 2)'), ('(6, 3, 2, 5)', '(6, 3)')):
+            conns = [Connector.DBConnector(), Connector.DBConnector()]
+            errors = []
+
+            def place():
+                try:
+                    conns[1].execute(f'INSERT INTO Reservations VALUES {reservation};')
+                except Exception as e:
+                    errors.append(e)
+
+            try:
+                conns[0].execute(f'INSERT INTO Order_Details VALUES {detail};', commit=False)
+                place_thread = threading.Thread(target=place)
+                place_thread.start()
+                # the reservation waits for the line's transaction
+                time.sleep(0.2)
+                conns[0].commit()
+                place_thread.join()
+            finally:
+                for conn in conns:
+                    conn.close()
+            self.assertEqual([], errors)
+
+        conn = Connector.DBConnector()
+        try:
+            _, stats = conn.execute('SELECT Cust_id, Order_count, Total_spent FROM Customer_Spending_Stats ORDER BY Cust_id')
+        finally:
+            conn.close()
+        self.assertEqual([(1, 2, 65), (2, 2, 43.5), (3, 1, 11)], [(cust_id, count, float(spent)) for cust_id, count, spent in stats.rows])
+
+    def test_price_epochs_follow_order_changes(self) -> None:
+        # Pizza at 12 is ordered 4 times per order now, more profit than at 10
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(2, 1, 7))
+        self.assertEqual([], Solution.get_non_worth_price_increase())
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(2, 1))
+        self.assertEqual([1], Solution.get_non_worth_price_increase())
+        # no order at the current price
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(4))
+        self.assertEqual([], Solution.get_non_worth_price_increase())
+
+        conn = Connector.DBConnector()
+        try:
+            _, epochs = conn.execute('SELECT * FROM Dish_Price_Epochs ORDER BY Dish_id, Dish_price')
+            _, rebuilt = conn.execute(Solution.REBUILD_DISH_PRICE_EPOCHS.replace('INSERT INTO Dish_Price_Epochs', '')
+                                      + ' ORDER BY Dish_id, Dish_price')
+        finally:
+            conn.close()
+        self.assertEqual(rebuilt.rows, epochs.rows)
+
+    def test_period_boundaries(self) -> None:
+        # whole days only, order 3 is after the end of the period
+        self.assertEqual(Dish(3, 'Salad', 5, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 2, 15), datetime(2024, 2, 20)))
+        # a partial day at each end
+        self.assertEqual(Dish(3, 'Salad', 5, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 10, 12, 0), datetime(2024, 2, 20, 9, 0)))
+        self.assertEqual(Dish(1, 'Pizza', 12, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 10, 12, 0), datetime(2024, 2, 15, 17, 59, 59)))
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(2))
+        self.assertEqual(Dish(1, 'Pizza', 12, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 1), datetime(2024, 12, 31)))
+        self.assertEqual(BadDish(), Solution.get_most_ordered_dish_in_period(datetime(2024, 2, 15), datetime(2024, 2, 20)))
+
+    def test_after_deletes(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(1))
+        self.assertEqual([2], Solution.get_customers_spent_max_avg_amount_money())
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(2))
+        self.assertEqual([1], Solution.get_customers_spent_max_avg_amount_money())
+        self.assertEqual(ReturnValue.OK, Solution.order_does_not_contain_dish(2, 3))
+        self.assertEqual(Dish(1, 'Pizza', 12, True),
+                         Solution.get_most_ordered_dish_in_period(datetime(2024, 1, 1), datetime(2024, 12, 31)))
+        self.assertEqual([(12, 32.5), (11, 32.5), (10, 32.5), (9, 32.5), (8, 32.5), (7, 32.5), (6, 32.5), (5, 32.5),
+                          (4, 32.5), (3, 32.5), (2, 32.5), (1, 0.0)], Solution.get_cumulative_profit_per_month(2024))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,110 @@
+import unittest
+from psycopg2 import sql
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Retry import RetryPolicy
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Tests.MemoryBackendTest import workload, run
+from Business.Customer import Customer
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def batch(self, calls: list) -> list:
+        results = Solution.batch_calls([(getattr(Solution, name), *args) for name, *args in calls])
+        for index, (name, *_) in enumerate(calls):
+            if name == 'get_all_order_items':
+                results[index] = sorted(results[index], key=lambda item: item.get_dish_id())
+        return results
+
+    def test_same_results_as_calls(self) -> None:
+        for seed in range(3):
+            calls = workload(seed, 300)
+            Solution.clear_tables()
+            expected = run(calls)
+            Solution.clear_tables()
+            actual = []
+            for start in range(0, len(calls), 25):
+                actual += self.batch(calls[start:start + 25])
+            for call, expected_result, actual_result in zip(calls, expected, actual):
+                self.assertEqual(expected_result, actual_result, f'seed {seed}: {call}')
+
+    def test_failed_calls(self) -> None:
+        results = Solution.batch_calls([
+            (Solution.add_customer, Customer(1, 'name', 30, '0123456789')),
+            (Solution.add_customer, Customer(1, 'name', 30, '0123456789')),
+            (Solution.add_dish, Dish(1, 'Pizza', -1, True)),
+            (Solution.customer_rated_dish, 1, 2, 5),
+            (Solution.add_dish, Dish(1, 'Pizza', 10, True)),
+            (Solution.get_dish, 1),
+            (Solution.get_customer, 2),
+        ])
+        self.assertEqual([ReturnValue.OK, ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS,
+                          ReturnValue.NOT_EXISTS, ReturnValue.OK], results[:5])
+        self.assertEqual(Dish(1, 'Pizza', 10, True), results[5])
+        self.assertEqual(Solution.BadCustomer(), results[6])
+        # the failed calls were rolled back alone
+        self.assertEqual(Customer(1, 'name', 30, '0123456789'), Solution.get_customer(1))
+
+    def test_deadlock_retries_the_batch(self) -> None:
+        # a statement that deadlocks on its first run only (a sequence is not rolled back with the transaction)
+        conn = Connector.DBConnector()
+        try:
+            conn.execute('CREATE SEQUENCE Batch_Test_Runs;'
+                         'CREATE FUNCTION Fn_Batch_Test_Deadlock() RETURNS INTEGER LANGUAGE plpgsql AS $$ BEGIN '
+                         "IF nextval('Batch_Test_Runs') = 1 THEN RAISE EXCEPTION 'deadlock' USING ERRCODE = '40P01'; END IF; "
+                         'RETURN 1; END $$;')
+        finally:
+            conn.close()
+        policy = Solution.RETRY_POLICY
+        Solution.RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=0.001)
+        try:
+            retVal, rowsAmount, resultRows, exp = Solution.handle_query(sql.SQL(
+                "SELECT * FROM Fn_Run_Batch(ARRAY['SELECT Fn_Batch_Test_Deadlock() AS Value']) ORDER BY Statement_no;"))
+            self.assertEqual((ReturnValue.OK, None), (retVal, exp))
+            self.assertEqual((None, '[{"value":1}]'), (resultRows[0]['Error_code'], resultRows[0]['Result']))
+            self.assertEqual({'40P01': 1}, Solution.RETRY_POLICY.metrics()['retries'])
+        finally:
+            Solution.RETRY_POLICY = policy
+            conn = Connector.DBConnector()
+            try:
+                conn.execute('DROP FUNCTION Fn_Batch_Test_Deadlock; DROP SEQUENCE Batch_Test_Runs;')
+            finally:
+                conn.close()
+
+    def test_cache(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10, True)))
+        self.assertEqual([], Solution.get_non_worth_price_increase())
+        # a cached read is answered without the database, the reads after a write see it
+        results = Solution.batch_calls([(Solution.get_non_worth_price_increase,),
+                                        (Solution.add_customer, Customer(1, 'name', 30, '0123456789')),
+                                        (Solution.customer_rated_dish, 1, 1, 1),
+                                        (Solution.get_customers_rated_but_not_ordered,)])
+        self.assertEqual([[], ReturnValue.OK, ReturnValue.OK, [1]], results)
+        self.assertEqual([1], Solution.get_customers_rated_but_not_ordered())
+
+    def test_cache_of_a_write_during_the_batch(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10, True)))
+        for cust_id in (1, 2):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, 'name', 30, '0123456789')))
+        self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(1, 1, 1))
+        handle_query = Solution.handle_query
+
+        # another call rates after the batch ran, before its calls are made again with the answers
+        def rate_after_batch(query):
+            result = handle_query(query)
+            if 'Fn_Run_Batch' in repr(query):
+                self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(2, 1, 1))
+            return result
+        Solution.handle_query = rate_after_batch
+        try:
+            self.assertEqual([[1]], Solution.batch_calls([(Solution.get_customers_rated_but_not_ordered,)]))
+        finally:
+            Solution.handle_query = handle_query
+        self.assertEqual([1, 2], Solution.get_customers_rated_but_not_ordered())
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
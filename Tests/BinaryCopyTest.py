@@ -0,0 +1,79 @@
+import io
+import unittest
+from datetime import datetime
+import numpy as np
+import Solution as Solution
+import Utility.DBConnector as Connector
+import Utility.BinaryCopy as BinaryCopy
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Order import Order
+from Business.Dish import Dish
+
+QUERY = '''
+SELECT i AS id, (i * 1.25)::NUMERIC(10, 2) AS price, TIMESTAMP '2024-01-01' + i * INTERVAL '1 hour' AS date,
+       i % 3 = 0 AS active, CASE WHEN i % 7 = 0 THEN NULL ELSE i * 0.5 END AS fee, 'dish ' || i AS name
+FROM generate_series(1, 500) i
+'''
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.conn = Connector.DBConnector()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        super().tearDown()
+
+    def test_same_values_as_execute(self) -> None:
+        arrays = self.conn.fetch_arrays(QUERY)
+        _, result = self.conn.execute(QUERY, commit=False)
+        self.assertEqual(['id', 'price', 'date', 'active', 'fee', 'name'], list(arrays))
+        self.assertEqual(np.int64, arrays['id'].dtype)
+        self.assertEqual(result['id'], arrays['id'].tolist())
+        self.assertEqual([float(price) for price in result['price']], arrays['price'].tolist())
+        self.assertEqual(result['date'], arrays['date'].tolist())
+        self.assertEqual(result['active'], arrays['active'].tolist())
+        self.assertEqual([fee is None for fee in result['fee']], np.isnan(arrays['fee']).tolist())
+        self.assertEqual([float(fee) for fee in result['fee'] if fee is not None],
+                         arrays['fee'][~np.isnan(arrays['fee'])].tolist())
+        self.assertEqual(result['name'], arrays['name'].tolist())
+
+    def test_chunks(self) -> None:
+        query = QUERY + ' LIMIT 299'
+        self.conn.execute(f'SELECT * FROM ({query}) q LIMIT 0', commit=False)
+        statement, names, kinds = BinaryCopy.copy_statement(query, self.conn.cursor.description)
+        stream = io.BytesIO()
+        self.conn.copy(statement, stream)
+        chunks = []
+        decoder = BinaryCopy.ArrayDecoder(names, kinds, chunks.append, chunk_rows=64, buffer_size=1)
+        # the rows arrive split at any byte
+        data = stream.getvalue()
+        for start in range(0, len(data), 5):
+            decoder.write(data[start:start + 5])
+        self.assertEqual(299, decoder.finish())
+        self.assertEqual([64, 64, 64, 64, 43], [len(chunk['id']) for chunk in chunks])
+        self.assertEqual(list(range(1, 300)), np.concatenate([chunk['id'] for chunk in chunks]).tolist())
+        self.assertEqual(42, sum(np.isnan(chunk['fee']).sum() for chunk in chunks))
+
+    def test_empty_and_nulls(self) -> None:
+        arrays = self.conn.fetch_arrays('SELECT Order_id, Date, Delivery_fee FROM Orders')
+        self.assertEqual(['order_id', 'date', 'delivery_fee'], list(arrays))
+        self.assertEqual([0, 0, 0], [len(array) for array in arrays.values()])
+        self.assertEqual(np.dtype('datetime64[us]'), arrays['date'].dtype)
+        # an integer array can not hold a NULL
+        self.assertRaises(ValueError, self.conn.fetch_arrays, 'SELECT NULLIF(i, 2) FROM generate_series(1, 3) i')
+
+    def test_tables(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(1, datetime(2024, 5, 1, 10, 30), 2.5, 'Haifa street')))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10.25, False)))
+        arrays = self.conn.fetch_arrays('SELECT * FROM Orders JOIN Dishes ON TRUE')
+        self.assertEqual(np.datetime64('2024-05-01T10:30'), arrays['date'][0])
+        self.assertEqual([2.5, 10.25], [arrays['delivery_fee'][0], arrays['price'][0]])
+        self.assertEqual([False], arrays['is_active'].tolist())
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
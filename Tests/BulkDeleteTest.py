@@ -0,0 +1,64 @@
+import unittest
+from datetime import datetime
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer, BadCustomer
+from Business.Order import Order
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for cust_id in range(1, 21):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, f'name{cust_id}', 30, '0123456789')))
+        for dish_id in range(1, 4):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 10, True)))
+        for order_id in range(1, 41):
+            # orders 1 - 20 are of 2023, 21 - 40 of 2024
+            date = datetime(2023 + (order_id > 20), 1 + order_id % 12, 1, 12, 0)
+            self.assertEqual(ReturnValue.OK, Solution.add_order(Order(order_id, date, 5, 'Haifa street')))
+            self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(1 + order_id % 20, order_id))
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, 1 + order_id % 3, 2))
+        for cust_id in range(1, 21):
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, 1, 4))
+
+    def test_delete_customers(self) -> None:
+        progress = []
+        self.assertEqual((ReturnValue.OK, 10), Solution.delete_customers(list(range(1, 11)) + [3, 99], batch_size=3,
+                                                                         progress=lambda *args: progress.append(args)))
+        self.assertEqual([(3, 11), (6, 11), (9, 11), (11, 11)], progress)
+        for cust_id in range(1, 21):
+            self.assertEqual(cust_id > 10, Solution.get_customer(cust_id) != BadCustomer())
+            self.assertEqual(cust_id > 10, Solution.get_all_customer_ratings(cust_id) != [])
+        # the reservations are gone with the customers, the orders stay
+        self.assertEqual(BadCustomer(), Solution.get_customer_that_placed_order(20))
+        self.assertEqual(Solution.get_customer(11), Solution.get_customer_that_placed_order(30))
+        self.assertEqual(1, len(Solution.get_all_order_items(20)))
+        self.assertEqual((ReturnValue.OK, 0), Solution.delete_customers([]))
+
+    def test_delete_and_purge_orders(self) -> None:
+        progress = []
+        self.assertEqual((ReturnValue.OK, 10), Solution.delete_orders(list(range(1, 11)) + [100], batch_size=4,
+                                                                      progress=lambda *args: progress.append(args)))
+        self.assertEqual([(4, 11), (8, 11), (11, 11)], progress)
+        self.assertEqual([], Solution.get_all_order_items(5))
+        self.assertEqual(BadCustomer(), Solution.get_customer_that_placed_order(5))
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.delete_order(5))
+
+        # the 10 orders left of 2023, oldest first
+        progress = []
+        self.assertEqual((ReturnValue.OK, 10), Solution.purge_orders(datetime(2024, 1, 1), batch_size=4,
+                                                                     progress=lambda *args: progress.append(args)))
+        self.assertEqual([(4, 10), (8, 10), (10, 10)], progress)
+        for order_id in range(1, 41):
+            self.assertEqual(order_id > 20, Solution.get_order(order_id).get_order_id() == order_id)
+        self.assertEqual(1, len(Solution.get_all_order_items(21)))
+        self.assertEqual((ReturnValue.OK, 0), Solution.purge_orders(datetime(2024, 1, 1)))
+        self.assertEqual((ReturnValue.ERROR, 0), Solution.delete_orders(['x']))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,71 @@
+import time
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Utility.ChangeListener import ChangeListener
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.listener = ChangeListener(Solution.RESULT_CACHE, Solution.CHANGES_CHANNEL, reconnect_delay=0.1)
+        self.changes = []
+        self.listener.on_changes(self.changes.extend)
+        self.listener.start()
+        self.assertTrue(self.listener.wait_listening(10))
+        # the other process - writes that this module does not see
+        self.other = Connector.DBConnector()
+
+    def tearDown(self) -> None:
+        self.other.close()
+        self.listener.stop()
+        super().tearDown()
+
+    def wait_until(self, condition) -> None:
+        deadline = time.monotonic() + 10
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(condition())
+
+    def wait_for(self, stat: str, value: int) -> None:
+        self.wait_until(lambda: self.listener.stats()[stat] >= value)
+
+    def test_other_process_writes_invalidate(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10, True)))
+        self.assertEqual([], Solution.get_customers_rated_but_not_ordered())
+
+        self.other.execute('INSERT INTO Customer_Ratings VALUES (1, 1, 1)')
+        self.wait_until(lambda: ('customer_ratings', 'I', '1,1') in self.changes)
+        self.assertEqual([1], Solution.get_customers_rated_but_not_ordered())
+
+    def test_storm_is_coalesced(self) -> None:
+        self.other.execute('INSERT INTO Dishes SELECT i, \'Dish \' || i, 10, TRUE FROM generate_series(1, 2000) i')
+        self.wait_for('notifications', 2000)
+        self.assertLessEqual(self.listener.stats()['batches'], 2)
+        # too many keys of one table in a batch are reported as a change of the whole table
+        self.assertIn(('dishes', '*', None), self.changes)
+        # the end of the coalescing window is not taken for a lost connection
+        self.assertEqual(0, self.listener.stats()['reconnects'])
+
+    def test_flush_notification(self) -> None:
+        flushes = self.listener.stats()['flushes']
+        self.other.execute(Solution.NOTIFY_FLUSH)
+        self.wait_for('flushes', flushes + 1)
+
+    def test_reconnect_flushes(self) -> None:
+        flushes = self.listener.stats()['flushes']
+        self.other.execute(f"SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                           f"WHERE query = 'LISTEN \"{Solution.CHANGES_CHANNEL}\"' AND pid != pg_backend_pid()")
+        self.wait_for('reconnects', 1)
+        self.wait_for('flushes', flushes + 1)
+        self.assertTrue(self.listener.wait_listening(10))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime, timedelta
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Tests.MemoryBackendTest import workload, run
+from Business.Customer import Customer
+from Business.Order import Order
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def tearDown(self) -> None:
+        Solution.ANALYTICS.disable()
+        super().tearDown()
+
+    def analytics(self) -> list:
+        results = [Solution.get_customers_spent_max_avg_amount_money(), Solution.get_non_worth_price_increase()]
+        for year in (2024, 2025):
+            results.append(Solution.get_cumulative_profit_per_month(year))
+        for days in range(0, 400, 25):
+            start = datetime(2024, 1, 1, 12, 30) + timedelta(days=days)
+            results.append(Solution.get_most_ordered_dish_in_period(start, start + timedelta(days=40)))
+        return results
+
+    def test_same_results_as_queries(self) -> None:
+        for seed in range(4):
+            Solution.clear_tables()
+            # only the writes of the workload, the reads are not needed
+            run([call for call in workload(seed, 400) if not call[0].startswith('get_')])
+            expected = self.analytics()
+            Solution.ANALYTICS.enable(max_age=3600)
+            Solution.ANALYTICS.refresh()
+            actual = self.analytics()
+            Solution.ANALYTICS.disable()
+            self.assertEqual(expected[:2], actual[:2], f'seed {seed}')
+            for expected_months, actual_months in zip(expected[2:4], actual[2:4]):
+                self.assertEqual([month for month, _ in expected_months], [month for month, _ in actual_months])
+                for (_, expected_profit), (_, actual_profit) in zip(expected_months, actual_months):
+                    self.assertAlmostEqual(expected_profit, actual_profit, places=6)
+            self.assertEqual(expected[4:], actual[4:], f'seed {seed}')
+
+    def test_staleness(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(1, datetime(2024, 5, 1), 10, 'Haifa street')))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 20, True)))
+        self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(1, 1))
+        self.assertIsNone(Solution.ANALYTICS.age())
+        refreshes = Solution.ANALYTICS.stats()['refreshes']
+
+        Solution.ANALYTICS.enable(max_age=3600)
+        # an order without details makes no profit
+        self.assertEqual(0.0, Solution.get_cumulative_profit_per_month(2024)[0][1])
+        self.assertEqual([1], Solution.get_customers_spent_max_avg_amount_money())
+        stats = Solution.ANALYTICS.stats()
+        self.assertEqual(refreshes + 1, stats['refreshes'])
+        self.assertFalse(stats['stale'])
+        self.assertEqual(1, stats['rows']['Orders'])
+
+        # the snapshot is served until it is refreshed
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 1, 2))
+        self.assertEqual(0.0, Solution.get_cumulative_profit_per_month(2024)[0][1])
+        Solution.ANALYTICS.refresh()
+        self.assertEqual(50.0, Solution.get_cumulative_profit_per_month(2024)[0][1])
+        self.assertEqual(Dish(1, 'Pizza', 20, True), Solution.get_most_ordered_dish_in_period(datetime(2024, 5, 1),
+                                                                                              datetime(2024, 5, 1)))
+
+        # an expired snapshot is refreshed by the next call
+        Solution.ANALYTICS.max_age = 0
+        self.assertEqual(ReturnValue.OK, Solution.update_dish_price(1, 30))
+        self.assertEqual(Dish(1, 'Pizza', 30, True), Solution.get_most_ordered_dish_in_period(datetime(2024, 5, 1),
+                                                                                              datetime(2024, 5, 1)))
+        self.assertEqual(refreshes + 3, Solution.ANALYTICS.stats()['refreshes'])
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
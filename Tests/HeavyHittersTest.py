@@ -0,0 +1,108 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Utility.HeavyHitters import SlidingHeavyHitters
+from Tests.AbstractTest import AbstractTest
+from Business.Order import Order
+from Business.Dish import Dish
+
+'''
+    The trending dishes of the sketch against the exact amounts of the orders in SQL
+'''
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.trending = Solution.TRENDING
+        for dish_id in range(1, 31):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 10, True)))
+
+    def tearDown(self) -> None:
+        Solution.TRENDING = self.trending
+        super().tearDown()
+
+    def order(self, first_order_id: int, orders: int) -> None:
+        # a few dishes are ordered much more than the others
+        rand = random.Random(first_order_id)
+        for order_id in range(first_order_id, first_order_id + orders):
+            self.assertEqual(ReturnValue.OK, Solution.add_order(Order(order_id, datetime.now(), 0, 'Haifa street')))
+            for dish_id in rand.sample(range(1, 31), 6):
+                amount = rand.randint(0, 3) * (8 if dish_id % 7 == 0 else 1)
+                self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, dish_id, amount))
+
+    def exact(self) -> dict:
+        now = datetime.now()
+        conn = Connector.DBConnector()
+        try:
+            _, result = conn.execute(f"SELECT Dish_id, Amount FROM Fn_Get_Dish_Amounts_In_Period("
+                                     f"'{now - timedelta(minutes=15)}', '{now + timedelta(minutes=1)}');")
+        finally:
+            conn.close()
+        return {dish_id: int(amount) for dish_id, amount in result.rows if amount > 0}
+
+    def test_trending_matches_sql(self) -> None:
+        self.order(1, 40)
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.order_contains_dish(1, Solution.get_all_order_items(1)[0].get_dish_id(), 9))
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.order_contains_dish(41, 1, 9))
+
+        exact = sorted(self.exact().items(), key=lambda item: (-item[1], item[0]))
+        # fewer dishes than counters, the amounts are exact
+        self.assertEqual(exact[:10], Solution.get_trending_dishes(900, 10))
+        self.assertEqual(exact, Solution.get_trending_dishes(3600, 100))
+        self.assertEqual(Solution.get_most_ordered_dish_in_period(datetime.now() - timedelta(minutes=15), datetime.now()).get_dish_id(),
+                         Solution.get_trending_dishes(900, 1)[0][0])
+
+    def test_error_bounds_and_window(self) -> None:
+        now = [1_000_000.0]
+        Solution.TRENDING = SlidingHeavyHitters(capacity=8, bucket_seconds=60, max_window=3600, clock=lambda: now[0])
+        for minute in range(5):
+            self.order(1 + 20 * minute, 20)
+            now[0] += 60
+
+        exact = self.exact()
+        total = Solution.TRENDING.total(900)
+        self.assertEqual(sum(exact.values()), total)
+        top = Solution.TRENDING.top(window=900)
+        counted = {dish_id for dish_id, _, _ in top}
+        for dish_id, count, error in top:
+            self.assertLessEqual(count - error, exact.get(dish_id, 0))
+            self.assertLessEqual(exact.get(dish_id, 0), count)
+            self.assertLessEqual(count, exact.get(dish_id, 0) + total / 8)
+        # the dishes ordered more than total / capacity can not be missed
+        heavy = {dish_id for dish_id, amount in exact.items() if amount > total / 8}
+        self.assertTrue(heavy)
+        self.assertLessEqual(heavy, counted)
+        self.assertLessEqual(Solution.TRENDING.stats()['counters'], 5 * 8)
+
+        # 20 minutes later, only the new order is trending in the last 15 minutes
+        now[0] += 20 * 60
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(101, datetime.now(), 0, 'Haifa street')))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(101, 30, 50))
+        self.assertEqual([(30, 50)], Solution.get_trending_dishes(900))
+        self.assertEqual(total + 50, Solution.TRENDING.total(3600))
+        # an hour later the old buckets are gone
+        now[0] += 3600
+        self.assertEqual([], Solution.get_trending_dishes(3600))
+        Solution.TRENDING.add(1)
+        self.assertEqual(1, Solution.TRENDING.stats()['buckets'])
+
+    def test_window_starts_at_its_first_whole_bucket(self) -> None:
+        now = [60_000.0]
+        sketch = SlidingHeavyHitters(capacity=8, bucket_seconds=60, max_window=3600, clock=lambda: now[0])
+        sketch.add('old')
+        now[0] += 90
+        sketch.add('new')
+        # the bucket of 'old' started 90 seconds ago, before the last minute
+        self.assertEqual([('new', 1, 0)], sketch.top(window=60))
+        self.assertEqual(1, sketch.total(60))
+        self.assertEqual([('new', 1, 0), ('old', 1, 0)], sketch.top(window=90))
+        self.assertEqual(2, sketch.total(90))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
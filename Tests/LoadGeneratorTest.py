@@ -0,0 +1,50 @@
+import unittest
+import Solution as Solution
+from Tests.AbstractTest import AbstractTest
+from benchmark import populate
+from loadtest import LoadGenerator
+
+
+class Test(AbstractTest):
+    def test_run(self) -> None:
+        populate(50, 10, 2, 2, 2)
+        generator = LoadGenerator(50, 10, 101, {'checkout': 1, 'rating': 1, 'lookup': 1, 'analytic': 1}, seed=1)
+        report = generator.run(1.5, threads=4, rate=40)
+        functions = report['functions']
+        # the schedule is kept (every call is fast here)
+        self.assertEqual(60, report['calls'])
+        self.assertEqual(report['calls'], sum(functions[f'operation:{name}']['calls']
+                                              for name in LoadGenerator.DEFAULT_MIX))
+        for stats in functions.values():
+            self.assertEqual(stats['calls'], sum(stats['outcomes'].values()))
+            self.assertTrue(stats['p50'] <= stats['p95'] <= stats['p99'] <= stats['max'])
+        # every checkout added its order, with the new ids
+        checkouts = functions['operation:checkout']['calls']
+        self.assertEqual({'OK': checkouts}, functions['add_order']['outcomes'])
+        self.assertEqual(checkouts, functions['customer_placed_order']['outcomes']['OK'])
+        self.assertEqual(101 + checkouts - 1, Solution.get_order(101 + checkouts - 1).get_order_id())
+
+    def test_ramp_takes_new_order_ids(self) -> None:
+        populate(50, 10, 2, 2, 2)
+        generator = LoadGenerator(50, 10, 101, {'checkout': 1}, seed=2)
+        result = generator.ramp([20, 20, 20], 0.5, threads=2)
+        # every step added its own orders
+        for report in result['steps']:
+            checkouts = report['functions']['operation:checkout']['calls']
+            self.assertEqual({'OK': checkouts}, report['functions']['add_order']['outcomes'])
+            self.assertEqual({'OK': checkouts}, report['functions']['customer_placed_order']['outcomes'])
+        self.assertEqual(101 + sum(report['calls'] for report in result['steps']), generator.next_order_id)
+
+    def test_summarize(self) -> None:
+        samples = [({'operation:lookup': [0.1, 0.2], 'get_dish': [0.1, 0.2]},
+                    {'operation:lookup': {'OK': 2}, 'get_dish': {'OK': 1, 'NOT_EXISTS': 1}}),
+                   ({'operation:lookup': [0.3, 0.4]}, {'operation:lookup': {'OK': 2}})]
+        report = LoadGenerator.summarize(samples, 2.0, 2.0)
+        self.assertEqual((4, 2.0, 0.2, 0.4), (report['calls'], report['throughput'], report['p50'], report['p99']))
+        self.assertEqual(0.5, report['functions']['get_dish']['error_rate'])
+        self.assertRaises(ValueError, LoadGenerator, 1, 1, 1, {'browse': 1})
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,151 @@
+import random
+import unittest
+from datetime import datetime, timedelta
+import Solution as Solution
+from Tests.AbstractTest import AbstractTest
+from Utility.MemoryBackend import MemoryBackend
+from Business.Customer import Customer
+from Business.Order import Order
+from Business.Dish import Dish
+
+
+# a random workload over a few ids, so the calls collide - duplicates, missing rows, cascades and bad values
+def workload(seed: int, size: int) -> list:
+    rng = random.Random(seed)
+    cust_id = lambda: rng.randint(0, 8)
+    order_id = lambda: rng.randint(0, 12)
+    dish_id = lambda: rng.randint(0, 8)
+    # a valid value mostly, one that breaks a constraint sometimes
+    pick = lambda valid, invalid: rng.choice(invalid if rng.random() < 0.15 else valid)
+    price = lambda: pick([3, 4.5, 7.25, 10, 12.5], [-1, 0])
+    day = lambda: datetime(2024, 1, 1) + timedelta(seconds=rng.randint(0, 400 * 86400), microseconds=rng.randint(0, 999999))
+    writes = [
+        lambda: ('add_customer', Customer(cust_id(), 'name', pick([18, 40, 120], [17, 121]), pick(['0123456789'], ['012']))),
+        lambda: ('delete_customer', cust_id()),
+        lambda: ('add_order', Order(order_id(), day(), pick([0, 2.5, 5], [-1]), pick(['Haifa street'], ['TA']))),
+        lambda: ('delete_order', order_id()),
+        lambda: ('add_dish', Dish(dish_id(), pick(['Pizza', 'Pasta'], ['Tea']), price(), rng.random() < 0.8)),
+        lambda: ('update_dish_price', dish_id(), price()),
+        lambda: ('update_dish_active_status', dish_id(), rng.random() < 0.7),
+        lambda: ('customer_placed_order', cust_id(), order_id()),
+        lambda: ('order_contains_dish', order_id(), dish_id(), pick([0, 1, 2, 3, 4], [-1])),
+        lambda: ('order_does_not_contain_dish', order_id(), dish_id()),
+        lambda: ('customer_rated_dish', cust_id(), dish_id(), pick([1, 2, 3, 4, 5, 4, 5], [0, 6])),
+        lambda: ('customer_deleted_rating_on_dish', cust_id(), dish_id()),
+    ]
+    reads = [
+        lambda: ('get_customer', cust_id()),
+        lambda: ('get_order', order_id()),
+        lambda: ('get_dish', dish_id()),
+        lambda: ('get_customer_that_placed_order', order_id()),
+        lambda: ('get_all_order_items', order_id()),
+        lambda: ('get_all_customer_ratings', cust_id()),
+        lambda: ('get_order_total_price', order_id()),
+        lambda: ('get_customers_spent_max_avg_amount_money',),
+        lambda: ('get_most_ordered_dish_in_period', day(), day() + timedelta(days=rng.randint(0, 200))),
+        lambda: ('did_customer_order_top_rated_dishes', cust_id()),
+        lambda: ('get_customers_rated_but_not_ordered',),
+        lambda: ('get_non_worth_price_increase',),
+        lambda: ('get_cumulative_profit_per_month', rng.choice([2024, 2025])),
+        lambda: ('get_potential_dish_recommendations', cust_id()),
+        lambda: ('get_order_items_page', order_id(), dish_id(), rng.randint(0, 3)),
+        lambda: ('get_customer_ratings_page', cust_id(), dish_id(), rng.randint(0, 3)),
+    ]
+    # mostly inserts, so the tables fill up despite the deletes
+    write_weights = [3, 1, 3, 1, 3, 2, 1, 5, 10, 1, 8, 1]
+    # start from filled tables
+    calls = [('add_customer', Customer(i, 'name', 30, '0123456789')) for i in range(1, 8)]
+    calls += [('add_dish', Dish(i, 'Pizza', price(), True)) for i in range(1, 8)]
+    calls += [('add_order', Order(i, day(), 5, 'Haifa street')) for i in range(1, 12)]
+    calls += [('customer_placed_order', cust_id(), i) for i in range(1, 12)]
+    return calls + [rng.choices(writes, write_weights)[0]() if rng.random() < 0.7 else rng.choice(reads)()
+                    for _ in range(size)]
+
+
+def run(calls: list) -> list:
+    results = []
+    for name, *args in calls:
+        result = getattr(Solution, name)(*args)
+        if name == 'get_all_order_items':
+            # the table order of PostgreSQL is not a part of the API
+            result = sorted(result, key=lambda item: item.get_dish_id())
+        results.append(result)
+    return results
+
+
+class Test(AbstractTest):
+    def tearDown(self) -> None:
+        Solution.use_backend(None)
+        super().tearDown()
+
+    def test_same_results_as_postgres(self) -> None:
+        for seed in range(4):
+            calls = workload(seed, 400)
+            Solution.clear_tables()
+            expected = run(calls)
+            Solution.use_backend(MemoryBackend())
+            Solution.create_tables()
+            actual = run(calls)
+            Solution.use_backend(None)
+            for call, expected_result, actual_result in zip(calls, expected, actual):
+                self.assertEqual(expected_result, actual_result, f'seed {seed}: {call}')
+
+    def test_sync_menu_same_as_postgres(self) -> None:
+        catalog = [Dish(1, 'Pizza', 10, True), Dish(2, 'Pasta', 12.5, False), Dish(3, 'Salad', 7.25, True),
+                   Dish(5, 'Soup', 3, False), Dish(9, 'Steak', 20, True)]
+        calls = [('add_dish', Dish(dish_id, 'Pizza', 4.5, dish_id % 3 != 0)) for dish_id in range(1, 8)]
+        calls += [('sync_menu', catalog), ('sync_menu', catalog), ('sync_menu', catalog, True),
+                  ('sync_menu', catalog[:2] + [Dish(3, 'Salad', 8, False), Dish(6, 'Pizza', 9, True)]),
+                  ('sync_menu', catalog + [Dish(10, 'Tea', 5, True)]), ('sync_menu', catalog + [Dish(1, 'Pizza', 11, True)]),
+                  ('sync_menu', [Dish(10, 'Bread', None, True)]), ('sync_menu', [])]
+        calls += [('get_dish', dish_id) for dish_id in range(1, 11)]
+        expected = run(calls)
+        Solution.use_backend(MemoryBackend())
+        self.assertEqual((Solution.ReturnValue.ERROR, {}), Solution.sync_menu(catalog))
+        Solution.create_tables()
+        self.assertEqual(expected, run(calls))
+
+    def test_bulk_deletes_same_as_postgres(self) -> None:
+        calls = workload(5, 300)
+        progress = []
+        report = lambda *args: progress.append(args)
+        bulk = [('delete_customers', [1, 2, 3, 3, 99], 2, report), ('delete_orders', [4, 2, 50, 6], 3, report),
+                ('purge_orders', datetime(2024, 6, 1), 2, report), ('purge_orders', datetime(2024, 6, 1)),
+                ('delete_customers', []), ('delete_orders', [7], 0)]
+        reads = [('get_customer', cust_id) for cust_id in range(9)] + [('get_order', order_id) for order_id in range(13)]
+        reads += [('get_customer_that_placed_order', order_id) for order_id in range(13)]
+        reads += [('get_all_customer_ratings', cust_id) for cust_id in range(9)] + [('get_customers_spent_max_avg_amount_money',)]
+
+        def run_bulk() -> list:
+            results = run(calls)
+            for name, *args in bulk:
+                try:
+                    results.append(getattr(Solution, name)(*args))
+                except ValueError as e:
+                    results.append(str(e))
+            return results + run(reads) + [progress[:]]
+
+        expected = run_bulk()
+        progress.clear()
+        Solution.use_backend(MemoryBackend())
+        self.assertEqual((Solution.ReturnValue.ERROR, 0), Solution.delete_customers([1]))
+        self.assertEqual((Solution.ReturnValue.ERROR, 0), Solution.purge_orders(datetime(2024, 6, 1)))
+        Solution.create_tables()
+        self.assertEqual(expected, run_bulk())
+
+    def test_missing_tables(self) -> None:
+        Solution.use_backend(MemoryBackend())
+        self.assertEqual(Solution.ReturnValue.ERROR, Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+        self.assertEqual(Solution.ReturnValue.NOT_EXISTS, Solution.delete_customer(1))
+        self.assertEqual([], Solution.get_customers_spent_max_avg_amount_money())
+        Solution.create_tables()
+        self.assertEqual(Solution.ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+        Solution.clear_tables()
+        self.assertEqual(Solution.ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+        Solution.drop_tables()
+        self.assertEqual(Solution.ReturnValue.ERROR, Solution.add_dish(Dish(1, 'Pizza', 10, True)))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
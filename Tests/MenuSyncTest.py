@@ -0,0 +1,72 @@
+import unittest
+from decimal import Decimal
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for dish_id in range(1, 6):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 10, dish_id != 3)))
+
+    def versions(self) -> dict:
+        # the row version of every dish, a row that is written gets a new one
+        conn = Connector.DBConnector()
+        try:
+            _, result = conn.execute('SELECT Dish_id, xmin::TEXT AS Version FROM Dishes')
+        finally:
+            conn.close()
+        return dict(result.rows)
+
+    def test_sync(self) -> None:
+        catalog = [Dish(1, 'Dish1', 10, True), Dish(2, 'Dish2', 12.5, True), Dish(3, 'Dish3', 10, True),
+                   Dish(4, 'Soup', 10, False), Dish(6, 'Dish6', 7, True)]
+        before = self.versions()
+        self.assertEqual((ReturnValue.OK, {'inserted': 1, 'price_changed': 1, 'renamed': 1, 'activated': 1,
+                                           'deactivated': 1, 'unchanged': 1}), Solution.sync_menu(catalog))
+        after = self.versions()
+        self.assertEqual(before[1], after[1])
+        self.assertEqual(before[5], after[5])
+        self.assertNotEqual(before[2], after[2])
+        self.assertEqual([Dish(1, 'Dish1', 10, True), Dish(2, 'Dish2', Decimal('12.5'), True), Dish(3, 'Dish3', 10, True),
+                          Dish(4, 'Soup', 10, False), Dish(5, 'Dish5', 10, True), Dish(6, 'Dish6', 7, True)],
+                         [Solution.get_dish(dish_id) for dish_id in range(1, 7)])
+
+        # the same catalog again changes nothing
+        self.assertEqual((ReturnValue.OK, dict.fromkeys(Solution.MENU_SYNC_COUNTS, 0) | {'unchanged': 5}),
+                         Solution.sync_menu(catalog))
+        self.assertEqual(after, self.versions())
+
+        self.assertEqual((ReturnValue.OK, dict.fromkeys(Solution.MENU_SYNC_COUNTS, 0) | {'deactivated': 1, 'unchanged': 5}),
+                         Solution.sync_menu(catalog, deactivate_missing=True))
+        self.assertFalse(Solution.get_dish(5).get_is_active())
+
+        # a bad catalog changes nothing
+        after = self.versions()
+        self.assertEqual((ReturnValue.BAD_PARAMS, {}), Solution.sync_menu(catalog + [Dish(7, 'Dish7', 0, True)]))
+        self.assertEqual((ReturnValue.BAD_PARAMS, {}), Solution.sync_menu(catalog + [Dish(6, 'Dish6', 8, True)]))
+        self.assertEqual((ReturnValue.BAD_PARAMS, {}), Solution.sync_menu([Dish(7, None, 8, True)]))
+        self.assertEqual(after, self.versions())
+
+    def test_inactive_price_is_kept(self) -> None:
+        before = self.versions()
+        self.assertEqual((ReturnValue.OK, dict.fromkeys(Solution.MENU_SYNC_COUNTS, 0) | {'unchanged': 1}),
+                         Solution.sync_menu([Dish(3, 'Dish3', 12, False)]))
+        self.assertEqual(before, self.versions())
+        self.assertEqual(Dish(3, 'Dish3', 10, False), Solution.get_dish(3))
+
+        # the price of a dish that is activated is changed, of a dish that is deactivated it is kept
+        self.assertEqual((ReturnValue.OK, dict.fromkeys(Solution.MENU_SYNC_COUNTS, 0) | {'price_changed': 1, 'activated': 1,
+                                                                                          'deactivated': 1}),
+                         Solution.sync_menu([Dish(3, 'Dish3', 12, True), Dish(1, 'Dish1', 11, False)]))
+        self.assertEqual([Dish(1, 'Dish1', 10, False), Dish(3, 'Dish3', 12, True)],
+                         [Solution.get_dish(1), Solution.get_dish(3)])
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Exceptions import DatabaseException
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer
+from Business.Order import Order
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        for cust_id in range(1, 8):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, f'name{cust_id}', 30, "0123456789")))
+        for dish_id in range(1, 26):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', dish_id, True)))
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(1, datetime(2024, 1, 10, 12, 0), 5, 'Haifa street')))
+        self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(2, 1))
+        for dish_id in range(25, 0, -1):
+            self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, dish_id, dish_id % 4))
+            # customers 1 and 2 like everything, only customer 2 ordered
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(1, dish_id, 5 - dish_id % 2))
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(2, dish_id, 5))
+        for cust_id in range(3, 8):
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, 1, 1))
+
+    def test_order_items_pages(self) -> None:
+        first = Solution.get_order_items_page(1, page_size=10)
+        self.assertEqual(list(range(1, 11)), [item.get_dish_id() for item in first])
+        last = Solution.get_order_items_page(1, 20, 10)
+        self.assertEqual(list(range(21, 26)), [item.get_dish_id() for item in last])
+        self.assertEqual([], Solution.get_order_items_page(1, 25, 10))
+        self.assertEqual([], Solution.get_order_items_page(1, 0, 0))
+        self.assertEqual(sorted(Solution.get_all_order_items(1), key=lambda item: item.get_dish_id()),
+                         list(Solution.iter_order_items(1, page_size=7)))
+
+    def test_customer_ratings_pages(self) -> None:
+        self.assertEqual([(11, 4), (12, 5)], Solution.get_customer_ratings_page(1, 10, 2))
+        self.assertEqual(Solution.get_all_customer_ratings(1), list(Solution.iter_customer_ratings(1, page_size=5)))
+        self.assertEqual([], list(Solution.iter_customer_ratings(8)))
+
+    def test_analytic_pages(self) -> None:
+        self.assertEqual([3, 4, 5], Solution.get_customers_rated_but_not_ordered_page(0, 3))
+        self.assertEqual([6, 7], Solution.get_customers_rated_but_not_ordered_page(5, 3))
+        self.assertEqual(list(range(3, 8)), list(Solution.iter_customers_rated_but_not_ordered(page_size=2)))
+        self.assertEqual([6, 7, 8, 9, 10], Solution.get_potential_dish_recommendations_page(1, 5, 5))
+        self.assertEqual(list(range(1, 26)), Solution.get_potential_dish_recommendations(1))
+        self.assertEqual(list(range(1, 26)), list(Solution.iter_potential_dish_recommendations(1, page_size=4)))
+
+    def test_failed_page_raises(self) -> None:
+        conn = Connector.DBConnector()
+        primary = dict(conn.connection.get_dsn_parameters(), password=conn.connection.info.password)
+        conn.close()
+        pages = Solution.iter_customer_ratings(1, page_size=5)
+        self.assertEqual([(1, 4), (2, 5)], [next(pages), next(pages)])
+        # the second page can not be read, the ratings do not just end after the first one
+        Connector.DBConnector.configure_routing(primary=dict(primary, port=1))
+        try:
+            self.assertEqual([(3, 4), (4, 5), (5, 4)], [next(pages) for _ in range(3)])
+            with self.assertRaises(DatabaseException.ConnectionInvalid):
+                next(pages)
+        finally:
+            Connector.DBConnector.reset_routing()
+        self.assertEqual(Solution.get_all_customer_ratings(1), list(Solution.iter_customer_ratings(1, page_size=5)))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
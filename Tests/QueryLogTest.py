@@ -0,0 +1,58 @@
+import logging
+import unittest
+import Solution as Solution
+from Utility.QueryLog import fingerprint
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.QUERY_LOG.reset()
+
+    def tearDown(self) -> None:
+        Solution.QUERY_LOG.configure(slow_threshold=1.0, sample_rate=1.0)
+        super().tearDown()
+
+    def test_fingerprint(self) -> None:
+        self.assertEqual('SELECT * FROM Dishes WHERE Dish_id = ?', fingerprint('SELECT * FROM Dishes\n WHERE Dish_id = 7;'))
+        self.assertEqual("INSERT INTO Customers VALUES (?, ...)",
+                         fingerprint("INSERT INTO Customers VALUES (1, 'O''Brien', 30, '0123456789');"))
+        self.assertEqual('SELECT Fn_2(Cust_id - ?) FROM T1 WHERE x IN (?, ...) AND y = ARRAY[?, ...]',
+                         fingerprint('SELECT Fn_2(Cust_id - -1.5e3) FROM T1 WHERE x IN (1,2, 3) AND y = ARRAY[4, 5]'))
+
+    def test_stats_and_logs(self) -> None:
+        for cust_id in (1, 2, 3):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, 'name', 30, '0123456789')))
+        Solution.QUERY_LOG.configure(slow_threshold=0.0)
+        with self.assertLogs('yummy.queries', logging.DEBUG) as logs:
+            self.assertEqual(ReturnValue.ALREADY_EXISTS,
+                             Solution.add_customer(Customer(1, 'name', 30, '0123456789')))
+            Solution.get_customer(2)
+        self.assertIn("in add_customer(Customer(cust_id=1, full_name='name', phone='0123456789', age=30))",
+                      logs.output[0])
+        self.assertIn('failed in add_customer', logs.output[1])
+        self.assertIn('slow query', logs.output[2])
+        self.assertIn('in get_customer(2): SELECT * FROM Customers WHERE Cust_id = 2', logs.output[2])
+
+        stats = {row['fingerprint']: row for row in Solution.QUERY_LOG.stats()['fingerprints']}
+        inserts = stats['INSERT INTO Customers VALUES (?, ...)']
+        self.assertEqual((4, 1), (inserts['count'], inserts['errors']))
+        self.assertLessEqual(inserts['mean'], inserts['max'])
+        self.assertEqual(2, Solution.QUERY_LOG.stats()['slow'])
+
+        # none of the slow queries is sampled
+        Solution.QUERY_LOG.configure(sample_rate=0.0)
+        Solution.get_customer(2)
+        self.assertEqual((3, 2), (Solution.QUERY_LOG.stats()['slow'], Solution.QUERY_LOG.stats()['logged']))
+
+        # without a logging configuration the slow queries are not printed to stderr
+        self.assertTrue(any(isinstance(handler, logging.NullHandler)
+                            for handler in logging.getLogger('yummy.queries').handlers))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,77 @@
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Utility.RecommendationJob import similarity_components, component_recommendations
+from Tests.AbstractTest import AbstractTest
+from Tests.MemoryBackendTest import workload, run
+from Business.Customer import Customer
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def precomputed(self) -> dict:
+        conn = Connector.DBConnector()
+        try:
+            _, resultRows = conn.execute('SELECT Cust_id, Dish_id FROM Customer_Recommendations ORDER BY Cust_id, Dish_id')
+        finally:
+            conn.close()
+        recommendations = {}
+        for cust_id, dish_id in resultRows.rows:
+            recommendations.setdefault(cust_id, []).append(dish_id)
+        return recommendations
+
+    def expected(self) -> dict:
+        recommendations = {cust_id: Solution.get_potential_dish_recommendations(cust_id) for cust_id in range(1, 9)}
+        return {cust_id: dishes for cust_id, dishes in recommendations.items() if dishes}
+
+    def test_components(self) -> None:
+        liked = {1: {10}, 2: {10, 11}, 3: {11}, 4: {12}, 5: {13, 12}}
+        self.assertEqual([[1, 2, 3], [4, 5]], similarity_components(liked))
+        work = {cust_id: (dishes, {11} if cust_id == 1 else set()) for cust_id, dishes in liked.items()}
+        # 1 reaches 2 (dish 10) and through it 3, a customer never reaches a lower cust_id
+        self.assertEqual({1: [10], 2: [11], 3: [], 4: [12, 13], 5: []}, component_recommendations(work))
+
+    def test_same_results_as_queries(self) -> None:
+        for seed in range(3):
+            Solution.clear_tables()
+            run([call for call in workload(seed, 400) if not call[0].startswith('get_')])
+            for processes in (1, 2):
+                self.assertEqual(ReturnValue.OK, Solution.precompute_recommendations(processes))
+                self.assertEqual(self.expected(), self.precomputed(), f'seed {seed}, {processes} processes')
+
+    def test_resume(self) -> None:
+        # three components - {1, 2}, {3, 4}, {5, 6}
+        for dish_id in range(1, 7):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 10, True)))
+        for cust_id in range(1, 7):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, 'name', 30, '0123456789')))
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, (cust_id + 1) // 2, 5))
+        for cust_id in (2, 4, 6):
+            self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, cust_id // 2 + 3, 4))
+        expected = {1: [1, 4], 3: [2, 5], 5: [3, 6]}
+
+        def interrupt(done: int, total: int):
+            self.assertEqual((2, 6), (done, total))
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            Solution.precompute_recommendations(1, progress=interrupt)
+        self.assertEqual(1, len(self.precomputed()))
+
+        reported = []
+        self.assertEqual(ReturnValue.OK,
+                         Solution.precompute_recommendations(1, resume=True, progress=lambda *done: reported.append(done)))
+        self.assertEqual(expected, self.precomputed())
+        # the component written before the interruption is not computed again
+        self.assertEqual([(4, 6), (6, 6)], reported)
+
+        # a new run starts over
+        self.assertEqual(ReturnValue.OK, Solution.customer_deleted_rating_on_dish(6, 6))
+        self.assertEqual(ReturnValue.OK, Solution.precompute_recommendations(2))
+        self.assertEqual({1: [1, 4], 3: [2, 5], 5: [3]}, self.precomputed())
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
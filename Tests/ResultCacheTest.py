@@ -0,0 +1,92 @@
+import unittest
+from Utility.ResultCache import ResultCache
+
+
+class Test(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = ResultCache()
+        self.calls = 0
+
+    def reader(self, *tables: str):
+        @self.cache.cached(*tables)
+        def read(x: int) -> list:
+            self.calls += 1
+            return [x, self.calls]
+        return read
+
+    def test_hit(self) -> None:
+        read = self.reader('Dishes')
+        self.assertEqual([1, 1], read(1), "first call")
+        self.assertEqual([1, 1], read(1), "cached call")
+        self.assertEqual([2, 2], read(2), "other arguments")
+        self.assertEqual(1, self.cache.stats()['hits'], "hits")
+        self.assertEqual(2, self.cache.stats()['misses'], "misses")
+
+    def test_result_is_a_copy(self) -> None:
+        read = self.reader('Dishes')
+        read(1).append(3)
+        self.assertEqual([1, 1], read(1), "changing a result does not change the cache")
+
+    def test_bump_invalidates_readers(self) -> None:
+        dishes = self.reader('Dishes')
+        orders = self.reader('Orders')
+        dishes(1)
+        orders(1)
+        self.cache.bump('DISHES')
+        self.assertEqual([1, 3], dishes(1), "dishes changed")
+        self.assertEqual([1, 2], orders(1), "orders did not change")
+
+    def test_writes(self) -> None:
+        read = self.reader('Dishes')
+
+        @self.cache.writes('Dishes')
+        def write() -> None:
+            raise RuntimeError()
+        read(1)
+        with self.assertRaises(RuntimeError):
+            write()
+        self.assertEqual([1, 2], read(1), "a failed write bumps as well")
+
+    def test_flush(self) -> None:
+        read = self.reader('Dishes')
+        read(1)
+        self.cache.flush()
+        self.assertEqual(0, self.cache.stats()['entries'], "entries")
+        self.assertEqual([1, 2], read(1), "after flush")
+
+    def test_skip_store(self) -> None:
+        @self.cache.cached('Dishes')
+        def failing() -> list:
+            self.calls += 1
+            self.cache.skip_store()
+            return []
+        failing()
+        failing()
+        self.assertEqual(2, self.calls, "failed results are not cached")
+        self.assertEqual(0, self.cache.stats()['entries'], "entries")
+
+    def test_eviction(self) -> None:
+        self.cache.max_entries = 2
+        read = self.reader('Dishes')
+        read(1)
+        read(2)
+        read(1)
+        read(3)
+        self.assertEqual(1, self.cache.stats()['evictions'], "evictions")
+        self.assertEqual(3, self.calls, "calls")
+        read(1)
+        self.assertEqual(3, self.calls, "the recently used entry is kept")
+        read(2)
+        self.assertEqual(4, self.calls, "the least recently used entry is evicted")
+
+    def test_disabled(self) -> None:
+        self.cache.enabled = False
+        read = self.reader('Dishes')
+        read(1)
+        read(1)
+        self.assertEqual(2, self.calls, "calls")
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,83 @@
+import unittest
+from psycopg2 import sql
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Exceptions import DatabaseException
+from Utility.Retry import RetryPolicy
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer, BadCustomer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.policy = Solution.RETRY_POLICY
+        Solution.RETRY_POLICY = RetryPolicy(max_attempts=3, base_delay=0.001)
+
+    def tearDown(self) -> None:
+        Solution.RETRY_POLICY = self.policy
+        Connector.DBConnector.reset_routing()
+        super().tearDown()
+
+    def test_classification(self) -> None:
+        policy = RetryPolicy(max_attempts=3)
+        deadlock = DatabaseException.DEADLOCK_DETECTED('DEADLOCK_DETECTED', '40P01')
+        in_doubt = DatabaseException.ConnectionInvalid('Could not commit changes', '08007')
+        unique = DatabaseException.UNIQUE_VIOLATION('UNIQUE_VIOLATION', '23505')
+        self.assertTrue(policy.should_retry(deadlock, 0, idempotent=False))
+        self.assertFalse(policy.should_retry(deadlock, 2, idempotent=False), 'out of attempts')
+        self.assertFalse(policy.should_retry(in_doubt, 0, idempotent=False), 'a write may have been committed')
+        self.assertTrue(policy.should_retry(in_doubt, 0, idempotent=True))
+        self.assertFalse(policy.should_retry(unique, 0, idempotent=True))
+        for attempt in range(10):
+            self.assertLessEqual(policy.backoff(attempt), policy.max_delay)
+
+    def test_no_retry_on_constraint_violation(self) -> None:
+        c1 = Customer(1, 'name', 21, "0123456789")
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(c1))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.add_customer(c1))
+        self.assertEqual({'retries': {}, 'recovered': 0, 'exhausted': 0}, Solution.RETRY_POLICY.metrics())
+
+    def test_connection_failure_is_retried(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 21, "0123456789")))
+        conn = Connector.DBConnector()
+        primary = dict(conn.connection.get_dsn_parameters(), password=conn.connection.info.password)
+        conn.close()
+
+        Connector.DBConnector.configure_routing(primary=dict(primary, port=1))
+        self.assertEqual(BadCustomer(), Solution.get_customer(1))
+        self.assertEqual(ReturnValue.ERROR, Solution.add_customer(Customer(2, "name", 21, "0123456789")))
+        self.assertEqual({'retries': {'08001': 4}, 'recovered': 0, 'exhausted': 2}, Solution.RETRY_POLICY.metrics())
+
+        Connector.DBConnector.configure_routing(primary=primary)
+        self.assertEqual(Customer(1, 'name', 21, "0123456789"), Solution.get_customer(1))
+
+    def test_recovered_only_on_success(self) -> None:
+        # deadlocks on its first run, then fails on a unique violation or succeeds (a sequence is not rolled back)
+        conn = Connector.DBConnector()
+        try:
+            conn.execute('CREATE SEQUENCE Retry_Test_Runs;'
+                         'CREATE FUNCTION Fn_Retry_Test(p_fail BOOLEAN) RETURNS INTEGER LANGUAGE plpgsql AS $$ BEGIN '
+                         "IF nextval('Retry_Test_Runs') % 2 = 1 THEN RAISE EXCEPTION 'deadlock' USING ERRCODE = '40P01'; END IF; "
+                         "IF p_fail THEN RAISE EXCEPTION 'duplicate' USING ERRCODE = '23505'; END IF; "
+                         'RETURN 1; END $$;')
+        finally:
+            conn.close()
+        try:
+            _, _, _, exp = Solution.handle_query(sql.SQL('SELECT Fn_Retry_Test(TRUE);'))
+            self.assertIsInstance(exp, DatabaseException.UNIQUE_VIOLATION)
+            self.assertEqual({'retries': {'40P01': 1}, 'recovered': 0, 'exhausted': 0}, Solution.RETRY_POLICY.metrics())
+            self.assertEqual((ReturnValue.OK, None), Solution.handle_query(sql.SQL('SELECT Fn_Retry_Test(FALSE);'))[::3])
+            self.assertEqual({'retries': {'40P01': 2}, 'recovered': 1, 'exhausted': 0}, Solution.RETRY_POLICY.metrics())
+        finally:
+            conn = Connector.DBConnector()
+            try:
+                conn.execute('DROP FUNCTION Fn_Retry_Test; DROP SEQUENCE Retry_Test_Runs;')
+            finally:
+                conn.close()
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,122 @@
+import unittest
+import psycopg2
+from psycopg2 import sql
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Business.Customer import Customer, BadCustomer
+from Business.Dish import Dish
+
+'''
+    Routing between a primary and a replica, the "replica" is a second database on the same server
+    (<database>_replica), which is never synced - so a read tells where it was routed to
+'''
+
+
+class Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        Connector.DBConnector.reset_routing()
+        conn = Connector.DBConnector()
+        cls.primary = conn.connection.get_dsn_parameters()
+        cls.primary['password'] = conn.connection.info.password
+        cls.replica = dict(cls.primary, dbname=cls.primary['dbname'] + '_replica')
+        conn.close()
+        try:
+            psycopg2.connect(**cls.replica).close()
+        except psycopg2.Error:
+            try:
+                admin = psycopg2.connect(**cls.primary)
+                admin.autocommit = True
+                admin.cursor().execute(sql.SQL('CREATE DATABASE {}').format(sql.Identifier(cls.replica['dbname'])))
+                admin.close()
+            except psycopg2.Error:
+                raise unittest.SkipTest('no replica database and no permission to create one')
+
+    def setUp(self) -> None:
+        for target in (self.replica, self.primary):
+            Connector.DBConnector.configure_routing(primary=target, replicas=[], read_your_writes=0)
+            Solution.drop_tables()
+            Solution.create_tables()
+        Connector.DBConnector.configure_routing(primary=self.primary, replicas=[self.replica], read_your_writes=0)
+
+    def tearDown(self) -> None:
+        for target in (self.replica, self.primary):
+            Connector.DBConnector.configure_routing(primary=target, replicas=[])
+            Solution.drop_tables()
+        Connector.DBConnector.reset_routing()
+
+    def test_reads_go_to_replica(self) -> None:
+        c1 = Customer(1, 'name', 21, "0123456789")
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(c1))
+        self.assertEqual(BadCustomer(), Solution.get_customer(1), 'read routed to the replica')
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.add_customer(c1), 'write routed to the primary')
+
+    def test_read_your_writes(self) -> None:
+        c1 = Customer(1, 'name', 21, "0123456789")
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(c1))
+        self.assertEqual(BadCustomer(), Solution.get_customer(1), 'read routed to the replica')
+        # the replicas are kept, and so is the time of the write
+        Connector.DBConnector.configure_routing(read_your_writes=60)
+        self.assertEqual(c1, Solution.get_customer(1), 'read after write routed to the primary')
+        Connector.DBConnector.configure_routing(read_your_writes=0)
+        self.assertEqual(BadCustomer(), Solution.get_customer(1), 'read routed to the replica')
+
+    def test_only_writes_start_read_your_writes(self) -> None:
+        c1 = Customer(1, 'name', 21, "0123456789")
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(c1))
+        # forget the write of c1
+        Connector.DBConnector.reset_routing()
+        Connector.DBConnector.configure_routing(primary=self.primary, replicas=[self.replica], read_your_writes=60)
+        # a read on a connection that may write
+        conn = Connector.DBConnector()
+        try:
+            self.assertEqual(1, conn.execute('SELECT * FROM Customers')[1].size())
+        finally:
+            conn.close()
+        self.assertEqual(BadCustomer(), Solution.get_customer(1), 'read routed to the replica')
+        # a SELECT that writes through the function it calls
+        self.assertEqual([ReturnValue.OK], Solution.batch_calls([(Solution.add_customer, Customer(2, 'name', 21, "0123456789"))]))
+        self.assertEqual(c1, Solution.get_customer(1), 'read after write routed to the primary')
+
+    def replica_execute(self, query: str) -> None:
+        conn = psycopg2.connect(**self.replica)
+        try:
+            conn.cursor().execute(query)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def test_lagging_replica_is_not_cached(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10, True)))
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 21, "0123456789")))
+        self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(1, 1, 1))
+        # the replica has not applied the writes yet
+        self.assertEqual([], Solution.get_customers_rated_but_not_ordered())
+        self.assertEqual([[]], Solution.batch_calls([(Solution.get_customers_rated_but_not_ordered_page, 0, 10)]))
+        self.replica_execute("INSERT INTO Dishes VALUES (1, 'Pizza', 10, TRUE); "
+                             "INSERT INTO Customers VALUES (1, 'name', 21, '0123456789'); "
+                             "INSERT INTO Customer_Ratings VALUES (1, 1, 1);")
+        self.assertEqual([1], Solution.get_customers_rated_but_not_ordered())
+        self.assertEqual([1], Solution.get_customers_rated_but_not_ordered_page(0, 10))
+
+        # a replica read long enough after the writes is cached
+        lag = Solution.REPLICA_LAG
+        Solution.REPLICA_LAG = 0
+        try:
+            self.assertEqual([1], Solution.get_customers_rated_but_not_ordered())
+            self.replica_execute('DELETE FROM Customer_Ratings;')
+            self.assertEqual([1], Solution.get_customers_rated_but_not_ordered())
+        finally:
+            Solution.REPLICA_LAG = lag
+
+    def test_fallback_to_primary(self) -> None:
+        Connector.DBConnector.configure_routing(replicas=[dict(self.replica, port=1)])
+        c1 = Customer(1, 'name', 21, "0123456789")
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(c1))
+        self.assertEqual(c1, Solution.get_customer(1), 'unreachable replica falls back to the primary')
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
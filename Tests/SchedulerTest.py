@@ -0,0 +1,96 @@
+import threading
+import time
+import unittest
+from Utility.Exceptions import DatabaseException
+from Utility.Scheduler import AdmissionScheduler
+
+
+class Test(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = AdmissionScheduler()
+        self.scheduler.configure('test', limit=1, max_queue=2, deadline=5.0)
+
+    def hold_slot(self, lane: str = 'test'):
+        started = threading.Event()
+        release = threading.Event()
+
+        def run():
+            with self.scheduler.admit(lane):
+                started.set()
+                release.wait()
+        thread = threading.Thread(target=run)
+        thread.start()
+        started.wait()
+        return thread, release
+
+    def wait_for_queue(self, lane: str, depth: int) -> None:
+        while self.scheduler.metrics()[lane]['queued'] < depth:
+            time.sleep(0.001)
+
+    def test_priority_order(self) -> None:
+        holder, release = self.hold_slot()
+        order = []
+
+        def run(name: str, priority: int):
+            with self.scheduler.admit('test', priority=priority):
+                order.append(name)
+        low = threading.Thread(target=run, args=('low', 1))
+        low.start()
+        self.wait_for_queue('test', 1)
+        high = threading.Thread(target=run, args=('high', 0))
+        high.start()
+        self.wait_for_queue('test', 2)
+
+        release.set()
+        for thread in (holder, low, high):
+            thread.join()
+        self.assertEqual(['high', 'low'], order)
+        self.assertEqual(3, self.scheduler.metrics()['test']['admitted'])
+
+    def test_reject_when_queue_full(self) -> None:
+        self.scheduler.configure('test', limit=1, max_queue=0, deadline=5.0)
+        holder, release = self.hold_slot()
+        with self.assertRaises(DatabaseException.ADMISSION_REJECTED):
+            with self.scheduler.admit('test'):
+                pass
+        release.set()
+        holder.join()
+        self.assertEqual(1, self.scheduler.metrics()['test']['rejected'])
+
+    def test_deadline(self) -> None:
+        holder, release = self.hold_slot()
+        with self.assertRaises(DatabaseException.ADMISSION_REJECTED):
+            with self.scheduler.admit('test', deadline=0.05):
+                pass
+        self.assertEqual(1, self.scheduler.metrics()['test']['timed_out'])
+        self.assertEqual(0, self.scheduler.metrics()['test']['queued'])
+        release.set()
+        holder.join()
+        with self.scheduler.admit('test', deadline=0.05):
+            pass
+
+    def test_lanes_are_independent(self) -> None:
+        self.scheduler.configure(AdmissionScheduler.ANALYTIC, limit=1, max_queue=0, deadline=0.0)
+        holder, release = self.hold_slot(AdmissionScheduler.ANALYTIC)
+        with self.scheduler.admit(AdmissionScheduler.INTERACTIVE, deadline=0.0):
+            pass
+        release.set()
+        holder.join()
+
+    def test_configure_keeps_unset_limits(self) -> None:
+        self.scheduler.configure('test', max_queue=0)
+        holder, release = self.hold_slot()
+        # the limit of 1 is kept, the queue is now full right away
+        with self.assertRaises(DatabaseException.ADMISSION_REJECTED):
+            with self.scheduler.admit('test'):
+                pass
+        self.scheduler.configure('test', limit=AdmissionScheduler.UNLIMITED)
+        with self.scheduler.admit('test', deadline=0.0):
+            pass
+        release.set()
+        holder.join()
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
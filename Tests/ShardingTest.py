@@ -0,0 +1,192 @@
+import unittest
+from datetime import datetime
+import psycopg2
+from psycopg2 import sql
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Business.Customer import Customer, BadCustomer
+from Business.Order import Order
+from Business.Dish import Dish
+
+'''
+    A database sharded over three other databases on the same server (<database>_shard_<n>), every API call
+    answers like it does on the unsharded database
+'''
+
+SHARDS = 3
+
+
+class Test(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        Connector.DBConnector.reset_routing()
+        conn = Connector.DBConnector()
+        primary = conn.connection.get_dsn_parameters()
+        primary['password'] = conn.connection.info.password
+        conn.close()
+        cls.shards = [dict(primary, dbname=f'{primary["dbname"]}_shard_{shard}') for shard in range(SHARDS)]
+        for shard in cls.shards:
+            try:
+                psycopg2.connect(**shard).close()
+            except psycopg2.Error:
+                try:
+                    admin = psycopg2.connect(**primary)
+                    admin.autocommit = True
+                    admin.cursor().execute(sql.SQL('CREATE DATABASE {}').format(sql.Identifier(shard['dbname'])))
+                    admin.close()
+                except psycopg2.Error:
+                    raise unittest.SkipTest('no shard databases and no permission to create them')
+
+    def setUp(self) -> None:
+        Connector.DBConnector.configure_routing(shards=self.shards)
+        Solution.drop_tables()
+        Solution.create_tables()
+
+    def tearDown(self) -> None:
+        Connector.DBConnector.configure_routing(shards=self.shards)
+        Solution.drop_tables()
+        Connector.DBConnector.reset_routing()
+
+    def rows(self, shard: int, query: str) -> list:
+        conn = Connector.DBConnector(shard=shard)
+        try:
+            return conn.execute(query)[1].rows
+        finally:
+            conn.close()
+
+    def populate(self) -> None:
+        for cust_id in range(1, 11):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, f'name{cust_id}', 30, "0123456789")))
+        for dish_id in range(1, 9):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 5 + dish_id, True)))
+        for order_id in range(1, 21):
+            # orders of the same month with the same fee, on different shards
+            date = datetime(2024, 1 + order_id % 5, 1 + order_id % 3, 12, 0)
+            self.assertEqual(ReturnValue.OK, Solution.add_order(Order(order_id, date, order_id % 2 * 3, 'Haifa street')))
+            for dish_id in range(1, 9):
+                if (order_id + dish_id) % 3 == 0:
+                    self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(order_id, dish_id, order_id % 4))
+            if order_id == 10:
+                # the orders after this one are ordered at the new prices
+                self.assertEqual(ReturnValue.OK, Solution.update_dish_price(2, 9))
+                self.assertEqual(ReturnValue.OK, Solution.update_dish_price(5, 3))
+        # orders 17 - 20 are never placed
+        for order_id in range(1, 17):
+            self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(1 + order_id * 7 % 10, order_id))
+        # half of the ratings go through the buffer, its batches hold the ratings of several shards
+        buffered = []
+        for cust_id in range(1, 11):
+            for dish_id in range(1, 9):
+                if (cust_id * dish_id) % 4 != 1:
+                    if dish_id % 2:
+                        self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(cust_id, dish_id, 1 + (cust_id + dish_id) % 5))
+                    else:
+                        buffered.append(Solution.customer_rated_dish_buffered(cust_id, dish_id, 1 + (cust_id + dish_id) % 5))
+        buffered.append(Solution.customer_rated_dish_buffered(2, 2, 5))
+        self.assertTrue(Solution.RATINGS_BUFFER.flush(timeout=30))
+        self.assertEqual([ReturnValue.OK] * (len(buffered) - 1) + [ReturnValue.ALREADY_EXISTS],
+                         [future.result() for future in buffered])
+        self.assertEqual(ReturnValue.OK, Solution.update_dish_active_status(8, False))
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(4))
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(3))
+
+    def answers(self) -> dict:
+        return {
+            'max_avg': Solution.get_customers_spent_max_avg_amount_money(),
+            'most_ordered': [Solution.get_most_ordered_dish_in_period(datetime(2024, month, 1), datetime(2024, month + 1, 2))
+                             for month in range(1, 6)],
+            'top_rated': [Solution.did_customer_order_top_rated_dishes(cust_id) for cust_id in range(1, 12)],
+            'rated_not_ordered': Solution.get_customers_rated_but_not_ordered(),
+            'rated_not_ordered_page': Solution.get_customers_rated_but_not_ordered_page(2, 2),
+            'non_worth': Solution.get_non_worth_price_increase(),
+            'profit': Solution.get_cumulative_profit_per_month(2024),
+            'recommendations': [Solution.get_potential_dish_recommendations(cust_id) for cust_id in range(1, 12)],
+            'totals': [Solution.get_order_total_price(order_id) for order_id in range(1, 22)],
+            'items': [sorted(Solution.get_all_order_items(order_id), key=lambda item: item.get_dish_id())
+                      for order_id in range(1, 22)],
+            'placed_by': [Solution.get_customer_that_placed_order(order_id) for order_id in range(1, 22)],
+            'ratings': [Solution.get_all_customer_ratings(cust_id) for cust_id in range(1, 12)],
+        }
+
+    def test_answers_match_unsharded(self) -> None:
+        self.populate()
+        sharded = self.answers()
+        # the snapshot of ANALYTICS would be of the primary only, the shards are queried instead
+        Solution.ANALYTICS.enable()
+        try:
+            self.assertEqual(sharded, self.answers())
+        finally:
+            Solution.ANALYTICS.disable()
+
+        Connector.DBConnector.configure_routing(shards=[])
+        Solution.drop_tables()
+        Solution.create_tables()
+        try:
+            self.populate()
+            self.assertEqual(self.answers(), sharded)
+        finally:
+            Solution.drop_tables()
+
+    def test_rows_live_on_their_shard(self) -> None:
+        self.populate()
+        for shard in range(SHARDS):
+            customers = [cust_id for cust_id, in self.rows(shard, 'SELECT Cust_id FROM Customers')]
+            self.assertTrue(customers and all(cust_id % SHARDS == shard for cust_id in customers))
+            # the orders that are placed are with their customer, and their home shard knows where they are
+            for order_id, cust_id in self.rows(shard, 'SELECT O.Order_id, R.Cust_id FROM Orders O '
+                                                      'LEFT JOIN Reservations R ON O.Order_id = R.Order_id'):
+                if cust_id is not None:
+                    self.assertEqual(shard, cust_id % SHARDS)
+                self.assertEqual([(shard,)], self.rows(order_id % SHARDS, f'SELECT Shard FROM Order_Shards '
+                                                                         f'WHERE Order_id = {order_id}'))
+            self.assertEqual([], self.rows(shard, 'SELECT Order_id FROM Order_Details EXCEPT SELECT Order_id FROM Orders'))
+            self.assertEqual(8, len(self.rows(shard, 'SELECT * FROM Dishes')))
+            self.assertEqual([(9,)], self.rows(shard, 'SELECT Price FROM Dishes WHERE Dish_id = 2'))
+
+        # order 19 moves from its home shard (1) to the shard of customer 5 (2)
+        items = Solution.get_all_order_items(19)
+        self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(5, 19))
+        self.assertEqual([(19, 2)], self.rows(1, 'SELECT * FROM Order_Shards WHERE Order_id = 19'))
+        self.assertEqual([], self.rows(1, 'SELECT * FROM Orders WHERE Order_id = 19'))
+        self.assertEqual(items, Solution.get_all_order_items(19))
+        self.assertEqual(Solution.get_customer(5), Solution.get_customer_that_placed_order(19))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.customer_placed_order(7, 19))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.add_order(Order(19, datetime(2024, 1, 1), 0, 'Haifa street')))
+        # a customer that does not exist leaves the order where it is
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.customer_placed_order(11, 20))
+        self.assertEqual([(20, 2)], self.rows(2, 'SELECT * FROM Order_Shards WHERE Order_id = 20'))
+        self.assertEqual(BadCustomer(), Solution.get_customer_that_placed_order(20))
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.customer_placed_order(5, 21))
+
+        self.assertEqual(ReturnValue.OK, Solution.delete_order(19))
+        self.assertEqual([], self.rows(1, 'SELECT * FROM Order_Shards WHERE Order_id = 19'))
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.delete_order(19))
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(19, datetime(2024, 1, 1), 0, 'Haifa street')))
+        self.assertEqual(ReturnValue.ERROR, Solution.export_snapshot('/tmp/sharded_snapshot'))
+
+        # the bulk deletes find the orders on their shards, and free their ids
+        self.assertEqual((ReturnValue.OK, 3), Solution.delete_orders([5, 6, 20, 21], batch_size=2))
+        # the orders of January - 10, 15 and 19
+        self.assertEqual((ReturnValue.OK, 3), Solution.purge_orders(datetime(2024, 2, 1), batch_size=1))
+        self.assertEqual((ReturnValue.OK, 3), Solution.delete_customers([1, 2, 3, 4], batch_size=1))
+        for shard in range(SHARDS):
+            self.assertEqual([], self.rows(shard, 'SELECT * FROM Order_Shards WHERE Order_id IN (5, 6, 10, 15, 19, 20)'))
+            self.assertEqual([], self.rows(shard, "SELECT * FROM Orders WHERE Date < '2024-02-01' OR Order_id IN (5, 6, 20)"))
+            self.assertEqual([], self.rows(shard, 'SELECT * FROM Customers WHERE Cust_id <= 4'))
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(20, datetime(2024, 1, 1), 0, 'Haifa street')))
+
+        # the menu is synced on every shard
+        catalog = [Solution.get_dish(dish_id) for dish_id in range(1, 9)] + [Dish(9, 'Dish9', 4, True)]
+        catalog[0].set_price(20)
+        retVal, summary = Solution.sync_menu(catalog)
+        self.assertEqual(ReturnValue.OK, retVal)
+        self.assertEqual((1, 1, 7), (summary['inserted'], summary['price_changed'], summary['unchanged']))
+        for shard in range(SHARDS):
+            self.assertEqual([(1, 20), (9, 4)], self.rows(shard, 'SELECT Dish_id, Price FROM Dishes '
+                                                                 'WHERE Dish_id IN (1, 9) ORDER BY Dish_id'))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
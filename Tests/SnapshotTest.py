@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer, BadCustomer
+from Business.Order import Order
+from Business.Dish import Dish
+from Business.OrderDish import OrderDish
+
+
+class Test(AbstractTest):
+    def fill_tables(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'name', 21, "0123456789")))
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(2, 'other, "quoted"', 30, "0123456789")))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(1, 'Pizza', 10.5, True)))
+        self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(2, 'Pasta', 20, False)))
+        self.assertEqual(ReturnValue.OK, Solution.add_order(Order(1, datetime(2024, 5, 1, 12, 30), 5.5, 'Haifa street')))
+        self.assertEqual(ReturnValue.OK, Solution.customer_placed_order(1, 1))
+        self.assertEqual(ReturnValue.OK, Solution.order_contains_dish(1, 1, 3))
+        self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(2, 1, 5))
+
+    def check_tables(self) -> None:
+        self.assertEqual(Customer(2, 'other, "quoted"', 30, "0123456789"), Solution.get_customer(2))
+        self.assertEqual(Dish(2, 'Pasta', 20, False), Solution.get_dish(2))
+        self.assertEqual(Customer(1, 'name', 21, "0123456789"), Solution.get_customer_that_placed_order(1))
+        self.assertEqual([OrderDish(1, 3, 10.5)], Solution.get_all_order_items(1))
+        self.assertEqual([(1, 5)], Solution.get_all_customer_ratings(2))
+        self.assertAlmostEqual(37.0, Solution.get_order_total_price(1))
+        self.assertEqual([1], Solution.get_customers_spent_max_avg_amount_money())
+
+    def test_snapshot_roundtrip(self) -> None:
+        self.fill_tables()
+        for fmt in Solution.SNAPSHOT_FORMATS:
+            with tempfile.TemporaryDirectory() as path:
+                self.assertEqual(ReturnValue.OK, Solution.export_snapshot(path, fmt), fmt)
+                Solution.clear_tables()
+                self.assertEqual(BadCustomer(), Solution.get_customer(1))
+                self.assertEqual(ReturnValue.OK, Solution.restore_snapshot(path), fmt)
+                self.check_tables()
+
+    def test_restore_replaces_content(self) -> None:
+        self.fill_tables()
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(ReturnValue.OK, Solution.export_snapshot(path))
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(3, 'late', 40, "0123456789")))
+            self.assertEqual(ReturnValue.OK, Solution.restore_snapshot(path))
+            self.assertEqual(BadCustomer(), Solution.get_customer(3))
+            self.check_tables()
+
+    def indexes(self) -> dict:
+        conn = Connector.DBConnector()
+        try:
+            _, result = conn.execute("SELECT indexname, indexrelid::regclass::oid::INTEGER FROM pg_indexes "
+                                     "JOIN pg_index ON indexrelid = (schemaname || '.' || indexname)::regclass "
+                                     "WHERE schemaname = current_schema()")
+        finally:
+            conn.close()
+        return dict(result.rows)
+
+    def test_secondary_indexes_are_created_again(self) -> None:
+        self.fill_tables()
+        before = self.indexes()
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(ReturnValue.OK, Solution.export_snapshot(path))
+            self.assertEqual(ReturnValue.OK, Solution.restore_snapshot(path))
+            after = self.indexes()
+            self.check_tables()
+            # a failed restore leaves them as they were
+            with open(os.path.join(path, 'Orders.binary.gz'), 'wb') as stream:
+                stream.write(b'not a snapshot')
+            self.assertEqual(ReturnValue.ERROR, Solution.restore_snapshot(path))
+            self.assertEqual(after, self.indexes())
+        self.assertEqual(set(before), set(after))
+        for index in Solution.Secondary_Indexes_Names:
+            self.assertNotEqual(before[index.lower()], after[index.lower()], index)
+        for index in set(before) - {index.lower() for index in Solution.Secondary_Indexes_Names}:
+            self.assertEqual(before[index], after[index], index)
+        self.check_tables()
+
+    def test_bad_snapshot(self) -> None:
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(ReturnValue.BAD_PARAMS, Solution.export_snapshot(path, 'xml'))
+            self.assertEqual(ReturnValue.NOT_EXISTS, Solution.restore_snapshot(os.path.join(path, 'missing')))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,63 @@
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Utility.TablePager import TablePager
+from Tests.AbstractTest import AbstractTest
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        # prices repeat, so the pages of a sort by price depend on the dish ID tie break
+        for dish_id in range(1, 24):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish_{dish_id % 3}', 10 + dish_id % 4,
+                                                                    dish_id % 2 == 0)))
+        self.conn = Connector.DBConnector(read_only=True)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        super().tearDown()
+
+    def pages(self, pager: TablePager) -> list:
+        pages = [[row[0] for row in pager.page()]]
+        while pager.next():
+            pages.append([row[0] for row in pager.page()])
+        return pages
+
+    def test_sorted_filtered_pages(self) -> None:
+        expected = sorted((dish_id for dish_id in range(1, 24) if dish_id % 3 == 1 and dish_id > 3),
+                          key=lambda dish_id: (10 + dish_id % 4, dish_id), reverse=True)
+        pager = TablePager(self.conn, 'Dishes', page_size=2, sort='Price', descending=True,
+                           filters=[('Name', 'contains', 'h_1'), ('Dish_id', '>', '3')])
+        pages = self.pages(pager)
+        self.assertEqual([expected[i:i + 2] for i in range(0, len(expected), 2)], pages)
+        self.assertEqual(len(pages), pager.page_number)
+        self.assertFalse(pager.has_next())
+
+        self.assertTrue(pager.previous())
+        self.assertEqual(pages[-2], [row[0] for row in pager.page()])
+        pager.first()
+        self.assertFalse(pager.has_previous())
+        self.assertEqual(pages[0], [row[0] for row in pager.page()])
+
+        # a full last page has no empty page after it
+        self.assertEqual([list(range(1, 13)), list(range(13, 24))],
+                         self.pages(TablePager(self.conn, 'Dishes', page_size=12)))
+        self.assertEqual([list(range(1, 24))], self.pages(TablePager(self.conn, 'Dishes', page_size=23)))
+
+        with self.assertRaises(ValueError):
+            TablePager(self.conn, 'Dishes', filters=[('Name; DROP TABLE Dishes', '=', 1)])
+        with self.assertRaises(ValueError):
+            TablePager(self.conn, 'Dish_Price_Epochs')
+
+    def test_estimate(self) -> None:
+        self.conn.execute('ANALYZE Dishes')
+        self.assertEqual(23, TablePager(self.conn, 'Dishes').estimate())
+        self.assertGreater(TablePager(self.conn, 'Dishes', filters=[('Is_active', '=', True)]).estimate(), 0)
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
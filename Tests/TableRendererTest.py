@@ -0,0 +1,66 @@
+import io
+import json
+import unittest
+import tracemalloc
+import Utility.DBConnector as Connector
+from Tests.AbstractTest import AbstractTest
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.conn = Connector.DBConnector()
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        super().tearDown()
+
+    def test_formats(self) -> None:
+        _, result = self.conn.execute("SELECT i AS id, 'dish ' || i AS name, i * 1.5 AS price, NULL AS note "
+                                      "FROM generate_series(9, 11) i")
+        self.assertEqual('id   name      price   note\n'
+                         '9    dish 9    13.5    None\n'
+                         '10   dish 10   15.0    None\n'
+                         '11   dish 11   16.5    None\n', str(result))
+
+        stream = io.StringIO()
+        self.assertEqual(2, result.render(stream, 'csv', limit=2, max_width=5))
+        self.assertEqual('id,name,price,note\n9,di...,13.5,\n10,di...,15.0,\n', stream.getvalue())
+
+        stream = io.StringIO()
+        self.assertEqual(3, result.render(stream, 'jsonl'))
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual({'id': 11, 'name': 'dish 11', 'price': '16.5', 'note': None}, lines[2])
+
+        stream = io.StringIO()
+        self.assertEqual(1, result.render(stream, limit=1))
+        self.assertEqual('id   name     price   note\n9    dish 9   13.5    None\n... (more than 1 rows)\n',
+                         stream.getvalue())
+        self.assertRaises(ValueError, result.render, stream, 'xml')
+
+    def test_dump_memory_is_flat(self) -> None:
+        query = "SELECT i, repeat('x', 100) AS text FROM generate_series(1, 50000) i"
+        tracemalloc.start()
+        try:
+            written = self.conn.dump(query, _Discard(), max_width=20)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(50000, written)
+        # the whole result is about 8MB as Python objects, the dump holds a few fetches of it
+        self.assertLess(peak, 3 << 20)
+
+        stream = io.StringIO()
+        self.assertEqual(3, self.conn.dump(query, stream, 'csv', limit=3))
+        self.assertEqual(['i,text', '1,' + 'x' * 100], stream.getvalue().splitlines()[:2])
+
+
+class _Discard:
+    # a stream that drops what is written to it
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,94 @@
+import threading
+import unittest
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Utility.Exceptions import DatabaseException
+from Utility.WriteBehindBuffer import WriteBehindBuffer
+from Tests.AbstractTest import AbstractTest
+from Business.Customer import Customer
+from Business.Dish import Dish
+
+
+class Test(AbstractTest):
+    def tearDown(self) -> None:
+        Solution.RATINGS_BUFFER.close()
+        Solution.RATINGS_BUFFER.configure(max_batch=500, max_delay=0.05)
+        super().tearDown()
+
+    def test_buffered_ratings(self) -> None:
+        for cust_id in range(1, 4):
+            self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(cust_id, f'name{cust_id}', 30, '0123456789')))
+        for dish_id in range(1, 6):
+            self.assertEqual(ReturnValue.OK, Solution.add_dish(Dish(dish_id, f'Dish{dish_id}', 10, True)))
+        self.assertEqual(ReturnValue.OK, Solution.customer_rated_dish(1, 1, 5))
+        # nothing is applied before the flush
+        Solution.RATINGS_BUFFER.configure(max_batch=100, max_delay=60)
+
+        ratings = [(cust_id, dish_id, 1 + (cust_id + dish_id) % 5) for cust_id in range(1, 4) for dish_id in range(1, 6)]
+        futures = [Solution.customer_rated_dish_buffered(*rating) for rating in ratings]
+        self.assertEqual([(1, 5)], Solution.get_all_customer_ratings(1))
+        self.assertTrue(Solution.RATINGS_BUFFER.flush(timeout=30))
+        # (1, 1) was rated already, the other ratings of its batch are inserted anyway
+        self.assertEqual([ReturnValue.ALREADY_EXISTS] + [ReturnValue.OK] * 14, [future.result() for future in futures])
+        self.assertEqual([(1, 5)] + [(dish_id, 1 + (1 + dish_id) % 5) for dish_id in range(2, 6)],
+                         Solution.get_all_customer_ratings(1))
+
+        futures = [Solution.customer_rated_dish_buffered(4, 1, 3), Solution.customer_rated_dish_buffered(1, 6, 3),
+                   Solution.customer_rated_dish_buffered(2, 1, 7), Solution.customer_rated_dish_buffered(3, 1, 4)]
+        Solution.RATINGS_BUFFER.close()
+        self.assertEqual([ReturnValue.NOT_EXISTS, ReturnValue.NOT_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.ALREADY_EXISTS],
+                         [future.result(timeout=0) for future in futures])
+
+        # the batch is one INSERT
+        Solution.RATINGS_BUFFER.configure(max_batch=3, max_delay=0)
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(3))
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(3, 'name3', 30, '0123456789')))
+        batches = Solution.RATINGS_BUFFER.stats()['batches']
+        futures = [Solution.customer_rated_dish_buffered(3, dish_id, 2) for dish_id in range(1, 4)]
+        self.assertEqual([ReturnValue.OK] * 3, [future.result(timeout=30) for future in futures])
+        self.assertEqual(batches + 1, Solution.RATINGS_BUFFER.stats()['batches'])
+
+    def test_backpressure(self) -> None:
+        release = threading.Event()
+        applied = []
+
+        def apply(items: list) -> list:
+            release.wait()
+            if 'bad' in items:
+                raise ValueError('bad item')
+            applied.extend(items)
+            return [item * 2 for item in items]
+
+        buffer = WriteBehindBuffer(apply, max_batch=2, max_delay=0, max_queue=2, put_timeout=0.1)
+        first = buffer.submit(1)
+        # the first item is taken by the thread, which waits in apply
+        while buffer.stats()['queued']:
+            pass
+        queued = [buffer.submit(2), buffer.submit(3)]
+        with self.assertRaises(DatabaseException.ADMISSION_REJECTED):
+            buffer.submit(4)
+        self.assertEqual(1, buffer.stats()['rejected'])
+        self.assertTrue(queued[1].cancel())
+
+        # a full queue blocks the submit until the thread takes a batch
+        blocked = []
+        buffer.configure(put_timeout=30)
+        submitter = threading.Thread(target=lambda: blocked.append(buffer.submit(5)))
+        submitter.start()
+        release.set()
+        submitter.join()
+        buffer.close()
+        self.assertEqual([2, 4, 10], [first.result(timeout=0), queued[0].result(timeout=0), blocked[0].result(timeout=0)])
+        self.assertEqual([1, 2, 5], applied)
+        self.assertEqual(1, buffer.stats()['cancelled'])
+
+        failed = buffer.submit('bad')
+        self.assertTrue(buffer.flush(timeout=30))
+        self.assertIsInstance(failed.exception(timeout=0), ValueError)
+        self.assertEqual(1, buffer.stats()['failed_batches'])
+        buffer.close()
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
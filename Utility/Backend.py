@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Tuple
+from Utility.ReturnValue import ReturnValue
+from Business.Customer import Customer
+from Business.Order import Order
+from Business.Dish import Dish
+from Business.OrderDish import OrderDish
+
+# the default number of rows in a page of the pagination API
+PAGE_SIZE = 1000
+
+# Rows deleted per transaction by the bulk deletes. Every batch commits on its own, so the locks are held and the WAL
+# is written one batch at a time, and a long purge does not hold up the writes of the rows it gets to last
+DELETE_BATCH_SIZE = 1000
+
+# The counts sync_menu returns
+MENU_SYNC_COUNTS = ['inserted', 'price_changed', 'renamed', 'activated', 'deactivated', 'unchanged']
+
+
+class Backend(ABC):
+    """
+    The database API as an interface, so it can be served by something other than PostgreSQL.
+    Solution.use_backend(backend) sends every API call (tables, CRUD, Basic, Advanced and the pages) to the backend,
+    which must answer exactly like the PostgreSQL implementation - the same constraints, the same ReturnValue for
+    every failure and the same results.
+    Of the BULK API sync_menu and the bulk deletes are a part of it, the snapshots and precompute_recommendations
+    work on PostgreSQL only.
+    """
+
+    @abstractmethod
+    def create_tables(self) -> None:
+        pass
+
+    @abstractmethod
+    def clear_tables(self) -> None:
+        pass
+
+    @abstractmethod
+    def drop_tables(self) -> None:
+        pass
+
+    # CRUD API
+
+    @abstractmethod
+    def add_customer(self, customer: Customer) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_customer(self, customer_id: int) -> Customer:
+        pass
+
+    @abstractmethod
+    def delete_customer(self, customer_id: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def add_order(self, order: Order) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_order(self, order_id: int) -> Order:
+        pass
+
+    @abstractmethod
+    def delete_order(self, order_id: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def add_dish(self, dish: Dish) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_dish(self, dish_id: int) -> Dish:
+        pass
+
+    @abstractmethod
+    def update_dish_price(self, dish_id: int, price: float) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def update_dish_active_status(self, dish_id: int, is_active: bool) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def customer_placed_order(self, customer_id: int, order_id: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_customer_that_placed_order(self, order_id: int) -> Customer:
+        pass
+
+    @abstractmethod
+    def order_contains_dish(self, order_id: int, dish_id: int, amount: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def order_does_not_contain_dish(self, order_id: int, dish_id: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_all_order_items(self, order_id: int) -> List[OrderDish]:
+        pass
+
+    @abstractmethod
+    def customer_rated_dish(self, cust_id: int, dish_id: int, rating: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def customer_deleted_rating_on_dish(self, cust_id: int, dish_id: int) -> ReturnValue:
+        pass
+
+    @abstractmethod
+    def get_all_customer_ratings(self, cust_id: int) -> List[Tuple[int, int]]:
+        pass
+
+    # Basic API
+
+    @abstractmethod
+    def get_order_total_price(self, order_id: int) -> float:
+        pass
+
+    @abstractmethod
+    def get_customers_spent_max_avg_amount_money(self) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_most_ordered_dish_in_period(self, start: datetime, end: datetime) -> Dish:
+        pass
+
+    @abstractmethod
+    def did_customer_order_top_rated_dishes(self, cust_id: int) -> bool:
+        pass
+
+    # Advanced API
+
+    @abstractmethod
+    def get_customers_rated_but_not_ordered(self) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_non_worth_price_increase(self) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_cumulative_profit_per_month(self, year: int) -> List[Tuple[int, float]]:
+        pass
+
+    @abstractmethod
+    def get_potential_dish_recommendations(self, cust_id: int) -> List[int]:
+        pass
+
+    # Pagination API
+
+    @abstractmethod
+    def get_order_items_page(self, order_id: int, after_dish_id: int = 0, page_size: int = PAGE_SIZE) -> List[OrderDish]:
+        pass
+
+    @abstractmethod
+    def get_customer_ratings_page(self, cust_id: int, after_dish_id: int = 0,
+                                  page_size: int = PAGE_SIZE) -> List[Tuple[int, int]]:
+        pass
+
+    @abstractmethod
+    def get_customers_rated_but_not_ordered_page(self, after_cust_id: int = 0, page_size: int = PAGE_SIZE) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_potential_dish_recommendations_page(self, cust_id: int, after_dish_id: int = 0,
+                                                page_size: int = PAGE_SIZE) -> List[int]:
+        pass
+
+    # Bulk API
+
+    @abstractmethod
+    def sync_menu(self, dishes: List[Dish], deactivate_missing: bool = False) -> Tuple[ReturnValue, dict]:
+        pass
+
+    @abstractmethod
+    def delete_customers(self, customer_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                         progress=None) -> Tuple[ReturnValue, int]:
+        pass
+
+    @abstractmethod
+    def delete_orders(self, order_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                      progress=None) -> Tuple[ReturnValue, int]:
+        pass
+
+    @abstractmethod
+    def purge_orders(self, before: datetime, batch_size: int = DELETE_BATCH_SIZE, progress=None) -> Tuple[ReturnValue, int]:
+        pass
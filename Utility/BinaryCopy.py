@@ -0,0 +1,222 @@
+import struct
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+# Decoding of COPY ... TO STDOUT (FORMAT binary) into NumPy column arrays (see DBConnector.fetch_arrays).
+#
+# The stream is a header, then every row as an int16 field count followed by an int32 length (-1 for NULL)
+# and the big endian value of every field, and an int16 -1 at the end.
+# When every column has a fixed width, the rows of a chunk have one layout and are read with a single
+# np.frombuffer of a structured dtype. A row that does not fit the layout (a NULL) and the rows of tables with
+# text columns are read one by one.
+
+SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+# rows per chunk, the raw bytes of a chunk are all that is held besides the arrays
+CHUNK_ROWS = 1 << 16
+# microseconds / days from 1970-01-01 to the PostgreSQL epoch, 2000-01-01
+_EPOCH_MICROSECONDS = 946684800 * 1000000
+_EPOCH_DAYS = 10957
+
+
+class _Kind:
+    # how a column is sent (wire - its big endian dtype, None for text) and the array it is decoded to
+    def __init__(self, wire: Optional[str], raw, convert: Callable[[np.ndarray], np.ndarray], dtype, null=None,
+                 cast: Optional[str] = None):
+        self.wire = wire
+        self.raw = raw
+        self.convert = convert
+        self.dtype = dtype
+        # the value of a NULL, None - the column can not hold NULLs
+        self.null = null
+        # the type the server casts the column to before it is sent
+        self.cast = cast
+        self.struct = struct.Struct(_STRUCT_FORMATS[wire]) if wire is not None else None
+
+
+# the struct format of every wire dtype, for the rows read one by one
+_STRUCT_FORMATS = {'?': '?', '>i2': '>h', '>i4': '>i', '>i8': '>q', '>f4': '>f', '>f8': '>d'}
+
+
+_INTEGER = lambda wire: _Kind(wire, np.int64, lambda raw: raw.astype(np.int64), np.int64)
+_FLOAT = lambda wire, cast=None: _Kind(wire, np.float64, lambda raw: raw.astype(np.float64), np.float64, np.nan, cast)
+_TEXT = _Kind(None, object, lambda raw: raw, object, cast='TEXT')
+
+# the kinds by the type oid of the column, a column of any other type is sent as TEXT
+_KINDS = {
+    16: _Kind('?', np.bool_, lambda raw: raw.astype(np.bool_), np.bool_),  # BOOLEAN
+    20: _INTEGER('>i8'),  # BIGINT
+    21: _INTEGER('>i2'),  # SMALLINT
+    23: _INTEGER('>i4'),  # INTEGER
+    700: _FLOAT('>f4'),  # REAL
+    701: _FLOAT('>f8'),  # DOUBLE PRECISION
+    # NUMERIC is sent as base 10000 digits, the server casts it to float8 instead of every value being decoded here
+    1700: _FLOAT('>f8', 'FLOAT8'),  # NUMERIC
+    1114: _Kind('>i8', np.int64, lambda raw: (raw.astype(np.int64) + _EPOCH_MICROSECONDS).view('datetime64[us]'),
+                'datetime64[us]', np.datetime64('NaT')),  # TIMESTAMP
+    1184: _Kind('>i8', np.int64, lambda raw: (raw.astype(np.int64) + _EPOCH_MICROSECONDS).view('datetime64[us]'),
+                'datetime64[us]', np.datetime64('NaT')),  # TIMESTAMP WITH TIME ZONE, in UTC
+    1082: _Kind('>i4', np.int64, lambda raw: (raw.astype(np.int64) + _EPOCH_DAYS).astype('datetime64[D]'),
+                'datetime64[D]', np.datetime64('NaT')),  # DATE
+    25: _Kind(None, object, lambda raw: raw, object),  # TEXT
+    1043: _Kind(None, object, lambda raw: raw, object),  # VARCHAR
+}
+
+_FIELD_COUNT = struct.Struct('>h')
+_FIELD_LENGTH = struct.Struct('>i')
+
+
+def copy_statement(query: str, description) -> (str, List[str], List[_Kind]):
+    # the COPY of the query's columns, every one cast to the type it is decoded from
+    names = [column.name for column in description]
+    kinds = [_KINDS.get(column.type_code, _TEXT) for column in description]
+    columns = ', '.join('"{}"'.format(name.replace('"', '""')) + (f'::{kind.cast}' if kind.cast else '')
+                        for name, kind in zip(names, kinds))
+    return f'COPY (SELECT {columns} FROM ({query}) Binary_Copy) TO STDOUT (FORMAT binary)', names, kinds
+
+
+class ArrayDecoder:
+    """
+    The file object given to copy_expert - decodes the binary COPY stream as it arrives and hands every chunk of
+    chunk_rows rows to on_chunk as {column name: array}.
+    NULLs are NaN / NaT / None in the float / time / text arrays, a NULL integer or boolean raises ValueError
+    (COALESCE it in the query).
+    """
+
+    def __init__(self, names: List[str], kinds: List[_Kind], on_chunk: Callable[[Dict[str, np.ndarray]], None],
+                 chunk_rows: int = CHUNK_ROWS, buffer_size: int = 1 << 20):
+        self.names = names
+        self.kinds = kinds
+        self.on_chunk = on_chunk
+        self.chunk_rows = chunk_rows
+        self.buffer_size = buffer_size
+        self.rows = 0
+        self.__buffer = bytearray()
+        self.__header_done = False
+        self.__done = False
+        # the rows of the current chunk, as arrays read together and values read one by one (in their order)
+        self.__parts = [[] for _ in names]
+        self.__values = [[] for _ in names]
+        self.__chunk_rows = 0
+        self.__layout = None
+        if all(kind.wire is not None for kind in kinds):
+            fields = [('count', '>i2')]
+            for index, kind in enumerate(kinds):
+                fields += [(f'length{index}', '>i4'), (f'value{index}', kind.wire)]
+            self.__layout = np.dtype(fields)
+
+    def write(self, data: bytes):
+        self.__buffer += data
+        if len(self.__buffer) >= self.buffer_size:
+            self.__decode()
+
+    # decode the rest of the stream, returns the number of rows
+    def finish(self) -> int:
+        self.__decode()
+        if not self.__done:
+            raise ValueError('The binary COPY stream ended before its trailer')
+        if self.__chunk_rows or self.rows == 0:
+            self.__emit()
+        return self.rows
+
+    def __decode(self):
+        data = bytes(self.__buffer)
+        position = 0
+        if not self.__header_done:
+            if len(data) < len(SIGNATURE) + 8:
+                return
+            if not data.startswith(SIGNATURE):
+                raise ValueError('Not a binary COPY stream')
+            extension = _FIELD_LENGTH.unpack_from(data, len(SIGNATURE) + 4)[0]
+            position = len(SIGNATURE) + 8 + extension
+            if len(data) < position:
+                return
+            self.__header_done = True
+
+        while not self.__done:
+            if self.__layout is not None:
+                count = min((len(data) - position) // self.__layout.itemsize, self.chunk_rows - self.__chunk_rows)
+                if count:
+                    position += self.__add_block(np.frombuffer(data, self.__layout, count, position))
+                    if self.__chunk_rows == self.chunk_rows:
+                        self.__emit()
+                        continue
+            end = self.__add_row(data, position)
+            if end is None:
+                break
+            position = end
+            if self.__chunk_rows == self.chunk_rows:
+                self.__emit()
+        self.__buffer = bytearray(data[position:])
+
+    # adds the leading rows of the block that fit the layout, returns their size in bytes
+    def __add_block(self, block: np.ndarray) -> int:
+        fits = block['count'] == len(self.kinds)
+        for index, kind in enumerate(self.kinds):
+            fits &= block[f'length{index}'] == kind.struct.size
+        count = len(block) if fits.all() else int(np.argmin(fits))
+        if count:
+            self.__flush_values()
+            for index, part in enumerate(self.__parts):
+                part.append(self.kinds[index].convert(block[f'value{index}'][:count]))
+            self.__chunk_rows += count
+            self.rows += count
+        return count * self.__layout.itemsize
+
+    # adds the row at position, returns the position after it (None if it did not fully arrive yet)
+    def __add_row(self, data: bytes, position: int) -> Optional[int]:
+        if len(data) < position + 2:
+            return None
+        count = _FIELD_COUNT.unpack_from(data, position)[0]
+        position += 2
+        if count == -1:
+            self.__done = True
+            return position
+        if count != len(self.kinds):
+            raise ValueError(f'A row of {count} fields, expected {len(self.kinds)}')
+        row = []
+        for kind in self.kinds:
+            if len(data) < position + 4:
+                return None
+            length = _FIELD_LENGTH.unpack_from(data, position)[0]
+            position += 4
+            if length == -1:
+                row.append(None)
+                continue
+            if len(data) < position + length:
+                return None
+            if kind.struct is None:
+                row.append(data[position:position + length].decode())
+            else:
+                row.append(kind.struct.unpack_from(data, position)[0])
+            position += length
+        for values, value in zip(self.__values, row):
+            values.append(value)
+        self.__chunk_rows += 1
+        self.rows += 1
+        return position
+
+    def __flush_values(self):
+        if not self.__values[0]:
+            return
+        for name, kind, part, values in zip(self.names, self.kinds, self.__parts, self.__values):
+            if kind.raw is object:
+                array = np.empty(len(values), dtype=object)
+                array[:] = values
+            else:
+                nulls = np.array([value is None for value in values])
+                array = kind.convert(np.array([0 if value is None else value for value in values], dtype=kind.raw))
+                if nulls.any():
+                    if kind.null is None:
+                        raise ValueError(f'Column {name} has NULLs, it can not be an {np.dtype(kind.dtype)} array')
+                    array[nulls] = kind.null
+            part.append(array)
+            values.clear()
+
+    def __emit(self):
+        self.__flush_values()
+        chunk = {}
+        for name, kind, part in zip(self.names, self.kinds, self.__parts):
+            chunk[name] = np.concatenate(part) if part else np.empty(0, dtype=kind.dtype)
+            part.clear()
+        self.__chunk_rows = 0
+        self.on_chunk(chunk)
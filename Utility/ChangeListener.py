@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+import Utility.DBConnector as Connector
+from Utility.ResultCache import ResultCache
+
+# the payload asking every listener to drop all of its cached results (e.g. after a load that ran without triggers)
+FLUSH_PAYLOAD = '*'
+
+
+class ChangeListener:
+    """
+    Keeps the caches of this process current with the writes of every process.
+    The tables' triggers send a NOTIFY '<table>:<I|U|D>:<key>' for every changed row, a background thread LISTENs
+    on the channel and bumps the changed tables in the ResultCache.
+    A storm of notifications (a bulk write, a cascade) is coalesced - the notifications that arrive within
+    coalesce_window seconds of the first one are handled as one batch, one bump per table.
+    Notifications sent while the listener is disconnected are lost, so after every (re)connect the whole
+    cache is flushed.
+    The callbacks added with on_changes get every batch as a list of distinct (table, operation, key),
+    with key None for a table that had more than max_keys changed rows in the batch.
+    """
+
+    def __init__(self, cache: ResultCache, channel: str, coalesce_window: float = 0.05, max_keys: int = 1000,
+                 reconnect_delay: float = 1.0):
+        self.cache = cache
+        self.channel = channel
+        self.coalesce_window = coalesce_window
+        self.max_keys = max_keys
+        self.reconnect_delay = reconnect_delay
+        self.__lock = threading.Lock()
+        self.__callbacks = []
+        self.__thread = None
+        self.__stop = threading.Event()
+        self.__listening = threading.Event()
+        self.__notifications = 0
+        self.__batches = 0
+        self.__flushes = 0
+        self.__reconnects = 0
+
+    def start(self):
+        with self.__lock:
+            if self.__thread is not None:
+                return
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__run, name='change-listener', daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        with self.__lock:
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__stop.set()
+            thread.join()
+            self.__listening.clear()
+
+    # wait until the listener is subscribed (the writes made before that are only covered by the connect flush)
+    def wait_listening(self, timeout: Optional[float] = None) -> bool:
+        return self.__listening.wait(timeout)
+
+    # callback(changes) is called with every batch of changes, from the listener's thread
+    def on_changes(self, callback: Callable[[List[Tuple[str, str, Optional[str]]]], None]):
+        with self.__lock:
+            self.__callbacks.append(callback)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'listening': self.__listening.is_set(),
+                'notifications': self.__notifications,
+                'batches': self.__batches,
+                'flushes': self.__flushes,
+                'reconnects': self.__reconnects,
+            }
+
+    def __run(self):
+        connected_before = False
+        while not self.__stop.is_set():
+            conn = None
+            try:
+                conn = Connector.DBConnector()
+                conn.listen(self.channel)
+                # whatever was written while nobody listened is unknown
+                self.cache.flush()
+                with self.__lock:
+                    self.__flushes += 1
+                    self.__reconnects += connected_before
+                connected_before = True
+                self.__listening.set()
+                while not self.__stop.is_set():
+                    payloads = [payload for _, payload in conn.notifications(timeout=0.5)]
+                    if not payloads:
+                        continue
+                    # coalesce the rest of the storm into the same batch
+                    deadline = time.monotonic() + self.coalesce_window
+                    while time.monotonic() < deadline:
+                        payloads += [payload for _, payload in conn.notifications(max(0.0, deadline - time.monotonic()))]
+                    self.__apply(payloads)
+            except Exception:
+                self.__listening.clear()
+                self.__stop.wait(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def __apply(self, payloads: List[str]):
+        if FLUSH_PAYLOAD in payloads:
+            self.cache.flush()
+            changes = [(FLUSH_PAYLOAD, FLUSH_PAYLOAD, None)]
+        else:
+            keys = {}
+            for payload in payloads:
+                table, operation, key = (payload.split(':', 2) + ['', ''])[:3]
+                keys.setdefault(table, set()).add((operation, key))
+            self.cache.bump(*keys)
+            changes = []
+            for table, table_keys in keys.items():
+                if len(table_keys) > self.max_keys:
+                    changes.append((table, '*', None))
+                else:
+                    changes += [(table, operation, key) for operation, key in sorted(table_keys)]
+
+        with self.__lock:
+            self.__notifications += len(payloads)
+            self.__batches += 1
+            self.__flushes += FLUSH_PAYLOAD in payloads
+            callbacks = list(self.__callbacks)
+        for callback in callbacks:
+            callback(changes)
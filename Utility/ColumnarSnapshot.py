@@ -0,0 +1,214 @@
+import functools
+import threading
+import time
+from datetime import datetime
+from typing import List, Tuple, Optional
+import numpy as np
+import Utility.DBConnector as Connector
+from Business.Dish import Dish, BadDish
+
+# the columns of every table in the snapshot, in the order they are selected
+_TABLE_COLUMNS = {
+    'Customers': ('Cust_id', 'Age'),
+    'Orders': ('Order_id', 'Date', 'Delivery_fee'),
+    'Dishes': ('Dish_id', 'Name', 'Price', 'Is_active'),
+    'Reservations': ('Order_id', 'Cust_id'),
+    'Order_Details': ('Order_id', 'Dish_id', 'Dish_amount', 'Dish_price'),
+    'Customer_Ratings': ('Cust_id', 'Dish_id', 'Rating'),
+}
+_COLUMN_TYPES = {
+    'Cust_id': np.int64, 'Order_id': np.int64, 'Dish_id': np.int64, 'Age': np.int64, 'Dish_amount': np.int64,
+    'Rating': np.int64, 'Delivery_fee': np.float64, 'Price': np.float64, 'Dish_price': np.float64,
+    'Date': 'datetime64[s]', 'Is_active': np.bool_, 'Name': object,
+}
+# averages closer than this (relatively) are taken as equal - the float sums do not round like the NUMERIC ones
+RELATIVE_TOLERANCE = 1e-9
+
+
+def _less(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return (x < y) & ~np.isclose(x, y, rtol=RELATIVE_TOLERANCE, atol=0)
+
+
+# group the rows by the given key columns - returns the keys of every group (sorted by the keys, the first column first)
+# and the group of every row, like np.unique(axis=1) but with one lexsort instead of comparing whole rows
+def _group_by(*keys: np.ndarray) -> Tuple[List[np.ndarray], np.ndarray]:
+    order = np.lexsort(keys[::-1])
+    starts = np.ones(len(order), dtype=np.bool_)
+    for key in keys:
+        sorted_key = key[order]
+        starts[1:] &= sorted_key[1:] == sorted_key[:-1]
+    starts = ~starts
+    starts[:1] = True
+    group = np.empty(len(order), dtype=np.int64)
+    group[order] = np.cumsum(starts) - 1
+    return [key[order][starts] for key in keys], group
+
+
+class _Columns:
+    # the column arrays of one snapshot, every table sorted by its primary key
+    def __init__(self, conn: Connector.DBConnector):
+        self.rows = {}
+        for table, columns in _TABLE_COLUMNS.items():
+            # decoded from a binary COPY, no Python object per value
+            arrays = conn.fetch_arrays(f'SELECT {", ".join(columns)} FROM {table} ORDER BY {columns[0]}, {columns[1]}')
+            self.rows[table] = len(arrays[columns[0].lower()])
+            for column in columns:
+                setattr(self, f'{table}_{column}'.lower(), arrays[column.lower()].astype(_COLUMN_TYPES[column]))
+
+        # the position of every order (and its reservation) in the Orders arrays
+        self.details_order = np.searchsorted(self.orders_order_id, self.order_details_order_id)
+        self.reservations_order = np.searchsorted(self.orders_order_id, self.reservations_order_id)
+        # the price of the dishes of every order (NULL - without details - counts as 0)
+        self.orders_dishes_price = np.bincount(self.details_order, minlength=len(self.orders_order_id),
+                                               weights=self.order_details_dish_price * self.order_details_dish_amount)
+        self.orders_has_details = np.bincount(self.details_order, minlength=len(self.orders_order_id)) > 0
+        self.orders_year = self.orders_date.astype('datetime64[Y]').astype(np.int64) + 1970
+        self.orders_month = self.orders_date.astype('datetime64[M]').astype(np.int64) % 12 + 1
+
+
+class ColumnarSnapshot:
+    """
+    Analytics mode - the aggregations of the Basic / Advanced API answered from a copy of the tables in NumPy column
+    arrays (integer ids, float prices), with vectorized group-by kernels instead of queries on the primary.
+    The copy is taken in one read only transaction (so it is consistent, and may come from a replica) and is
+    refreshed on the first call after it is older than max_age seconds. The calls in between see the tables as they
+    were when it was taken, see age() / stats() for how stale it is.
+    The prices are floats, so a sum may differ from the NUMERIC one in its last digits, and averages that are
+    equal up to RELATIVE_TOLERANCE are taken as ties.
+    """
+
+    def __init__(self, max_age: float = 60.0):
+        self.enabled = False
+        self.max_age = max_age
+        self.__lock = threading.Lock()
+        self.__columns = None
+        self.__taken_at = None
+        self.__refreshes = 0
+        self.__refresh_seconds = 0.0
+        self.__calls = 0
+
+    # serve the decorated functions from the snapshot, refreshing it once it is older than max_age seconds
+    def enable(self, max_age: Optional[float] = None):
+        if max_age is not None:
+            self.max_age = max_age
+        self.enabled = True
+
+    # back to the queries, the snapshot is dropped
+    def disable(self):
+        self.enabled = False
+        with self.__lock:
+            self.__columns = None
+            self.__taken_at = None
+
+    # take a new snapshot of the tables now
+    def refresh(self):
+        started = time.monotonic()
+        conn = Connector.DBConnector(read_only=True)
+        try:
+            conn.set_read_only_snapshot()
+            columns = _Columns(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        with self.__lock:
+            self.__columns = columns
+            self.__taken_at = started
+            self.__refreshes += 1
+            self.__refresh_seconds += time.monotonic() - started
+
+    # seconds since the snapshot was taken, None before the first one
+    def age(self) -> Optional[float]:
+        with self.__lock:
+            return None if self.__taken_at is None else time.monotonic() - self.__taken_at
+
+    def stats(self) -> dict:
+        age = self.age()
+        with self.__lock:
+            return {
+                'enabled': self.enabled,
+                'age': age,
+                'stale': age is None or age > self.max_age,
+                'rows': dict(self.__columns.rows) if self.__columns is not None else {},
+                'refreshes': self.__refreshes,
+                'refresh_seconds': self.__refresh_seconds,
+                'calls': self.__calls,
+            }
+
+    # decorator - while enabled, the function is answered by the kernel of the same name
+    # the snapshot is of one database, on a sharded database the function runs its queries on the shards
+    def serves(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or Connector.DBConnector.shard_count():
+                return func(*args, **kwargs)
+            return getattr(self, func.__name__)(*args, **kwargs)
+        return wrapper
+
+    def __current(self) -> _Columns:
+        age = self.age()
+        if age is None or age > self.max_age:
+            self.refresh()
+        with self.__lock:
+            self.__calls += 1
+            return self.__columns
+
+    # Kernels, the same results as the functions of the same name in Solution
+
+    def get_customers_spent_max_avg_amount_money(self) -> List[int]:
+        c = self.__current()
+        if len(c.reservations_cust_id) == 0:
+            return []
+        totals = c.orders_dishes_price[c.reservations_order] + c.orders_delivery_fee[c.reservations_order]
+        customers, customer_index = np.unique(c.reservations_cust_id, return_inverse=True)
+        averages = np.bincount(customer_index, weights=totals) / np.bincount(customer_index)
+        top = ~_less(averages, averages.max())
+        return customers[top].tolist()
+
+    def get_most_ordered_dish_in_period(self, start: datetime, end: datetime) -> Dish:
+        c = self.__current()
+        if start is None or end is None:
+            return BadDish()
+        order_dates = c.orders_date[c.details_order]
+        in_period = (order_dates >= np.datetime64(start)) & (order_dates <= np.datetime64(end))
+        if not in_period.any():
+            return BadDish()
+        dishes, dish_index = np.unique(c.order_details_dish_id[in_period], return_inverse=True)
+        amounts = np.bincount(dish_index, weights=c.order_details_dish_amount[in_period])
+        # argmax takes the first of the ties, the lowest dish_id
+        dish_id = dishes[np.argmax(amounts)]
+        row = np.searchsorted(c.dishes_dish_id, dish_id)
+        return Dish(int(dish_id), c.dishes_name[row], float(c.dishes_price[row]), bool(c.dishes_is_active[row]))
+
+    def get_non_worth_price_increase(self) -> List[int]:
+        c = self.__current()
+        if len(c.order_details_dish_id) == 0:
+            return []
+        # Avg_Profit_Per_Order - a group per (dish, price), sorted by dish
+        (group_dish, group_price), group_index = _group_by(c.order_details_dish_id, c.order_details_dish_price)
+        group_value = np.bincount(group_index, weights=c.order_details_dish_amount) / np.bincount(group_index) * group_price
+
+        # the group of every active dish at its current price
+        dish_row = np.searchsorted(c.dishes_dish_id, group_dish)
+        current = c.dishes_is_active[dish_row] & (c.dishes_price[dish_row] == group_price)
+        current_dishes = group_dish[current]
+        if len(current_dishes) == 0:
+            return []
+        # every group against the current group of its dish (a dish has at most one)
+        current_row = np.minimum(np.searchsorted(current_dishes, group_dish), len(current_dishes) - 1)
+        has_current = current_dishes[current_row] == group_dish
+        cheaper_and_better = has_current & (group_price < group_price[current][current_row]) & \
+            _less(group_value[current][current_row], group_value)
+        return np.sort(group_dish[cheaper_and_better]).tolist()
+
+    def get_cumulative_profit_per_month(self, year: int) -> List[Tuple[int, float]]:
+        c = self.__current()
+        profits = np.zeros(13)
+        if year is not None:
+            # Monthly_Profit_View - a group per (month, delivery fee), the fee is added once to a group with details
+            selected = (c.orders_year == year) & c.orders_has_details
+            months = c.orders_month[selected]
+            profits += np.bincount(months, weights=c.orders_dishes_price[selected], minlength=13)
+            (group_month, group_fee), _ = _group_by(months, c.orders_delivery_fee[selected])
+            profits += np.bincount(group_month, weights=group_fee, minlength=13)
+        cumulative = np.cumsum(profits[1:])
+        return [(month, float(cumulative[month - 1])) for month in range(12, 0, -1)]
@@ -1,9 +1,21 @@
 import psycopg2
-from psycopg2 import errors, sql
+from psycopg2 import sql
 from configparser import ConfigParser
 from Utility.Exceptions import DatabaseException
+import Utility.BinaryCopy as BinaryCopy
+import Utility.TableRenderer as TableRenderer
+from Utility.QueryLog import QueryLog
+import numpy as np
+import io
+import itertools
 import os
-from typing import Union
+import re
+import select
+import sys
+import uuid
+import time
+import threading
+from typing import Callable, Dict, Union, Optional, List, TextIO, Tuple
 
 
 class ResultSetDict(dict):
@@ -28,15 +40,14 @@ class ResultSet:
 
     # so you can use print(ResultSet)
     def __str__(self):
-        string = ""
-        for col in self.cols_header:
-            string += str(col) + "   "
-        string += '\n'
-        for row in self.rows:
-            for val in row:
-                string += str(val) + "   "
-            string += '\n'
-        return string
+        string = io.StringIO()
+        self.render(string)
+        return string.getvalue()
+
+    # writes the rows to the stream as they are formatted, see TableRenderer.render
+    def render(self, stream: TextIO, format: str = 'table', limit: Optional[int] = None,
+               max_width: Optional[int] = None) -> int:
+        return TableRenderer.render(self.cols_header, self.rows, stream, format, limit, max_width)
 
     def __iter__(self):
         for row in range(len(self.rows)):
@@ -71,18 +82,44 @@ class ResultSet:
 
 
 class DBConnector:
+    # size of the chunks streamed through COPY ... TO/FROM STDOUT
+    COPY_BUFFER_SIZE = 1 << 20
+    # rows fetched from the server side cursor of dump at a time
+    DUMP_FETCH_ROWS = 2000
+    # statistics by fingerprint and the slow query log of every execute, see QueryLog
+    QUERY_LOG = QueryLog()
+    # seconds to wait for a replica before falling back to the next one / the primary
+    REPLICA_CONNECT_TIMEOUT = 2
+    # the command tags (cursor.statusmessage) of the statements that write only through the functions they call
+    READ_COMMANDS = {'SELECT', 'SHOW', 'EXPLAIN'}
+
+    # Routing between the primary, the read replicas and the shards.
+    # A target is either a dict of connection parameters (like a database.ini section) or a DSN string.
+    # It is loaded from database.ini on first use ([postgresql] is the primary, every [postgresql_replica*]
+    # section is a replica, every [postgresql_shard*] section is a shard, numbered in the order of their names,
+    # [routing] read_your_writes = <seconds>) or set with configure_routing.
+    __routing = None
+    __routing_lock = threading.Lock()
+
     # constructor
-    def __init__(self):
+    # read_only connections go to a replica when one is configured and reachable, and to the primary otherwise.
+    # a connection to a shard (its number, see shard_count) goes to that shard, which has no replicas
+    def __init__(self, read_only: bool = False, shard: Optional[int] = None):
+        self.read_only = read_only
+        self.shard = shard
+        # the open transaction ran a statement that writes / a read that may have written (see commit)
+        self.__wrote = False
+        self.__read = False
+        # the connection went to a replica, which may not have applied the latest writes yet
+        self.on_replica = False
         try:
-            # Obtain the configuration parameters
-            params = DBConnector.__config()
-            self.connection = psycopg2.connect(**params)
+            self.connection, self.on_replica = DBConnector.__connect(read_only, shard)
             self.connection.autocommit = False
             self.cursor = self.connection.cursor()
         except Exception as e:
             self.connection = None
             self.cursor = None
-            raise DatabaseException.ConnectionInvalid("Could not connect to database")
+            raise DatabaseException.ConnectionInvalid("Could not connect to database", '08001')
 
     # close connection
     def close(self):
@@ -92,57 +129,330 @@ class DBConnector:
             self.connection.close()
 
     # commit connection's changes
+    # a commit that wrote starts the read your writes window, during which the reads go to the primary
     def commit(self):
         if self.connection is not None:
+            wrote = self.__wrote or (self.__read and self.__transaction_wrote())
+            self.__wrote = self.__read = False
             try:
                 self.connection.commit()
             except Exception:
-                raise DatabaseException.ConnectionInvalid("Could not commit changes")
+                # the connection may be gone after the server got the commit, so its outcome is unknown
+                raise DatabaseException.ConnectionInvalid("Could not commit changes", '08007')
+            if wrote:
+                routing = DBConnector.__routing_state()
+                with DBConnector.__routing_lock:
+                    routing['last_write'] = time.monotonic()
 
     # rollback connection's changes
     def rollback(self):
         if self.connection is not None:
+            self.__wrote = self.__read = False
             try:
                 self.connection.rollback()
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not rollback changes")
 
+    # the statement just run writes (or, for a read, may have written through a function it called)
+    def __track_write(self):
+        if self.read_only:
+            return
+        command = (self.cursor.statusmessage or '').split(' ', 1)[0].upper()
+        if command in DBConnector.READ_COMMANDS:
+            self.__read = True
+        else:
+            self.__wrote = True
+
+    # did the reads of the open transaction write - it has a transaction id only if they did.
+    # asked only when there are replicas to keep the reads away from
+    def __transaction_wrote(self) -> bool:
+        routing = DBConnector.__routing_state()
+        if not routing['replicas'] or routing['read_your_writes'] <= 0:
+            return False
+        try:
+            self.cursor.execute('SELECT txid_current_if_assigned() IS NOT NULL')
+            return self.cursor.fetchone()[0]
+        except psycopg2.Error:
+            return True
+
+    # run the rest of the connection's transactions as one consistent read-only snapshot
+    def set_read_only_snapshot(self):
+        if self.connection is not None:
+            self.connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+
     # executes the query, if it is SELECT you may ask to print the results with printSchema
     # returns the number of rows effected and a ResultSet (for SELECT)
-    def execute(self, query: Union[str, sql.Composed], printSchema=False) -> (int, ResultSet):
+    # pass commit=False to keep the transaction open for the following statements
+    def execute(self, query: Union[str, sql.Composed], printSchema=False, commit=True) -> (int, ResultSet):
         if self.connection is None:
-            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
 
         # try to execute the query
+        started = time.perf_counter()
         try:
             self.cursor.execute(query)
             row_effected = max(self.cursor.rowcount, 0)
-            self.commit()
-        except errors.lookup("23502"):
-            raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
-        except errors.lookup("23503"):
-            raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
-        except errors.lookup("23505"):
-            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
-        except errors.lookup("23514"):
-            raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
-
-        # get entries in case of SELECT
-        if self.cursor.description is not None:
-            entries = ResultSet(self.cursor.description, self.cursor.fetchall())
-        else:
-            entries = ResultSet()
+            query_text = self.__query_text(query)
+            # get entries in case of SELECT (before the commit, which may run a query of its own)
+            if self.cursor.description is not None:
+                entries = ResultSet(self.cursor.description, self.cursor.fetchall())
+            else:
+                entries = ResultSet()
+            self.__track_write()
+            if commit:
+                self.commit()
+        except psycopg2.Error as e:
+            DBConnector.QUERY_LOG.record(self.__query_text(query), time.perf_counter() - started, e)
+            DBConnector.__raise_database_exception(e)
+        DBConnector.QUERY_LOG.record(query_text, time.perf_counter() - started)
 
         # print SELECT entries
         if printSchema:
-            print(entries)
+            entries.render(sys.stdout)
 
         return row_effected, entries
 
+    # writes the rows of the SELECT query to the stream (stdout by default) as they arrive from the server,
+    # through a server side cursor, so a dump of a big table neither waits for nor holds the whole result.
+    # see TableRenderer.render for the formats / limit / max_width
+    # returns the number of rows written
+    def dump(self, query: Union[str, sql.Composed], stream: Optional[TextIO] = None, format: str = 'table',
+             limit: Optional[int] = None, max_width: Optional[int] = None, commit=True) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
+
+        cursor = self.connection.cursor(name=f'dump_{uuid.uuid4().hex}')
+        cursor.itersize = DBConnector.DUMP_FETCH_ROWS
+        try:
+            cursor.execute(query)
+            # the description of a server side cursor is known once the first rows are fetched
+            first = cursor.fetchmany(DBConnector.DUMP_FETCH_ROWS)
+            header = [column.name for column in cursor.description]
+            written = TableRenderer.render(header, itertools.chain(first, cursor), stream or sys.stdout, format,
+                                           limit, max_width)
+            cursor.close()
+            if commit:
+                self.commit()
+        except psycopg2.Error as e:
+            DBConnector.__raise_database_exception(e)
+        return written
+
+    # the text of the query as it was sent
+    def __query_text(self, query: Union[str, sql.Composed]) -> str:
+        if self.cursor.query is not None:
+            return self.cursor.query.decode(errors='replace')
+        return query if isinstance(query, str) else query.as_string(self.connection)
+
+    # streams a COPY ... TO STDOUT / FROM STDIN statement to or from a file-like object chunk by chunk,
+    # so the client memory stays constant no matter how big the table is.
+    # the transaction is left open, commit when the whole batch of COPYs is done
+    # returns the number of rows copied
+    def copy(self, statement: Union[str, sql.Composed], stream) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
+
+        try:
+            self.cursor.copy_expert(statement, stream, size=DBConnector.COPY_BUFFER_SIZE)
+        except psycopg2.Error as e:
+            DBConnector.__raise_database_exception(e)
+        text = statement if isinstance(statement, str) else statement.as_string(self.connection)
+        if not self.read_only and 'FROM STDIN' in text.upper():
+            self.__wrote = True
+        return max(self.cursor.rowcount, 0)
+
+    # runs the SELECT query as a binary COPY and decodes it straight into NumPy arrays (see BinaryCopy),
+    # handing on_chunk every chunk of chunk_rows rows as {column name: array}, so only one chunk is held at a time.
+    # INTEGER columns are int64 arrays, NUMERIC / REAL are float64, TIMESTAMP is datetime64[us], BOOLEAN is bool
+    # and any other type is decoded as text into an object array.
+    # the transaction is left open, like copy
+    # returns the number of rows
+    def stream_arrays(self, query: Union[str, sql.Composed], on_chunk: Callable[[Dict[str, np.ndarray]], None],
+                      chunk_rows: int = BinaryCopy.CHUNK_ROWS) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
+
+        try:
+            if not isinstance(query, str):
+                query = query.as_string(self.connection)
+            query = query.strip().rstrip(';')
+            # the column types, without running the query
+            self.cursor.execute(f'SELECT * FROM ({query}) Binary_Copy LIMIT 0')
+            statement, names, kinds = BinaryCopy.copy_statement(query, self.cursor.description)
+            decoder = BinaryCopy.ArrayDecoder(names, kinds, on_chunk, chunk_rows, DBConnector.COPY_BUFFER_SIZE)
+            self.cursor.copy_expert(statement, decoder, size=DBConnector.COPY_BUFFER_SIZE)
+        except psycopg2.Error as e:
+            DBConnector.__raise_database_exception(e)
+        return decoder.finish()
+
+    # the whole result of the SELECT query as {column name: array}, see stream_arrays
+    def fetch_arrays(self, query: Union[str, sql.Composed]) -> Dict[str, np.ndarray]:
+        chunks = []
+        self.stream_arrays(query, chunks.append)
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+    # subscribes the connection to the NOTIFY messages of the channel, the connection is switched to autocommit
+    # so it does not hold a transaction open while it waits
+    def listen(self, channel: str):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
+
+        try:
+            self.connection.autocommit = True
+            self.cursor.execute(sql.SQL('LISTEN {channel}').format(channel=sql.Identifier(channel)))
+        except psycopg2.Error as e:
+            DBConnector.__raise_database_exception(e)
+
+    # waits up to timeout seconds for notifications on the listened channels
+    # returns the (sender backend pid, payload) of every notification that arrived, an empty list on timeout
+    def notifications(self, timeout: float) -> List[Tuple[int, str]]:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid", '08003')
+
+        try:
+            if not self.connection.notifies:
+                select.select([self.connection], [], [], timeout)
+            self.connection.poll()
+        except psycopg2.Error as e:
+            DBConnector.__raise_database_exception(e)
+        except OSError as e:
+            # the socket is gone
+            raise DatabaseException.ConnectionInvalid(str(e), '08006')
+        arrived = [(notify.pid, notify.payload) for notify in self.connection.notifies]
+        self.connection.notifies.clear()
+        return arrived
+
+    # the exceptions of the SQLSTATEs the callers tell apart, anything else is an UNKNOWN_ERROR
+    SQLSTATE_EXCEPTIONS = {
+        '23502': DatabaseException.NOT_NULL_VIOLATION,
+        '23503': DatabaseException.FOREIGN_KEY_VIOLATION,
+        '23505': DatabaseException.UNIQUE_VIOLATION,
+        '23514': DatabaseException.CHECK_VIOLATION,
+        '40001': DatabaseException.SERIALIZATION_FAILURE,
+        '40P01': DatabaseException.DEADLOCK_DETECTED,
+    }
+
+    # our exception for an error known by its SQLSTATE (e.g. one reported as data by a server side function)
+    @staticmethod
+    def exception_for(code: Optional[str], message: str) -> Exception:
+        exception = DBConnector.SQLSTATE_EXCEPTIONS.get(code)
+        if exception is not None:
+            return exception(exception.__name__, code)
+        # connection problems (class 08, server shutdown)
+        if code is not None and (code.startswith('08') or code.startswith('57P')):
+            return DatabaseException.ConnectionInvalid(message, code)
+        return DatabaseException.UNKNOWN_ERROR(message, code)
+
+    # translate the database errors to our exceptions, keeping their SQLSTATE
+    @staticmethod
+    def __raise_database_exception(e: psycopg2.Error):
+        code = e.pgcode
+        # a connection dropped without an error from the server
+        if (code is None and isinstance(e, psycopg2.OperationalError)) or isinstance(e, psycopg2.InterfaceError):
+            raise DatabaseException.ConnectionInvalid(str(e).strip(), code or '08006')
+        raise DBConnector.exception_for(code, str(e).strip())
+
+    # set the connection targets, anything left as None keeps its current setting (from database.ini until it is set)
+    # read_your_writes - for that many seconds after a write of this process, reads go to the primary as well,
+    #                    so a caller always sees its own writes even when the replicas lag behind
+    @staticmethod
+    def configure_routing(primary: Union[dict, str, None] = None, replicas: Optional[List[Union[dict, str]]] = None,
+                          read_your_writes: Optional[float] = None, shards: Optional[List[Union[dict, str]]] = None):
+        with DBConnector.__routing_lock:
+            if DBConnector.__routing is None:
+                DBConnector.__routing = DBConnector.__load_routing()
+            if primary is not None:
+                DBConnector.__routing['primary'] = primary
+            if replicas is not None:
+                DBConnector.__routing['replicas'] = list(replicas)
+            if shards is not None:
+                DBConnector.__routing['shards'] = list(shards)
+            if read_your_writes is not None:
+                DBConnector.__routing['read_your_writes'] = read_your_writes
+
+    # forget the configured routing, the next connection reads database.ini again
+    @staticmethod
+    def reset_routing():
+        with DBConnector.__routing_lock:
+            DBConnector.__routing = None
+
+    # seconds since the last write of this process, None before the first one
+    @staticmethod
+    def since_last_write() -> Optional[float]:
+        routing = DBConnector.__routing_state()
+        with DBConnector.__routing_lock:
+            last_write = routing['last_write']
+        return None if last_write is None else time.monotonic() - last_write
+
+    # the number of shards, 0 when the database is not sharded
+    @staticmethod
+    def shard_count() -> int:
+        return len(DBConnector.__routing_state()['shards'])
+
+    @staticmethod
+    def __routing_state() -> dict:
+        with DBConnector.__routing_lock:
+            if DBConnector.__routing is None:
+                DBConnector.__routing = DBConnector.__load_routing()
+            return DBConnector.__routing
+
+    @staticmethod
+    def __load_routing() -> dict:
+        replicas = [DBConnector.__config(section=section) for section in DBConnector.__sections('postgresql_replica')]
+        shards = [DBConnector.__config(section=section) for section in DBConnector.__sections('postgresql_shard')]
+        routing = DBConnector.__config(section='routing', required=False)
+        return {
+            'primary': DBConnector.__config(),
+            'replicas': replicas,
+            'shards': shards,
+            'read_your_writes': float(routing.get('read_your_writes', 0)),
+            'last_write': None,
+            'next_replica': 0,
+        }
+
+    @staticmethod
+    def __connect(read_only: bool, shard: Optional[int]):
+        routing = DBConnector.__routing_state()
+        if shard is not None:
+            return DBConnector.__open(routing['shards'][shard]), False
+        if read_only and routing['replicas'] and not DBConnector.__in_read_your_writes_window(routing):
+            # round robin between the replicas, skipping the ones that can not be reached
+            with DBConnector.__routing_lock:
+                start = routing['next_replica']
+                routing['next_replica'] = (start + 1) % len(routing['replicas'])
+            for i in range(len(routing['replicas'])):
+                replica = routing['replicas'][(start + i) % len(routing['replicas'])]
+                try:
+                    connection = DBConnector.__open(replica, connect_timeout=DBConnector.REPLICA_CONNECT_TIMEOUT)
+                    connection.set_session(readonly=True)
+                    return connection, True
+                except psycopg2.Error:
+                    continue
+        return DBConnector.__open(routing['primary']), False
+
+    @staticmethod
+    def __in_read_your_writes_window(routing: dict) -> bool:
+        last_write = routing['last_write']
+        return last_write is not None and time.monotonic() - last_write < routing['read_your_writes']
+
+    @staticmethod
+    def __open(target: Union[dict, str], **kwargs):
+        if isinstance(target, str):
+            return psycopg2.connect(target, **kwargs)
+        return psycopg2.connect(**target, **kwargs)
+
+    # names of the sections of database.ini that start with prefix, in their natural order (shard_2 before shard_10)
+    @staticmethod
+    def __sections(prefix: str) -> List[str]:
+        parser = ConfigParser()
+        parser.read([os.path.join(os.getcwd(), 'Utility', 'database.ini'),
+                     os.path.join(os.path.dirname(os.getcwd()), 'Utility', 'database.ini')])
+        return sorted((section for section in parser.sections() if section.startswith(prefix)),
+                      key=lambda section: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', section)])
+
     # grant credentials
     @staticmethod
     def __config(filename=os.path.join(os.path.join(os.getcwd(), "Utility"), 'database.ini'),
-                 section='postgresql'):
+                 section='postgresql', required=True):
         # create a parser
         parser = ConfigParser()
         # read config file
@@ -154,10 +464,14 @@ class DBConnector:
             params = parser.items(section)
             for param in params:
                 db[param[0]] = param[1]
+        elif not required:
+            # optional section
+            return db
         else:
             # file not found
             db = DBConnector.__config(
-                filename=os.path.join(os.path.join(os.path.dirname(os.getcwd()), 'Utility'), 'database.ini'))
+                filename=os.path.join(os.path.join(os.path.dirname(os.getcwd()), 'Utility'), 'database.ini'),
+                section=section)
             if db is None:
                 raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
         return db
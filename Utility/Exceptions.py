@@ -1,6 +1,8 @@
 class _Exceptions(Exception):
-    def __init__(self, message):
+    # code - the SQLSTATE behind the exception, when there is one
+    def __init__(self, message, code=None):
         self.message = message
+        self.code = code
 
     def __str__(self):
         return self.message
@@ -28,3 +30,12 @@ class DatabaseException(_Exceptions):
 
     class UNKNOWN_ERROR(_Exceptions):
         pass
+
+    class SERIALIZATION_FAILURE(_Exceptions):
+        pass
+
+    class DEADLOCK_DETECTED(_Exceptions):
+        pass
+
+    class ADMISSION_REJECTED(_Exceptions):
+        pass
@@ -0,0 +1,166 @@
+import heapq
+import math
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+# Streaming top-k (heavy hitters) with bounded memory.
+# SpaceSaving (Metwally, Agrawal, El Abbadi 2005) keeps at most capacity counters for a stream of total weight N.
+# Every counter holds (count, error) with count - error <= true weight <= count and error <= N / capacity,
+# and every item heavier than N / capacity has a counter. SlidingHeavyHitters keeps one SpaceSaving per time bucket,
+# a window is answered by merging its buckets, which keeps the same bound for the N of the window.
+
+
+class SpaceSaving:
+    """
+    The heavy hitters of one stream, in at most capacity counters.
+    When a new item arrives and all the counters are taken, it takes the counter of the lightest item,
+    with that item's count as its error.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.capacity = capacity
+        self.total = 0
+        # item -> [count, error]
+        self.__counters: Dict[Hashable, list] = {}
+        # (count, item) of every counter, and stale entries of counts that grew since - the lightest is found lazily
+        self.__heap = []
+
+    def add(self, item: Hashable, weight: int = 1):
+        if weight <= 0:
+            return
+        self.total += weight
+        counter = self.__counters.get(item)
+        if counter is None:
+            if len(self.__counters) < self.capacity:
+                counter = self.__counters[item] = [0, 0]
+            else:
+                lightest = self.__pop_lightest()
+                lightest_count = self.__counters.pop(lightest)[0]
+                counter = self.__counters[item] = [lightest_count, lightest_count]
+        counter[0] += weight
+        heapq.heappush(self.__heap, (counter[0], item))
+        if len(self.__heap) > 4 * self.capacity:
+            self.__heap = [(count, key) for key, (count, _) in self.__counters.items()]
+            heapq.heapify(self.__heap)
+
+    def __pop_lightest(self) -> Hashable:
+        while True:
+            count, item = heapq.heappop(self.__heap)
+            counter = self.__counters.get(item)
+            if counter is not None and counter[0] == count:
+                return item
+
+    # the count every item that has no counter is below (0 while there are free counters)
+    def floor(self) -> int:
+        if len(self.__counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.__counters.values())
+
+    def counters(self) -> Dict[Hashable, Tuple[int, int]]:
+        return {item: (count, error) for item, (count, error) in self.__counters.items()}
+
+    def __len__(self) -> int:
+        return len(self.__counters)
+
+
+def merge_counters(summaries: List[SpaceSaving]) -> Dict[Hashable, Tuple[int, int]]:
+    """
+    The (count, error) of every item of the summaries, as one summary of their streams together.
+    An item missing from a full summary may have weighed up to that summary's floor in it, so the floor is added
+    to its count and its error. The error of an item stays below the sum of the total / capacity of the summaries.
+    """
+    floors = [summary.floor() for summary in summaries]
+    all_counters = [summary.counters() for summary in summaries]
+    merged = {}
+    for counters in all_counters:
+        for item in counters:
+            if item in merged:
+                continue
+            count = error = 0
+            for floor, other in zip(floors, all_counters):
+                item_count, item_error = other.get(item, (floor, floor))
+                count += item_count
+                error += item_error
+            merged[item] = (count, error)
+    return merged
+
+
+class SlidingHeavyHitters:
+    """
+    The heavy hitters of the last window seconds (up to max_window) of a stream, e.g. the dishes ordered the most
+    in the last 15 minutes.
+    The stream is cut into buckets of bucket_seconds, each with a SpaceSaving of capacity counters, so the memory is
+    at most max_window / bucket_seconds * capacity counters whatever the rate of the stream.
+    A window covers the buckets that started in it - up to bucket_seconds of its oldest part are left out.
+    For the total weight N of the window, the count top returns for an item is at most N / capacity above its true
+    weight and never below it, and every item heavier than N / capacity is among the returned ones.
+    """
+
+    def __init__(self, capacity: int = 256, bucket_seconds: float = 60.0, max_window: float = 3600.0,
+                 clock: Callable[[], float] = time.time):
+        if bucket_seconds <= 0 or max_window < bucket_seconds:
+            raise ValueError('bucket_seconds must be positive and at most max_window')
+        self.capacity = capacity
+        self.bucket_seconds = bucket_seconds
+        self.max_window = max_window
+        self.clock = clock
+        self.__lock = threading.Lock()
+        # bucket number -> SpaceSaving, oldest first
+        self.__buckets: Dict[int, SpaceSaving] = {}
+
+    def add(self, item: Hashable, weight: int = 1):
+        bucket = int(self.clock() // self.bucket_seconds)
+        with self.__lock:
+            summary = self.__buckets.get(bucket)
+            if summary is None:
+                self.__expire(bucket)
+                summary = self.__buckets[bucket] = SpaceSaving(self.capacity)
+            summary.add(item, weight)
+
+    def __expire(self, current: int):
+        oldest = current - int(self.max_window // self.bucket_seconds) + 1
+        for bucket in [bucket for bucket in self.__buckets if bucket < oldest]:
+            del self.__buckets[bucket]
+
+    def top(self, k: Optional[int] = None, window: Optional[float] = None) -> List[Tuple[Hashable, int, int]]:
+        """
+        :param k: How many items, None for all the counted ones.
+        :param window: The seconds back from now, max_window by default.
+        :return: (item, count, error) of the heaviest items of the window, by descending count then item -
+                 the true weight of an item is between count - error and count.
+        """
+        oldest, current = self.__window_buckets(window)
+        with self.__lock:
+            self.__expire(current)
+            summaries = [summary for bucket, summary in self.__buckets.items() if oldest <= bucket <= current]
+            merged = merge_counters(summaries)
+        ranked = sorted(((item, count, error) for item, (count, error) in merged.items()),
+                        key=lambda entry: (-entry[1], entry[0]))
+        return ranked if k is None else ranked[:k]
+
+    # the total weight of the window, the error bound of top is total / capacity
+    def total(self, window: Optional[float] = None) -> int:
+        oldest, current = self.__window_buckets(window)
+        with self.__lock:
+            return sum(summary.total for bucket, summary in self.__buckets.items() if oldest <= bucket <= current)
+
+    # the first and the last bucket of the window - the first is the oldest that started in it
+    def __window_buckets(self, window: Optional[float]) -> Tuple[int, int]:
+        window = self.max_window if window is None else min(window, self.max_window)
+        now = self.clock()
+        return math.ceil((now - window) / self.bucket_seconds), int(now // self.bucket_seconds)
+
+    def clear(self):
+        with self.__lock:
+            self.__buckets.clear()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'buckets': len(self.__buckets),
+                'counters': sum(len(summary) for summary in self.__buckets.values()),
+                'max_counters': int(self.max_window // self.bucket_seconds) * self.capacity,
+            }
@@ -0,0 +1,599 @@
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal, localcontext, ROUND_HALF_UP
+from typing import List, Tuple, Optional
+from Utility.Backend import Backend, PAGE_SIZE, MENU_SYNC_COUNTS, DELETE_BATCH_SIZE
+from Utility.ReturnValue import ReturnValue
+from Business.Customer import Customer, BadCustomer
+from Business.Order import Order, BadOrder
+from Business.Dish import Dish, BadDish
+from Business.OrderDish import OrderDish
+
+
+# A DECIMAL value the way PostgreSQL reads the literal psycopg2 sends for it
+def _numeric(value) -> Decimal:
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def _numeric_scale(value: Decimal) -> int:
+    return max(0, -value.as_tuple().exponent)
+
+
+# x / y with the result scale PostgreSQL picks for NUMERIC division (select_div_scale), rounded half away from zero.
+# AVG over INTEGER / DECIMAL is a NUMERIC division of the sum by the count, the rounding decides ties and comparisons.
+def _numeric_div(x: Decimal, y: Decimal) -> Decimal:
+    def weight_and_first_digit(value: Decimal) -> Tuple[int, int]:
+        # the position and value of the leading base 10000 digit
+        if value == 0:
+            return 0, 0
+        value = abs(value)
+        weight = value.adjusted() // 4
+        return weight, int(value.scaleb(-4 * weight))
+
+    weight1, first_digit1 = weight_and_first_digit(x)
+    weight2, first_digit2 = weight_and_first_digit(y)
+    quotient_weight = weight1 - weight2 - (1 if first_digit1 <= first_digit2 else 0)
+    scale = max(16 - quotient_weight * 4, _numeric_scale(x), _numeric_scale(y), 0)
+    scale = min(scale, 1000)
+    with localcontext() as context:
+        context.prec = 2100
+        return (x / y).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+
+
+# TIMESTAMP(0) keeps whole seconds, rounding the fraction half up
+def _timestamp(value: datetime) -> datetime:
+    rounded = value.replace(microsecond=0)
+    if value.microsecond >= 500000:
+        rounded += timedelta(seconds=1)
+    return rounded
+
+
+class _Tables:
+    def __init__(self):
+        # Customers: cust_id -> (full_name, age, phone)
+        self.customers = {}
+        # Orders: order_id -> (date, delivery_fee, delivery_address)
+        self.orders = {}
+        # Dishes: dish_id -> [name, price, is_active]
+        self.dishes = {}
+        # Reservations: order_id -> cust_id, and the hash index cust_id -> {order_id}
+        self.reservations = {}
+        self.orders_by_customer = {}
+        # Order_Details: order_id -> {dish_id: (amount, price)} in insertion order
+        self.details = {}
+        # Customer_Ratings: cust_id -> {dish_id: rating}, and the hash index dish_id -> {cust_id: rating}
+        self.ratings = {}
+        self.ratings_by_dish = {}
+
+
+class MemoryBackend(Backend):
+    """
+    The whole API in plain Python dictionaries (hash indexes on every primary and foreign key), for tests that do not
+    need a database server. It keeps the constraints of the tables (the CHECKs, the NOT NULLs, the uniqueness,
+    the foreign keys with their ON DELETE CASCADE) and checks them in the order PostgreSQL does, so a call that breaks
+    a few of them fails with the same ReturnValue.
+    The money columns are kept as Decimal and divided like PostgreSQL's NUMERIC, so the averages tie and compare
+    the same way.
+    Arguments are assumed to be of their declared types. A None that the PostgreSQL implementation formats into the
+    query text (instead of sending it as a literal) makes its query fail there, and the call fails the same way here.
+    """
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__tables = None
+
+    def create_tables(self) -> None:
+        with self.__lock:
+            if self.__tables is None:
+                self.__tables = _Tables()
+
+    def clear_tables(self) -> None:
+        with self.__lock:
+            if self.__tables is not None:
+                self.__tables = _Tables()
+
+    def drop_tables(self) -> None:
+        with self.__lock:
+            self.__tables = None
+
+    # CRUD API
+
+    def add_customer(self, customer: Customer) -> ReturnValue:
+        cust_id, full_name, age, phone = \
+            customer.get_cust_id(), customer.get_full_name(), customer.get_age(), customer.get_phone()
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return ReturnValue.ERROR
+            if None in (cust_id, full_name, age, phone):
+                return ReturnValue.BAD_PARAMS
+            if cust_id <= 0 or not 18 <= age <= 120 or len(phone) != 10:
+                return ReturnValue.BAD_PARAMS
+            if cust_id in tables.customers:
+                return ReturnValue.ALREADY_EXISTS
+            tables.customers[cust_id] = (full_name, age, phone)
+            return ReturnValue.OK
+
+    def get_customer(self, customer_id: int) -> Customer:
+        with self.__lock:
+            return self.__customer(customer_id)
+
+    def delete_customer(self, customer_id: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or customer_id not in tables.customers:
+                return ReturnValue.NOT_EXISTS
+            del tables.customers[customer_id]
+            for order_id in tables.orders_by_customer.pop(customer_id, set()):
+                del tables.reservations[order_id]
+            for dish_id in tables.ratings.pop(customer_id, {}):
+                del tables.ratings_by_dish[dish_id][customer_id]
+            return ReturnValue.OK
+
+    def add_order(self, order: Order) -> ReturnValue:
+        order_id, date, delivery_fee, delivery_address = \
+            order.get_order_id(), order.get_datetime(), order.get_delivery_fee(), order.get_delivery_address()
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return ReturnValue.ERROR
+            if None in (order_id, date, delivery_fee, delivery_address):
+                return ReturnValue.BAD_PARAMS
+            if order_id <= 0 or delivery_fee < 0 or len(delivery_address) < 5:
+                return ReturnValue.BAD_PARAMS
+            if order_id in tables.orders:
+                return ReturnValue.ALREADY_EXISTS
+            tables.orders[order_id] = (_timestamp(date), _numeric(delivery_fee), delivery_address)
+            return ReturnValue.OK
+
+    def get_order(self, order_id: int) -> Order:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or order_id not in tables.orders:
+                return BadOrder()
+            date, delivery_fee, delivery_address = tables.orders[order_id]
+            return Order(order_id, date, delivery_fee, delivery_address)
+
+    def delete_order(self, order_id: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or order_id not in tables.orders:
+                return ReturnValue.NOT_EXISTS
+            del tables.orders[order_id]
+            if order_id in tables.reservations:
+                tables.orders_by_customer[tables.reservations.pop(order_id)].discard(order_id)
+            tables.details.pop(order_id, None)
+            return ReturnValue.OK
+
+    def add_dish(self, dish: Dish) -> ReturnValue:
+        dish_id, name, price, is_active = dish.get_dish_id(), dish.get_name(), dish.get_price(), dish.get_is_active()
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return ReturnValue.ERROR
+            if None in (dish_id, name, price, is_active):
+                return ReturnValue.BAD_PARAMS
+            if dish_id <= 0 or len(name) < 4 or price <= 0:
+                return ReturnValue.BAD_PARAMS
+            if dish_id in tables.dishes:
+                return ReturnValue.ALREADY_EXISTS
+            tables.dishes[dish_id] = [name, _numeric(price), is_active]
+            return ReturnValue.OK
+
+    def get_dish(self, dish_id: int) -> Dish:
+        with self.__lock:
+            return self.__dish(dish_id)
+
+    def update_dish_price(self, dish_id: int, price: float) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or dish_id is None or price is None:
+                return ReturnValue.ERROR
+            dish = tables.dishes.get(dish_id)
+            # only an active dish is updated, and only an updated row is checked
+            if dish is None or not dish[2]:
+                return ReturnValue.NOT_EXISTS
+            if price <= 0:
+                return ReturnValue.BAD_PARAMS
+            dish[1] = _numeric(price)
+            return ReturnValue.OK
+
+    def update_dish_active_status(self, dish_id: int, is_active: bool) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or dish_id is None or is_active is None:
+                return ReturnValue.ERROR
+            if dish_id not in tables.dishes:
+                return ReturnValue.NOT_EXISTS
+            tables.dishes[dish_id][2] = is_active
+            return ReturnValue.OK
+
+    def customer_placed_order(self, customer_id: int, order_id: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or customer_id is None or order_id is None:
+                return ReturnValue.ERROR
+            if order_id in tables.reservations:
+                return ReturnValue.ALREADY_EXISTS
+            if order_id not in tables.orders or customer_id not in tables.customers:
+                return ReturnValue.NOT_EXISTS
+            tables.reservations[order_id] = customer_id
+            tables.orders_by_customer.setdefault(customer_id, set()).add(order_id)
+            return ReturnValue.OK
+
+    def get_customer_that_placed_order(self, order_id: int) -> Customer:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or order_id not in tables.reservations:
+                return BadCustomer()
+            return self.__customer(tables.reservations[order_id])
+
+    def order_contains_dish(self, order_id: int, dish_id: int, amount: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or None in (order_id, dish_id, amount):
+                return ReturnValue.ERROR
+            # the price is the one of the active dish, without it the NOT NULL of the price fails first
+            dish = tables.dishes.get(dish_id)
+            if dish is None or not dish[2]:
+                return ReturnValue.NOT_EXISTS
+            if amount < 0:
+                return ReturnValue.BAD_PARAMS
+            if dish_id in tables.details.get(order_id, {}):
+                return ReturnValue.ALREADY_EXISTS
+            if order_id not in tables.orders:
+                return ReturnValue.NOT_EXISTS
+            tables.details.setdefault(order_id, {})[dish_id] = (amount, dish[1])
+            return ReturnValue.OK
+
+    def order_does_not_contain_dish(self, order_id: int, dish_id: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or dish_id not in tables.details.get(order_id, {}):
+                return ReturnValue.NOT_EXISTS
+            del tables.details[order_id][dish_id]
+            return ReturnValue.OK
+
+    def get_all_order_items(self, order_id: int) -> List[OrderDish]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            return [OrderDish(dish_id, amount, price)
+                    for dish_id, (amount, price) in tables.details.get(order_id, {}).items()]
+
+    def customer_rated_dish(self, cust_id: int, dish_id: int, rating: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or None in (cust_id, dish_id, rating):
+                return ReturnValue.ERROR
+            if not 0 < rating <= 5:
+                return ReturnValue.BAD_PARAMS
+            if dish_id in tables.ratings.get(cust_id, {}):
+                return ReturnValue.ALREADY_EXISTS
+            if cust_id not in tables.customers or dish_id not in tables.dishes:
+                return ReturnValue.NOT_EXISTS
+            tables.ratings.setdefault(cust_id, {})[dish_id] = rating
+            tables.ratings_by_dish.setdefault(dish_id, {})[cust_id] = rating
+            return ReturnValue.OK
+
+    def customer_deleted_rating_on_dish(self, cust_id: int, dish_id: int) -> ReturnValue:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or dish_id not in tables.ratings.get(cust_id, {}):
+                return ReturnValue.NOT_EXISTS
+            del tables.ratings[cust_id][dish_id]
+            del tables.ratings_by_dish[dish_id][cust_id]
+            return ReturnValue.OK
+
+    def get_all_customer_ratings(self, cust_id: int) -> List[Tuple[int, int]]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            return sorted(tables.ratings.get(cust_id, {}).items())
+
+    # Basic API
+
+    def get_order_total_price(self, order_id: int) -> float:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or order_id not in tables.orders:
+                return 0.0
+            return float(self.__order_total(order_id))
+
+    def get_customers_spent_max_avg_amount_money(self) -> List[int]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            averages = {}
+            for cust_id, order_ids in tables.orders_by_customer.items():
+                if order_ids:
+                    total = sum((self.__order_total(order_id) for order_id in order_ids), Decimal(0))
+                    averages[cust_id] = _numeric_div(total, Decimal(len(order_ids)))
+            if not averages:
+                return []
+            max_average = max(averages.values())
+            return sorted(cust_id for cust_id, average in averages.items() if average == max_average)
+
+    def get_most_ordered_dish_in_period(self, start: datetime, end: datetime) -> Dish:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or start is None or end is None:
+                return BadDish()
+            amounts = {}
+            for order_id, items in tables.details.items():
+                if start <= tables.orders[order_id][0] <= end:
+                    for dish_id, (amount, _) in items.items():
+                        amounts[dish_id] = amounts.get(dish_id, 0) + amount
+            if not amounts:
+                return BadDish()
+            return self.__dish(min(amounts, key=lambda dish_id: (-amounts[dish_id], dish_id)))
+
+    def did_customer_order_top_rated_dishes(self, cust_id: int) -> bool:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return False
+            top_rated = set(self.__dishes_by_rating(descending=True)[:5])
+            return any(top_rated & set(tables.details.get(order_id, {}))
+                       for order_id in tables.orders_by_customer.get(cust_id, ()))
+
+    # Advanced API
+
+    def get_customers_rated_but_not_ordered(self) -> List[int]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            result = set()
+            for dish_id in self.__dishes_by_rating(descending=False)[:5]:
+                for cust_id, rating in tables.ratings_by_dish.get(dish_id, {}).items():
+                    if rating < 3 and dish_id not in self.__ordered_dishes(cust_id):
+                        result.add(cust_id)
+            return sorted(result)
+
+    def get_non_worth_price_increase(self) -> List[int]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            # Avg_Profit_Per_Order - the average amount of every (dish, price) times the price
+            amounts = {}
+            for items in tables.details.values():
+                for dish_id, (amount, price) in items.items():
+                    amounts.setdefault((dish_id, price), []).append(amount)
+            profits = {}
+            for (dish_id, price), dish_amounts in amounts.items():
+                average = _numeric_div(Decimal(sum(dish_amounts)), Decimal(len(dish_amounts)))
+                profits.setdefault(dish_id, []).append((price, average * price))
+
+            result = []
+            for dish_id, dish_profits in profits.items():
+                name, current_price, is_active = tables.dishes[dish_id]
+                if not is_active:
+                    continue
+                for price, profit in dish_profits:
+                    if price != current_price:
+                        continue
+                    # one row per older cheaper price that made more
+                    result += [dish_id for old_price, old_profit in dish_profits
+                               if current_price > old_price and profit < old_profit]
+            return sorted(result)
+
+    def get_cumulative_profit_per_month(self, year: int) -> List[Tuple[int, float]]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return []
+            # Monthly_Profit_View - the orders of a month are grouped by their delivery fee, and the fee is added
+            # once per group, a group without any Order_Details adds nothing
+            groups = {}
+            for order_id, (date, delivery_fee, _) in tables.orders.items():
+                if date.year != year:
+                    continue
+                items = tables.details.get(order_id, {})
+                dishes_price = sum((price * amount for amount, price in items.values()), Decimal(0)) if items else None
+                key = (date.month, delivery_fee)
+                if key not in groups or groups[key] is None:
+                    groups[key] = dishes_price
+                elif dishes_price is not None:
+                    groups[key] += dishes_price
+            profits = [Decimal(0)] * 13
+            for (month, delivery_fee), dishes_price in groups.items():
+                if dishes_price is not None:
+                    profits[month] += dishes_price + delivery_fee
+
+            result = []
+            cumulative = Decimal(0)
+            for month in range(1, 13):
+                cumulative += profits[month]
+                result.append((month, float(cumulative)))
+            return result[::-1]
+
+    def get_potential_dish_recommendations(self, cust_id: int) -> List[int]:
+        with self.__lock:
+            if self.__tables is None:
+                return []
+            return self.__recommendations(cust_id)
+
+    # Pagination API
+
+    def get_order_items_page(self, order_id: int, after_dish_id: int = 0, page_size: int = PAGE_SIZE) -> List[OrderDish]:
+        if page_size <= 0:
+            return []
+        with self.__lock:
+            tables = self.__tables
+            if tables is None or after_dish_id is None:
+                return []
+            items = sorted((dish_id, item) for dish_id, item in tables.details.get(order_id, {}).items()
+                           if dish_id > after_dish_id)
+            return [OrderDish(dish_id, amount, price) for dish_id, (amount, price) in items[:page_size]]
+
+    def get_customer_ratings_page(self, cust_id: int, after_dish_id: int = 0,
+                                  page_size: int = PAGE_SIZE) -> List[Tuple[int, int]]:
+        if page_size <= 0:
+            return []
+        with self.__lock:
+            if self.__tables is None or after_dish_id is None:
+                return []
+            return [rating for rating in self.get_all_customer_ratings(cust_id) if rating[0] > after_dish_id][:page_size]
+
+    def get_customers_rated_but_not_ordered_page(self, after_cust_id: int = 0, page_size: int = PAGE_SIZE) -> List[int]:
+        if page_size <= 0 or after_cust_id is None:
+            return []
+        return [cust_id for cust_id in self.get_customers_rated_but_not_ordered() if cust_id > after_cust_id][:page_size]
+
+    def get_potential_dish_recommendations_page(self, cust_id: int, after_dish_id: int = 0,
+                                                page_size: int = PAGE_SIZE) -> List[int]:
+        if page_size <= 0 or after_dish_id is None:
+            return []
+        return [dish_id for dish_id in self.get_potential_dish_recommendations(cust_id)
+                if dish_id > after_dish_id][:page_size]
+
+    # Bulk API
+
+    def sync_menu(self, dishes: List[Dish], deactivate_missing: bool = False) -> Tuple[ReturnValue, dict]:
+        with self.__lock:
+            tables = self.__tables
+            if tables is None:
+                return ReturnValue.ERROR, {}
+            # the catalog is checked like the staging table of the PostgreSQL implementation, before anything changes
+            catalog = {}
+            for dish in dishes:
+                dish_id, name, price, is_active = dish.get_dish_id(), dish.get_name(), dish.get_price(), dish.get_is_active()
+                if None in (dish_id, name, price, is_active) or dish_id <= 0 or len(name) < 4 or price <= 0:
+                    return ReturnValue.BAD_PARAMS, {}
+                if dish_id in catalog:
+                    return ReturnValue.BAD_PARAMS, {}
+                catalog[dish_id] = (name, _numeric(price), is_active)
+
+            summary = dict.fromkeys(MENU_SYNC_COUNTS, 0)
+            for dish_id, (name, price, is_active) in catalog.items():
+                current = tables.dishes.get(dish_id)
+                if current is None:
+                    summary['inserted'] += 1
+                    tables.dishes[dish_id] = [name, price, is_active]
+                    continue
+                # the price of a dish that is inactive after the sync is kept
+                price_changed = current[1] != price and is_active
+                summary['price_changed'] += price_changed
+                summary['renamed'] += current[0] != name
+                summary['activated'] += not current[2] and is_active
+                summary['deactivated'] += current[2] and not is_active
+                summary['unchanged'] += current[0] == name and current[2] == is_active and not price_changed
+                current[0], current[2] = name, is_active
+                if price_changed:
+                    current[1] = price
+            if deactivate_missing:
+                for dish_id, current in tables.dishes.items():
+                    if current[2] and dish_id not in catalog:
+                        summary['deactivated'] += 1
+                        current[2] = False
+            return ReturnValue.OK, summary
+
+    # the batches go in key order and hold the lock one at a time, like the transactions of the PostgreSQL implementation
+
+    def delete_customers(self, customer_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                         progress=None) -> Tuple[ReturnValue, int]:
+        return self.__delete_batches(customer_ids, batch_size, progress, self.delete_customer)
+
+    def delete_orders(self, order_ids: List[int], batch_size: int = DELETE_BATCH_SIZE,
+                      progress=None) -> Tuple[ReturnValue, int]:
+        return self.__delete_batches(order_ids, batch_size, progress, self.delete_order)
+
+    def purge_orders(self, before: datetime, batch_size: int = DELETE_BATCH_SIZE, progress=None) -> Tuple[ReturnValue, int]:
+        with self.__lock:
+            if self.__tables is None:
+                return ReturnValue.ERROR, 0
+            total = sum(1 for date, _, _ in self.__tables.orders.values() if date < before)
+        deleted = 0
+        while True:
+            with self.__lock:
+                if self.__tables is None:
+                    return ReturnValue.ERROR, deleted
+                older = sorted((date, order_id) for order_id, (date, _, _) in self.__tables.orders.items() if date < before)
+                for _, order_id in older[:batch_size]:
+                    self.delete_order(order_id)
+            batch = min(len(older), batch_size)
+            deleted += batch
+            if progress is not None and batch:
+                progress(deleted, total)
+            if batch < batch_size:
+                return ReturnValue.OK, deleted
+
+    def __delete_batches(self, keys: List[int], batch_size: int, progress, delete) -> Tuple[ReturnValue, int]:
+        keys = sorted(set(keys))
+        done = deleted = 0
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            with self.__lock:
+                if self.__tables is None:
+                    return ReturnValue.ERROR, deleted
+                deleted += sum(delete(key) == ReturnValue.OK for key in batch)
+            done += len(batch)
+            if progress is not None:
+                progress(done, len(keys))
+        return ReturnValue.OK, deleted
+
+    # the helpers below expect the lock to be held and the tables to exist
+
+    def __customer(self, cust_id: int) -> Customer:
+        if self.__tables is None or cust_id not in self.__tables.customers:
+            return BadCustomer()
+        full_name, age, phone = self.__tables.customers[cust_id]
+        return Customer(cust_id, full_name, age, phone)
+
+    def __dish(self, dish_id: int) -> Dish:
+        if self.__tables is None or dish_id not in self.__tables.dishes:
+            return BadDish()
+        name, price, is_active = self.__tables.dishes[dish_id]
+        return Dish(dish_id, name, price, is_active)
+
+    # Order_Total_Price_View
+    def __order_total(self, order_id: int) -> Decimal:
+        items = self.__tables.details.get(order_id, {})
+        return sum((price * amount for amount, price in items.values()), Decimal(0)) + self.__tables.orders[order_id][1]
+
+    # Dish_Avg_Rating_View ordered by the average rating (a dish without ratings has 3), ties go to the lower dish_id
+    def __dishes_by_rating(self, descending: bool) -> List[int]:
+        averages = {}
+        for dish_id in self.__tables.dishes:
+            ratings = self.__tables.ratings_by_dish.get(dish_id)
+            if ratings:
+                averages[dish_id] = _numeric_div(Decimal(sum(ratings.values())), Decimal(len(ratings)))
+            else:
+                averages[dish_id] = _numeric_div(Decimal(3), Decimal(1))
+        sign = -1 if descending else 1
+        return sorted(averages, key=lambda dish_id: (sign * averages[dish_id], dish_id))
+
+    # Customer_Ordered_Dishes_View of one customer
+    def __ordered_dishes(self, cust_id: int) -> set:
+        ordered = set()
+        for order_id in self.__tables.orders_by_customer.get(cust_id, ()):
+            ordered.update(self.__tables.details.get(order_id, {}))
+        return ordered
+
+    def __recommendations(self, cust_id: Optional[int]) -> List[int]:
+        tables = self.__tables
+        liked_by = {}
+        for customer, ratings in tables.ratings.items():
+            liked_by[customer] = {dish_id for dish_id, rating in ratings.items() if rating >= 4}
+
+        # SimilarRelation is directed from the lower cust_id to the higher one, its closure is walked from cust_id
+        similar = set()
+        frontier = [cust_id] if cust_id in liked_by else []
+        while frontier:
+            current = frontier.pop()
+            for other, liked in liked_by.items():
+                if other > current and other not in similar and liked_by[current] & liked:
+                    similar.add(other)
+                    frontier.append(other)
+
+        recommended = set()
+        for other in similar:
+            recommended |= liked_by[other]
+        return sorted(recommended - self.__ordered_dishes(cust_id))
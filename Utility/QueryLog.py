@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import random
+import re
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# literals (strings, numbers) and runs of whitespace, the parts of a query that differ between its calls
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w$])|\s+")
+# a list of literals (IN (...), VALUES (...), ARRAY[...]) is one placeholder, whatever its length
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)|\[\s*\?(?:\s*,\s*\?)+\s*\]')
+# the fingerprints tracked, the queries of any other one are counted under OTHER
+MAX_FINGERPRINTS = 10000
+OTHER = '<other>'
+# characters of a query / of the parameters written to the log
+LOGGED_CHARACTERS = 500
+# the logger of the query log, it writes nowhere until the application configures logging
+LOGGER_NAME = 'yummy.queries'
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+def fingerprint(query: str) -> str:
+    """
+    The query with its literals replaced by ?, so all the calls of one statement have the same fingerprint,
+    e.g. "SELECT * FROM Dishes WHERE Dish_id = 7;" -> "SELECT * FROM Dishes WHERE Dish_id = ?"
+    """
+    normalized = _LITERALS.sub(lambda match: ' ' if match.group().isspace() else '?', query).strip().rstrip(';')
+    normalized = _LISTS.sub(lambda match: match.group()[0] + '?, ...' + match.group()[-1], normalized)
+    return normalized.strip()
+
+
+def _param(value) -> str:
+    # the business objects have no repr of their own
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        fields = ', '.join(f'{name.rsplit("__", 1)[-1]}={field!r}' for name, field in vars(value).items())
+        return f'{type(value).__name__}({fields})'
+    return repr(value)
+
+
+def _shorten(text: str) -> str:
+    return text if len(text) <= LOGGED_CHARACTERS else text[:LOGGED_CHARACTERS] + '...'
+
+
+class QueryLog:
+    """
+    Statistics of the queries run through DBConnector.execute by their fingerprint (see fingerprint) - count,
+    errors, total and max time - and a log of the slow ones.
+    A query that took slow_threshold seconds or more is logged (to the 'yummy.queries' logger, WARNING) with its
+    fingerprint, its text and the API function and parameters it was run for, sample_rate of them when the slow
+    queries are too many to log them all. The failed queries are logged at DEBUG level.
+    The API function of a query is the innermost calling(...) block of the thread it runs in.
+    """
+
+    def __init__(self, slow_threshold: float = 1.0, sample_rate: float = 1.0,
+                 logger: Optional[logging.Logger] = None):
+        self.enabled = True
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+        self.logger = logger or logging.getLogger(LOGGER_NAME)
+        self.__lock = threading.Lock()
+        # fingerprint -> [count, errors, total seconds, max seconds]
+        self.__stats = {}
+        self.__slow = 0
+        self.__logged = 0
+        self.__call = threading.local()
+
+    def configure(self, slow_threshold: Optional[float] = None, sample_rate: Optional[float] = None):
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    # the queries run inside the with block are run for the function called with these parameters
+    @contextmanager
+    def calling(self, function: str, args: tuple = (), kwargs: Optional[dict] = None):
+        stack = self.__call.__dict__.setdefault('stack', [])
+        stack.append((function, args, kwargs or {}))
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    # the function (and its parameters) the current thread runs queries for, None outside of calling blocks
+    def caller(self) -> Optional[str]:
+        stack = getattr(self.__call, 'stack', None)
+        if not stack:
+            return None
+        function, args, kwargs = stack[-1]
+        params = [_param(arg) for arg in args] + [f'{name}={_param(value)}' for name, value in kwargs.items()]
+        return _shorten(f'{function}({", ".join(params)})')
+
+    def record(self, query: str, seconds: float, error: Optional[Exception] = None):
+        if not self.enabled:
+            return
+        key = fingerprint(query)
+        with self.__lock:
+            stats = self.__stats.get(key)
+            if stats is None:
+                if len(self.__stats) >= MAX_FINGERPRINTS:
+                    key = OTHER
+                stats = self.__stats.setdefault(key, [0, 0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += error is not None
+            stats[2] += seconds
+            stats[3] = max(stats[3], seconds)
+            slow = seconds >= self.slow_threshold
+            self.__slow += slow
+            logged = slow and random.random() < self.sample_rate
+            self.__logged += logged
+
+        if logged:
+            self.logger.warning('slow query %.3f s [%s] in %s: %s', seconds, QueryLog.fingerprint_id(key),
+                                self.caller(), _shorten(' '.join(query.split())))
+        if error is not None:
+            self.failure(f'query [{QueryLog.fingerprint_id(key)}] {_shorten(" ".join(query.split()))}', error)
+
+    # logs (DEBUG) a failed query or operation, with the function it was run for
+    def failure(self, what: str, error: Exception):
+        if self.enabled and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('%s failed in %s: %s', what, self.caller(), ' '.join(str(error).split()))
+
+    # a short stable id of the fingerprint, to find its log lines
+    @staticmethod
+    def fingerprint_id(key: str) -> str:
+        return hashlib.md5(key.encode()).hexdigest()[:12]
+
+    def stats(self, top: Optional[int] = None) -> dict:
+        """
+        :param top: Only the top fingerprints by total time, None for all of them.
+        :return: {'slow', 'logged', 'fingerprints': [{'id', 'fingerprint', 'count', 'errors', 'total', 'mean', 'max'}]},
+                 the fingerprints by descending total time.
+        """
+        with self.__lock:
+            rows = [{'id': QueryLog.fingerprint_id(key), 'fingerprint': key, 'count': count, 'errors': errors,
+                     'total': total, 'mean': total / count, 'max': longest}
+                    for key, (count, errors, total, longest) in self.__stats.items()]
+            slow, logged = self.__slow, self.__logged
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return {'slow': slow, 'logged': logged, 'fingerprints': rows[:top] if top is not None else rows}
+
+    def reset(self):
+        with self.__lock:
+            self.__stats.clear()
+            self.__slow = 0
+            self.__logged = 0
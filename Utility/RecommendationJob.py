@@ -0,0 +1,60 @@
+from typing import Dict, List, Set, Tuple
+
+# The pure part of the bulk recommendation job (Solution.precompute_recommendations), run in the worker processes.
+#
+# SimilarRelation links a customer to every higher cust_id that likes (rates >= 4) a dish it likes too, and the
+# recommendations of a customer are the dishes liked by the customers it reaches, minus the ones it ordered.
+# The customers that like a dish, in cust_id order, are a chain: the next one after c reaches all the later ones,
+# so only the next customer of every dish is followed. The reached likes of every customer are computed once,
+# from the highest cust_id down, and shared by every customer that reaches it.
+# Customers that reach each other's likes form a component (linked through a liked dish), the components are
+# independent of each other and are the units of work spread over the processes.
+
+
+# the next customer (by cust_id) that likes each of the customer's dishes, per customer
+def _next_likers(liked: Dict[int, Set[int]]) -> Dict[int, List[int]]:
+    likers = {}
+    for cust_id in sorted(liked):
+        for dish_id in liked[cust_id]:
+            likers.setdefault(dish_id, []).append(cust_id)
+    next_likers = {cust_id: [] for cust_id in liked}
+    for dish_likers in likers.values():
+        for cust_id, next_cust_id in zip(dish_likers, dish_likers[1:]):
+            next_likers[cust_id].append(next_cust_id)
+    return next_likers
+
+
+# splits the customers into the components of the similarity relation, each as a sorted list of cust_ids
+def similarity_components(liked: Dict[int, Set[int]]) -> List[List[int]]:
+    parent = {cust_id: cust_id for cust_id in liked}
+
+    def find(cust_id: int) -> int:
+        while parent[cust_id] != cust_id:
+            parent[cust_id] = parent[parent[cust_id]]
+            cust_id = parent[cust_id]
+        return cust_id
+
+    for cust_id, next_cust_ids in _next_likers(liked).items():
+        for next_cust_id in next_cust_ids:
+            parent[find(cust_id)] = find(next_cust_id)
+
+    components = {}
+    for cust_id in sorted(liked):
+        components.setdefault(find(cust_id), []).append(cust_id)
+    return list(components.values())
+
+
+# the recommendations of every customer of the given components
+# work - [(liked dishes, ordered dishes) of every customer, by cust_id]
+def component_recommendations(work: Dict[int, Tuple[Set[int], Set[int]]]) -> Dict[int, List[int]]:
+    liked = {cust_id: likes for cust_id, (likes, _) in work.items()}
+    next_likers = _next_likers(liked)
+    # the dishes liked by the customers reached from each customer (the customer itself excluded)
+    reached = {}
+    for cust_id in sorted(liked, reverse=True):
+        reached_likes = set()
+        for next_cust_id in next_likers[cust_id]:
+            reached_likes |= liked[next_cust_id]
+            reached_likes |= reached[next_cust_id]
+        reached[cust_id] = reached_likes
+    return {cust_id: sorted(reached[cust_id] - ordered) for cust_id, (_, ordered) in work.items()}
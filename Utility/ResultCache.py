@@ -0,0 +1,157 @@
+import copy
+import functools
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def _estimate_size(value) -> int:
+    # rough deep size of a result - lists / tuples of numbers and business objects
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set)):
+        size += sum(_estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif hasattr(value, '__dict__'):
+        size += _estimate_size(vars(value))
+    return size
+
+
+class ResultCache:
+    """
+    Cache of function results keyed by the function, its arguments and the versions of the tables it reads.
+    Every table has a version counter, the write functions bump the counters of the tables they touch,
+    so a cached result is served until one of its input tables changes - there is no expiry time to tune.
+    The entries are evicted least recently used first, once there are more than max_entries of them
+    or their estimated size passes max_bytes.
+    The counters live in this process only, writes made by other processes are not seen unless they are
+    reported with bump().
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 << 20):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.__lock = threading.Lock()
+        self.__versions = {}
+        # bumped by flush, it is a part of every entry's versions
+        self.__epoch = 0
+        # key -> (table versions, size, value)
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__call = threading.local()
+
+    # report that the given tables changed, the results that read them are not served anymore
+    def bump(self, *tables: str):
+        with self.__lock:
+            for table in tables:
+                table = table.lower()
+                self.__versions[table] = self.__versions.get(table, 0) + 1
+
+    # drop every entry (e.g. after the tables were recreated, or when changes may have been missed)
+    def flush(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+            # the results computed right now must not be served either
+            self.__epoch += 1
+
+    # the result of the cached call running in this thread must not be stored (e.g. its query failed)
+    def skip_store(self):
+        self.__call.skip_store = True
+
+    # the cached calls of the with block store their results under the versions in pinned, the versions a call
+    # is first made with are added to it - for a call that is made again with the answer of a query run then
+    # (see batch_calls), so a write that landed in between makes its entry stale
+    @contextmanager
+    def pin_versions(self, pinned: dict):
+        previous = getattr(self.__call, 'pinned', None)
+        self.__call.pinned = pinned
+        try:
+            yield
+        finally:
+            self.__call.pinned = previous
+
+    # decorator - the function reads the given tables, cache its results
+    def cached(self, *tables: str):
+        tables = tuple(table.lower() for table in tables)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                key = (func, args, tuple(sorted(kwargs.items())))
+                try:
+                    hash(key)
+                except TypeError:
+                    return func(*args, **kwargs)
+
+                versions = self.__lookup_versions(tables)
+                with self.__lock:
+                    entry = self.__entries.get(key)
+                    if entry is not None and entry[0] == versions:
+                        self.__hits += 1
+                        self.__entries.move_to_end(key)
+                        return copy.deepcopy(entry[2])
+                    self.__misses += 1
+                pinned = getattr(self.__call, 'pinned', None)
+                if pinned is not None:
+                    versions = pinned.setdefault(key, versions)
+
+                # the versions are taken before the query, so a write that lands meanwhile makes the entry stale
+                self.__call.skip_store = False
+                value = func(*args, **kwargs)
+                if self.__call.skip_store:
+                    return value
+                self.__store(key, versions, value)
+                return copy.deepcopy(value)
+            return wrapper
+        return decorator
+
+    # decorator - the function writes the given tables, bump them once it is done
+    def writes(self, *tables: str):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.bump(*tables)
+            return wrapper
+        return decorator
+
+    def __lookup_versions(self, tables: tuple) -> tuple:
+        with self.__lock:
+            return (self.__epoch,) + tuple(self.__versions.get(table, 0) for table in tables)
+
+    def __store(self, key, versions: tuple, value):
+        size = _estimate_size(value)
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self.__entries[key] = (versions, size, value)
+            self.__bytes += size
+            while len(self.__entries) > self.max_entries or self.__bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.__entries.popitem(last=False)
+                self.__bytes -= evicted_size
+                self.__evictions += 1
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                'entries': len(self.__entries),
+                'bytes': self.__bytes,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'hit_ratio': self.__hits / lookups if lookups else 0.0,
+                'evictions': self.__evictions,
+            }
@@ -0,0 +1,80 @@
+import random
+import threading
+from typing import Optional
+
+
+class RetryPolicy:
+    """
+    Decides which failed database calls are worth another attempt, and how long to wait before it.
+    The decision is made on the SQLSTATE the exception carries (see DatabaseException code):
+     - conflicts that the server already rolled back (serialization failures, deadlocks) and connection
+       problems before the commit are retryable for any work - nothing was applied
+     - a connection lost during the commit leaves the outcome unknown (08007), so only idempotent work is retried
+     - anything else (constraint violations, syntax errors, ...) is fatal and is returned right away
+    The waits are exponential with full jitter, so clients that failed together do not retry together.
+    """
+    RETRYABLE_SQLSTATES = {
+        '40001',  # serialization_failure
+        '40P01',  # deadlock_detected
+        '08000',  # connection_exception
+        '08001',  # sqlclient_unable_to_establish_sqlconnection
+        '08003',  # connection_does_not_exist
+        '08004',  # sqlserver_rejected_establishment_of_sqlconnection
+        '08006',  # connection_failure
+        '53300',  # too_many_connections
+        '55P03',  # lock_not_available
+        '57P01',  # admin_shutdown
+        '57P02',  # crash_shutdown
+        '57P03',  # cannot_connect_now
+    }
+    IDEMPOTENT_ONLY_SQLSTATES = {
+        '08007',  # transaction_resolution_unknown
+    }
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.05, max_delay: float = 2.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.__lock = threading.Lock()
+        self.__retries = {}
+        self.__recovered = 0
+        self.__exhausted = 0
+
+    # is e a transient failure, that another attempt of the work may not hit
+    def is_retryable(self, e: Exception, idempotent: bool) -> bool:
+        code = RetryPolicy.sqlstate(e)
+        return code in RetryPolicy.RETRYABLE_SQLSTATES or (idempotent and code in RetryPolicy.IDEMPOTENT_ONLY_SQLSTATES)
+
+    # is another attempt allowed after the given attempt (0 based) failed with e
+    def should_retry(self, e: Exception, attempt: int, idempotent: bool) -> bool:
+        return attempt + 1 < self.max_attempts and self.is_retryable(e, idempotent)
+
+    # seconds to sleep before the attempt following the given one
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def sqlstate(e: Exception) -> Optional[str]:
+        return getattr(e, 'code', None) or getattr(e, 'pgcode', None)
+
+    # record the outcome of a call - the SQLSTATEs of the failed attempts that were retried, whether the call
+    # still failed on a retryable error when it ran out of attempts, and whether its last attempt succeeded
+    def record(self, retried_codes: list, exhausted: bool, succeeded: bool):
+        if not retried_codes and not exhausted:
+            return
+        with self.__lock:
+            for code in retried_codes:
+                self.__retries[code] = self.__retries.get(code, 0) + 1
+            if exhausted:
+                self.__exhausted += 1
+            elif succeeded:
+                self.__recovered += 1
+
+    # retries per SQLSTATE, calls that succeeded thanks to a retry and calls that ran out of attempts
+    def metrics(self) -> dict:
+        with self.__lock:
+            return {
+                'retries': dict(self.__retries),
+                'recovered': self.__recovered,
+                'exhausted': self.__exhausted,
+            }
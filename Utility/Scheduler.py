@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Union
+from Utility.Exceptions import DatabaseException
+
+
+class _Lane:
+    # how many recent wait times are kept for the percentiles
+    WAIT_SAMPLES = 1024
+
+    def __init__(self, limit: Optional[int], max_queue: Optional[int], deadline: Optional[float]):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.running = 0
+        # heap of [priority, arrival, cancelled] - lower priority value is served first, FIFO among equals
+        self.queue = []
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=_Lane.WAIT_SAMPLES)
+        self.max_wait = 0.0
+
+    def has_room(self) -> bool:
+        return self.limit is None or self.running < self.limit
+
+    def pop_cancelled(self):
+        while self.queue and self.queue[0][2]:
+            heapq.heappop(self.queue)
+
+
+class AdmissionScheduler:
+    """
+    Admission control in front of the database calls.
+    Every class of work (lane) has its own concurrency limit, its own priority queue and its own queue-time deadline,
+    so a burst of heavy analytic calls can only take the analytic slots, and point lookups keep flowing next to it.
+    Work is rejected right away when its lane's queue is full, and when it waited longer than the deadline.
+    """
+    INTERACTIVE = 'interactive'
+    ANALYTIC = 'analytic'
+    # a limit of configure that lifts the current one
+    UNLIMITED = object()
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__changed = threading.Condition(self.__lock)
+        self.__arrivals = itertools.count()
+        self.__lanes = {
+            AdmissionScheduler.INTERACTIVE: _Lane(limit=16, max_queue=256, deadline=5.0),
+            AdmissionScheduler.ANALYTIC: _Lane(limit=4, max_queue=32, deadline=30.0),
+        }
+
+    # set the limits of a lane (creating it if needed) - None keeps the current limit (unlimited for a new lane),
+    # UNLIMITED lifts it
+    def configure(self, lane: str, limit: Union[int, object, None] = None, max_queue: Union[int, object, None] = None,
+                  deadline: Union[float, object, None] = None):
+        with self.__lock:
+            if lane not in self.__lanes:
+                self.__lanes[lane] = _Lane(None, None, None)
+            settings = {'limit': limit, 'max_queue': max_queue, 'deadline': deadline}
+            for name, value in settings.items():
+                if value is not None:
+                    setattr(self.__lanes[lane], name, None if value is AdmissionScheduler.UNLIMITED else value)
+            self.__changed.notify_all()
+
+    # holds a slot of the lane for the duration of the with block
+    # raises DatabaseException.ADMISSION_REJECTED when the queue is full or the deadline passed while queued
+    @contextmanager
+    def admit(self, lane: str = INTERACTIVE, priority: int = 0, deadline: Optional[float] = None):
+        self.__acquire(lane, priority, deadline)
+        try:
+            yield
+        finally:
+            self.__release(lane)
+
+    def __acquire(self, lane_name: str, priority: int, deadline: Optional[float]):
+        arrived = time.monotonic()
+        with self.__lock:
+            lane = self.__lanes[lane_name]
+            deadline = lane.deadline if deadline is None else deadline
+
+            lane.pop_cancelled()
+            if lane.has_room() and not lane.queue:
+                self.__admit(lane, arrived)
+                return
+            if lane.max_queue is not None and lane.queued >= lane.max_queue:
+                lane.rejected += 1
+                raise DatabaseException.ADMISSION_REJECTED(f'{lane_name} queue is full')
+
+            entry = [priority, next(self.__arrivals), False]
+            heapq.heappush(lane.queue, entry)
+            lane.queued += 1
+            try:
+                while not (lane.has_room() and lane.queue[0] is entry):
+                    remaining = None if deadline is None else arrived + deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        entry[2] = True
+                        lane.timed_out += 1
+                        raise DatabaseException.ADMISSION_REJECTED(f'{lane_name} queue deadline passed')
+                    self.__changed.wait(remaining)
+                    lane.pop_cancelled()
+                heapq.heappop(lane.queue)
+                self.__admit(lane, arrived)
+            finally:
+                lane.queued -= 1
+                # whoever is next in line may go now
+                self.__changed.notify_all()
+
+    def __admit(self, lane: _Lane, arrived: float):
+        wait = time.monotonic() - arrived
+        lane.running += 1
+        lane.admitted += 1
+        lane.waits.append(wait)
+        lane.max_wait = max(lane.max_wait, wait)
+
+    def __release(self, lane_name: str):
+        with self.__lock:
+            self.__lanes[lane_name].running -= 1
+            self.__changed.notify_all()
+
+    # queue depth, concurrency and wait time statistics per lane, the wait times are in seconds
+    def metrics(self) -> dict:
+        with self.__lock:
+            result = {}
+            for name, lane in self.__lanes.items():
+                waits = sorted(lane.waits)
+                result[name] = {
+                    'limit': lane.limit,
+                    'running': lane.running,
+                    'queued': lane.queued,
+                    'admitted': lane.admitted,
+                    'rejected': lane.rejected,
+                    'timed_out': lane.timed_out,
+                    'wait_p50': waits[len(waits) // 2] if waits else 0.0,
+                    'wait_p99': waits[min(len(waits) - 1, (len(waits) * 99) // 100)] if waits else 0.0,
+                    'wait_max': lane.max_wait,
+                }
+            return result
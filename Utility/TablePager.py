@@ -0,0 +1,161 @@
+import json
+from typing import List, Optional, Sequence, Tuple
+from psycopg2 import sql
+from Utility.Backend import PAGE_SIZE
+
+# Page-at-a-time browsing of a table (the table viewer of streamlit_app.py).
+# A page is the next page_size rows after the sort key of the last row of the previous page (keyset pagination),
+# sorted by any column and then by the primary key, so the rows of a page are unique and stable whatever the
+# sort column holds. The filters are part of the query, only the rows of the page ever leave the server.
+
+# the tables that can be browsed -> (their columns, their primary key)
+BROWSABLE = {
+    'Customers': (['Cust_id', 'Full_name', 'Age', 'Phone_num'], ['Cust_id']),
+    'Orders': (['Order_id', 'Date', 'Delivery_fee', 'Delivery_address'], ['Order_id']),
+    'Dishes': (['Dish_id', 'Name', 'Price', 'Is_active'], ['Dish_id']),
+    'Reservations': (['Order_id', 'Cust_id'], ['Order_id']),
+    'Order_Details': (['Order_id', 'Dish_id', 'Dish_amount', 'Dish_price'], ['Order_id', 'Dish_id']),
+    'Customer_Ratings': (['Cust_id', 'Dish_id', 'Rating'], ['Cust_id', 'Dish_id']),
+}
+
+# filter operator -> SQL operator, the value of 'contains' is a substring of the column as text (any case)
+OPERATORS = {'=': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>=', 'contains': 'ILIKE'}
+
+
+def _like_pattern(text: str) -> str:
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+class TablePager:
+    """
+    The pages of one browsable table, sorted by sort (the primary key by default) and filtered by filters, a list of
+    (column, operator, value) - see OPERATORS; the value is a string or a Python value, PostgreSQL casts it to the
+    type of the column.
+    Every page costs one LIMIT query, however deep it is. The pager keeps the key each visited page starts after,
+    so going back is as cheap as going forward.
+    """
+
+    def __init__(self, conn, table: str, page_size: int = PAGE_SIZE, sort: Optional[str] = None,
+                 descending: bool = False, filters: Sequence[Tuple[str, str, object]] = ()):
+        if table not in BROWSABLE:
+            raise ValueError(f'Unknown table {table}, expected one of {list(BROWSABLE)}')
+        self.columns, self.key = BROWSABLE[table]
+        if sort is not None and sort not in self.columns:
+            raise ValueError(f'Unknown column {sort} of {table}')
+        for column, operator, _ in filters:
+            if column not in self.columns:
+                raise ValueError(f'Unknown column {column} of {table}')
+            if operator not in OPERATORS:
+                raise ValueError(f'Unknown operator {operator}, expected one of {list(OPERATORS)}')
+        if page_size <= 0:
+            raise ValueError('page_size must be positive')
+
+        self.conn = conn
+        self.table = table
+        self.page_size = page_size
+        self.descending = descending
+        self.filters = list(filters)
+        # the primary key breaks the ties of the sort column
+        self.__order = ([sort] if sort is not None and sort not in self.key else []) + self.key
+        # the key (values of __order) every visited page starts after, None for the first page
+        self.__starts = [None]
+        self.__has_next = None
+        self.__last = None
+
+    @property
+    def page_number(self) -> int:
+        return len(self.__starts)
+
+    # the filters as a condition, TRUE without filters
+    def __condition(self) -> sql.Composable:
+        conditions = []
+        for column, operator, value in self.filters:
+            if operator == 'contains':
+                conditions.append(sql.SQL('{}::TEXT ILIKE {}').format(sql.Identifier(column.lower()),
+                                                                      sql.Literal(_like_pattern(str(value)))))
+            else:
+                conditions.append(sql.SQL('{} {} {}').format(sql.Identifier(column.lower()),
+                                                             sql.SQL(OPERATORS[operator]), sql.Literal(value)))
+        return sql.SQL(' AND ').join(conditions) if conditions else sql.SQL('TRUE')
+
+    def page_query(self, after: Optional[tuple] = None, limit: Optional[int] = None) -> sql.Composed:
+        """
+        The query of the page that starts after the key after (the values of the sort column and the primary key
+        of the last row of the previous page), None for the first page.
+        """
+        order = [sql.Identifier(column.lower()) for column in self.__order]
+        direction = sql.SQL('DESC' if self.descending else 'ASC')
+        condition = self.__condition()
+        if after is not None:
+            # a row comparison follows one index on (sort column, key) when there is one
+            condition = sql.SQL('{} AND ({}) {} ({})').format(
+                condition, sql.SQL(', ').join(order), sql.SQL('<' if self.descending else '>'),
+                sql.SQL(', ').join(sql.Literal(value) for value in after))
+        return sql.SQL('SELECT {columns} FROM {table} WHERE {condition} ORDER BY {order} LIMIT {limit};').format(
+            columns=sql.SQL(', ').join(sql.Identifier(column.lower()) for column in self.columns),
+            table=sql.Identifier(self.table.lower()), condition=condition,
+            order=sql.SQL(', ').join(sql.SQL('{} {}').format(column, direction) for column in order),
+            limit=sql.Literal(self.page_size if limit is None else limit))
+
+    def page(self) -> List[tuple]:
+        """
+        :return: The rows (tuples of the values of columns) of the current page.
+        """
+        # one row more than the page tells whether there is a next page
+        _, result = self.conn.execute(self.page_query(self.__starts[-1], self.page_size + 1))
+        rows = [tuple(row) for row in result.rows]
+        self.__has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.__last = self.__key_of(rows[-1]) if rows else None
+        return rows
+
+    def __key_of(self, row: tuple) -> tuple:
+        return tuple(row[self.columns.index(column)] for column in self.__order)
+
+    def has_next(self) -> bool:
+        if self.__has_next is None:
+            self.page()
+        return self.__has_next
+
+    def has_previous(self) -> bool:
+        return len(self.__starts) > 1
+
+    # moves to the next page, the current page must have been read (page) before
+    def next(self) -> bool:
+        if not self.has_next():
+            return False
+        self.__starts.append(self.__last)
+        self.__has_next = None
+        return True
+
+    def previous(self) -> bool:
+        if not self.has_previous():
+            return False
+        self.__starts.pop()
+        self.__has_next = None
+        return True
+
+    def first(self):
+        del self.__starts[1:]
+        self.__has_next = None
+
+    def estimate(self) -> int:
+        """
+        The estimated number of rows of the table, or of the rows that pass the filters, from the statistics of the
+        catalog (pg_class.reltuples, the planner's estimate of the filters) - never a COUNT(*), which reads all of them.
+        """
+        if not self.filters:
+            query = sql.SQL('SELECT reltuples::BIGINT AS Estimate FROM pg_class WHERE oid = to_regclass({});').format(
+                sql.Literal(self.table.lower()))
+            _, result = self.conn.execute(query)
+            # a table that has never been analyzed has no statistics (-1 since PostgreSQL 14, 0 before)
+            if result.size() > 0 and result[0]['Estimate'] > 0:
+                return result[0]['Estimate']
+        query = sql.SQL('EXPLAIN (FORMAT JSON) SELECT 1 FROM {table} WHERE {condition};').format(
+            table=sql.Identifier(self.table.lower()), condition=self.__condition())
+        _, result = self.conn.execute(query)
+        plan = result.rows[0][0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
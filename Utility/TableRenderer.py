@@ -0,0 +1,70 @@
+import csv
+import itertools
+import json
+from typing import Iterable, List, Optional, TextIO
+
+# Incremental rendering of query results (ResultSet.render, DBConnector.dump).
+# Every row is written to the stream as soon as it is formatted, nothing but the rows used to align the columns
+# is held, so the memory does not grow with the number of rows.
+
+FORMATS = ('table', 'csv', 'jsonl')
+# the 'table' columns are as wide as their header and values in the first ALIGN_ROWS rows, a wider value after
+# them pushes the rest of its row to the right
+ALIGN_ROWS = 1000
+COLUMN_SEPARATOR = '   '
+TRUNCATED = '...'
+
+
+def _truncate(text: str, max_width: Optional[int]) -> str:
+    if max_width is None or len(text) <= max_width:
+        return text
+    return text[:max(max_width - len(TRUNCATED), 0)] + TRUNCATED
+
+
+def render(header: List[str], rows: Iterable[tuple], stream: TextIO, format: str = 'table',
+           limit: Optional[int] = None, max_width: Optional[int] = None) -> int:
+    """
+    Writes the rows to the stream as an aligned table, CSV or JSON Lines.
+
+    :param header: The column names.
+    :param rows: The rows, any iterable (it is read once, up to limit + 1 rows).
+    :param stream: A text file-like object.
+    :param format: One of FORMATS.
+    :param limit: The maximum number of rows written, None for all of them.
+    :param max_width: The maximum number of characters of a value (longer ones end with '...'), None for no limit.
+    :return: The number of rows written.
+    """
+    if format not in FORMATS:
+        raise ValueError(f'Unknown format {format}, expected one of {FORMATS}')
+    rows = iter(rows)
+    shown = rows if limit is None else itertools.islice(rows, limit)
+
+    written = 0
+    if format == 'table':
+        cell = lambda value: _truncate(str(value), max_width)
+        # the rows that set the widths are formatted once, and written right after the header
+        aligned = [[cell(value) for value in row] for row in itertools.islice(shown, ALIGN_ROWS)]
+        header = [_truncate(str(column), max_width) for column in header]
+        widths = [max([len(column)] + [len(row[index]) for row in aligned]) for index, column in enumerate(header)]
+        line = lambda cells: COLUMN_SEPARATOR.join(text.ljust(width) for text, width in zip(cells, widths)).rstrip()
+        stream.write(line(header) + '\n')
+        stream.write('\n'.join(line(row) for row in aligned) + '\n' if aligned else '')
+        written = len(aligned)
+        for row in shown:
+            stream.write(line([cell(value) for value in row]) + '\n')
+            written += 1
+        if limit is not None and next(rows, None) is not None:
+            stream.write(f'{TRUNCATED} (more than {limit} rows)\n')
+    elif format == 'csv':
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(header)
+        for row in shown:
+            writer.writerow([_truncate(str(value), max_width) if value is not None else '' for value in row])
+            written += 1
+    else:
+        for row in shown:
+            values = {column: _truncate(value, max_width) if isinstance(value, str) else value
+                      for column, value in zip(header, row)}
+            stream.write(json.dumps(values, default=lambda value: _truncate(str(value), max_width)) + '\n')
+            written += 1
+    return written
@@ -0,0 +1,161 @@
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+from Utility.Exceptions import DatabaseException
+
+
+class WriteBehindBuffer:
+    """
+    Queues writes in memory and applies them in batches from a background thread, so a burst of small writes costs
+    one statement per batch instead of one connection and one transaction each.
+    apply(items) applies a batch and returns the result of every item, in their order. submit returns a Future
+    of the item's result (or of the exception apply raised).
+    A batch is applied when it has max_batch items, or max_delay seconds after its oldest item was queued.
+    At most max_queue items wait - submit blocks while the queue is full (backpressure), and raises
+    DatabaseException.ADMISSION_REJECTED if it is still full after put_timeout seconds (None waits as long as it takes).
+    close(), which also runs at exit, applies everything that was queued before it returns. A queued item whose
+    Future was cancelled is not applied.
+    """
+
+    def __init__(self, apply: Callable[[list], list], max_batch: int = 500, max_delay: float = 0.05,
+                 max_queue: int = 10000, put_timeout: Optional[float] = None, name: str = 'write-behind'):
+        self.apply = apply
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.put_timeout = put_timeout
+        self.name = name
+        self.__lock = threading.Lock()
+        self.__changed = threading.Condition(self.__lock)
+        # (item, future, time queued)
+        self.__queue = deque()
+        self.__thread = None
+        self.__closing = False
+        # the items submitted / done so far, flush waits until the items submitted before it are done
+        self.__submitted = 0
+        self.__done = 0
+        self.__flush_until = 0
+        self.__batches = 0
+        self.__largest_batch = 0
+        self.__failed_batches = 0
+        self.__cancelled = 0
+        self.__rejected = 0
+        self.__blocked = 0
+        atexit.register(self.close)
+
+    # the limits of the batches and of the queue, None keeps the current one
+    def configure(self, max_batch: Optional[int] = None, max_delay: Optional[float] = None,
+                  max_queue: Optional[int] = None, put_timeout: Optional[float] = None):
+        with self.__lock:
+            if max_batch is not None:
+                self.max_batch = max_batch
+            if max_delay is not None:
+                self.max_delay = max_delay
+            if max_queue is not None:
+                self.max_queue = max_queue
+            if put_timeout is not None:
+                self.put_timeout = put_timeout
+            self.__changed.notify_all()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        with self.__lock:
+            if len(self.__queue) >= self.max_queue:
+                self.__blocked += 1
+                deadline = None if self.put_timeout is None else time.monotonic() + self.put_timeout
+                while len(self.__queue) >= self.max_queue:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.__rejected += 1
+                        raise DatabaseException.ADMISSION_REJECTED(
+                            f'{self.name} queue is full ({len(self.__queue)} items)')
+                    self.__changed.wait(remaining)
+            self.__queue.append((item, future, time.monotonic()))
+            self.__submitted += 1
+            if self.__thread is None:
+                self.__closing = False
+                self.__thread = threading.Thread(target=self.__run, name=self.name, daemon=True)
+                self.__thread.start()
+            self.__changed.notify_all()
+        return future
+
+    # applies the items submitted so far right away, and waits until they are done
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self.__lock:
+            target = self.__submitted
+            self.__flush_until = max(self.__flush_until, target)
+            self.__changed.notify_all()
+            return self.__changed.wait_for(lambda: self.__done >= target, timeout)
+
+    # applies everything queued and stops the thread, a later submit starts it again
+    def close(self):
+        with self.__lock:
+            thread = self.__thread
+            self.__closing = True
+            self.__changed.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'queued': len(self.__queue),
+                'submitted': self.__submitted,
+                'done': self.__done,
+                'batches': self.__batches,
+                'largest_batch': self.__largest_batch,
+                'failed_batches': self.__failed_batches,
+                'cancelled': self.__cancelled,
+                'blocked': self.__blocked,
+                'rejected': self.__rejected,
+            }
+
+    def __next_batch(self) -> Optional[list]:
+        with self.__lock:
+            while not self.__queue:
+                if self.__closing:
+                    self.__thread = None
+                    return None
+                self.__changed.wait()
+            # wait for a full batch, until the oldest item is due
+            while (len(self.__queue) < self.max_batch and not self.__closing
+                   and self.__flush_until <= self.__done):
+                remaining = self.__queue[0][2] + self.max_delay - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.__changed.wait(remaining)
+            batch = [self.__queue.popleft() for _ in range(min(self.max_batch, len(self.__queue)))]
+            # there is room for the blocked submitters
+            self.__changed.notify_all()
+            return batch
+
+    def __run(self):
+        while True:
+            batch = self.__next_batch()
+            if batch is None:
+                return
+            live = [(item, future) for item, future, _ in batch if future.set_running_or_notify_cancel()]
+            failed = False
+            if live:
+                try:
+                    results = self.apply([item for item, _ in live])
+                    if len(results) != len(live):
+                        raise DatabaseException.UNKNOWN_ERROR(f'{self.name} got {len(results)} results '
+                                                              f'for {len(live)} items')
+                    for (_, future), result in zip(live, results):
+                        future.set_result(result)
+                except Exception as e:
+                    failed = True
+                    for _, future in live:
+                        if not future.done():
+                            future.set_exception(e)
+            with self.__lock:
+                self.__done += len(batch)
+                self.__batches += bool(live)
+                self.__largest_batch = max(self.__largest_batch, len(live))
+                self.__failed_batches += failed
+                self.__cancelled += len(batch) - len(live)
+                self.__changed.notify_all()
@@ -0,0 +1,167 @@
+# Benchmarks of the database API against a generated data set, e.g:
+#   python benchmark.py stored-functions --customers 2000 --calls 200
+# Every benchmark drops and recreates the tables, do not run it against a database you care about.
+import argparse
+import re
+import sys
+import time
+from datetime import datetime
+
+import Solution
+import Utility.DBConnector as Connector
+
+
+def populate(customers: int, dishes: int, orders_per_customer: int, dishes_per_order: int, ratings_per_customer: int):
+    Solution.drop_tables()
+    Solution.create_tables()
+    orders = customers * orders_per_customer
+    conn = Connector.DBConnector()
+    # load like restore_snapshot does - the derived tables are rebuilt once instead of by their triggers row by row
+    for table in Solution.Tables_Names:
+        conn.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER;', commit=False)
+    conn.execute(f'''
+        INSERT INTO Customers SELECT i, 'Customer ' || i, 18 + i % 80, '0123456789' FROM generate_series(1, {customers}) i;
+        INSERT INTO Dishes SELECT i, 'Dish ' || i, 5 + i % 40, i % 10 != 0 FROM generate_series(1, {dishes}) i;
+        INSERT INTO Orders SELECT i, TIMESTAMP '2024-01-01' + (i % 365) * INTERVAL '1 day' + (i % 86400) * INTERVAL '1 second',
+                                  i % 3, 'Street ' || i FROM generate_series(1, {orders}) i;
+        INSERT INTO Reservations SELECT i, 1 + i % {customers} FROM generate_series(1, {orders}) i;
+        INSERT INTO Order_Details SELECT o, 1 + (o * 7 + k * 13) % {dishes}, 1 + (o + k) % 5, 5 + (o + k) % 40
+            FROM generate_series(1, {orders}) o, generate_series(1, {dishes_per_order}) k ON CONFLICT DO NOTHING;
+        INSERT INTO Customer_Ratings SELECT c, 1 + (c * 11 + k * 17) % {dishes}, 1 + (c + k) % 5
+            FROM generate_series(1, {customers}) c, generate_series(1, {ratings_per_customer}) k ON CONFLICT DO NOTHING;
+    ''', commit=False)
+    for table in Solution.Tables_Names:
+        conn.execute(f'ALTER TABLE {table} ENABLE TRIGGER USER;', commit=False)
+    for rebuild in Solution.REBUILD_DERIVED:
+        conn.execute(rebuild, commit=False)
+    conn.execute(Solution.NOTIFY_FLUSH, commit=False)
+    conn.commit()
+    conn.execute('ANALYZE;')
+    conn.close()
+    # the rows were inserted behind the API's back
+    Solution.RESULT_CACHE.flush()
+
+
+# median seconds per call of each statement, the statements are interleaved so they see the same load
+def time_calls(conn: Connector.DBConnector, statements: list, calls: int) -> list:
+    samples = [[] for _ in statements]
+    for _ in range(calls):
+        for statement, statement_samples in zip(statements, samples):
+            start = time.perf_counter()
+            conn.execute(statement)
+            statement_samples.append(time.perf_counter() - start)
+    return [sorted(statement_samples)[len(statement_samples) // 2] for statement_samples in samples]
+
+
+# the body of a stored function with its parameters replaced by literals - the query text as it was sent inline
+def inline_body(function: str, params: dict) -> str:
+    body = function.split('$$')[1]
+    for name, value in params.items():
+        body = re.sub(rf'\b{name}\b', value, body)
+    return body
+
+
+def stored_functions(args) -> None:
+    populate(args.customers, args.dishes, args.orders_per_customer, args.dishes_per_order, args.ratings_per_customer)
+    period = {'p_start': "TIMESTAMP '2024-03-01 12:00:00'", 'p_end': "TIMESTAMP '2024-06-15 08:00:00'"}
+    cases = [
+        ('get_order_total_price', Solution.ORDER_TOTAL_PRICE_FUNCTION, {'p_order_id': '17'}),
+        ('get_customers_spent_max_avg_amount_money', Solution.CUSTOMERS_SPENT_MAX_AVG_FUNCTION, {}),
+        ('get_most_ordered_dish_in_period', Solution.MOST_ORDERED_DISH_IN_PERIOD_FUNCTION, period),
+        ('did_customer_order_top_rated_dishes', Solution.ORDERED_TOP_RATED_DISHES_FUNCTION, {'p_cust_id': '17'}),
+        ('get_customers_rated_but_not_ordered', Solution.CUSTOMERS_RATED_BUT_NOT_ORDERED_FUNCTION, {}),
+        ('get_non_worth_price_increase', Solution.NON_WORTH_PRICE_INCREASE_FUNCTION, {}),
+        ('get_cumulative_profit_per_month', Solution.CUMULATIVE_PROFIT_PER_MONTH_FUNCTION, {'p_year': '2024'}),
+        ('get_potential_dish_recommendations', Solution.POTENTIAL_DISH_RECOMMENDATIONS_FUNCTION, {'p_cust_id': '17'}),
+    ]
+
+    print(f'{"function":45} {"inline bytes":>12} {"call bytes":>10} {"inline ms":>10} {"function ms":>11} {"gain":>7}')
+    conn = Connector.DBConnector()
+    for name, function, params in cases:
+        inline = inline_body(function, params)
+        function_name = re.search(r'CREATE FUNCTION (\w+)', function).group(1)
+        call = f'SELECT * FROM {function_name}({", ".join(params.values())})'
+        # warm up the caches before measuring
+        time_calls(conn, [inline, call], 3)
+        inline_time, call_time = time_calls(conn, [inline, call], args.calls)
+        print(f'{name:45} {len(inline.encode()):>12} {len(call.encode()):>10} {inline_time * 1000:>10.3f} '
+              f'{call_time * 1000:>11.3f} {(inline_time - call_time) / inline_time:>7.1%}')
+    conn.close()
+    Solution.drop_tables()
+
+
+# median seconds per call of each function, the functions are interleaved so they see the same load
+def time_functions(functions: list, calls: int) -> list:
+    samples = [[] for _ in functions]
+    for _ in range(calls):
+        for function, function_samples in zip(functions, samples):
+            start = time.perf_counter()
+            function()
+            function_samples.append(time.perf_counter() - start)
+    return [sorted(function_samples)[len(function_samples) // 2] for function_samples in samples]
+
+
+def columnar(args) -> None:
+    populate(args.customers, args.dishes, args.orders_per_customer, args.dishes_per_order, args.ratings_per_customer)
+    cases = [
+        ('get_customers_spent_max_avg_amount_money', lambda: Solution.get_customers_spent_max_avg_amount_money()),
+        ('get_most_ordered_dish_in_period',
+         lambda: Solution.get_most_ordered_dish_in_period(datetime(2024, 3, 1, 12), datetime(2024, 6, 15, 8))),
+        ('get_non_worth_price_increase', lambda: Solution.get_non_worth_price_increase()),
+        ('get_cumulative_profit_per_month', lambda: Solution.get_cumulative_profit_per_month(2024)),
+    ]
+    # every call reaches the queries / the kernels
+    Solution.RESULT_CACHE.enabled = False
+    start = time.perf_counter()
+    Solution.ANALYTICS.refresh()
+    print(f'snapshot of {sum(Solution.ANALYTICS.stats()["rows"].values())} rows taken in '
+          f'{(time.perf_counter() - start) * 1000:.1f} ms')
+
+    print(f'{"function":45} {"sql ms":>10} {"columnar ms":>12} {"speedup":>8} {"same":>5}')
+    for name, call in cases:
+        def columnar_call():
+            Solution.ANALYTICS.enabled = True
+            try:
+                return call()
+            finally:
+                Solution.ANALYTICS.enabled = False
+
+        same = call() == columnar_call()
+        time_functions([call, columnar_call], 3)
+        sql_time, columnar_time = time_functions([call, columnar_call], args.calls)
+        print(f'{name:45} {sql_time * 1000:>10.3f} {columnar_time * 1000:>12.3f} {sql_time / columnar_time:>7.1f}x '
+              f'{str(same):>5}')
+    Solution.ANALYTICS.disable()
+    Solution.RESULT_CACHE.enabled = True
+    Solution.drop_tables()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmarks of the Yummy database API')
+    benchmarks = parser.add_subparsers(dest='benchmark', required=True)
+
+    functions_parser = benchmarks.add_parser('stored-functions', help='inline query text vs. the stored functions')
+    functions_parser.add_argument('--customers', type=int, default=2000)
+    functions_parser.add_argument('--dishes', type=int, default=200)
+    functions_parser.add_argument('--orders-per-customer', type=int, default=5)
+    functions_parser.add_argument('--dishes-per-order', type=int, default=4)
+    functions_parser.add_argument('--ratings-per-customer', type=int, default=5)
+    functions_parser.add_argument('--calls', type=int, default=200)
+    functions_parser.set_defaults(run=stored_functions)
+
+    columnar_parser = benchmarks.add_parser('columnar', help='the analytic queries vs. the NumPy snapshot kernels')
+    columnar_parser.add_argument('--customers', type=int, default=20000)
+    columnar_parser.add_argument('--dishes', type=int, default=200)
+    columnar_parser.add_argument('--orders-per-customer', type=int, default=5)
+    columnar_parser.add_argument('--dishes-per-order', type=int, default=4)
+    columnar_parser.add_argument('--ratings-per-customer', type=int, default=5)
+    columnar_parser.add_argument('--calls', type=int, default=20)
+    columnar_parser.set_defaults(run=columnar)
+
+    args = parser.parse_args()
+    args.run(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,326 @@
+# Load test of the database API - a production-like mix of calls from many threads / processes, e.g:
+#   python loadtest.py --threads 16 --rate 200 --duration 60
+#   python loadtest.py --threads 32 --processes 4 --rates 100,200,400,800 --duration 20 --p99-limit 0.25
+# It drops and recreates the tables (see benchmark.py populate), do not run it against a database you care about.
+import argparse
+import itertools
+import math
+import multiprocessing
+import random
+import threading
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import Solution
+from benchmark import populate
+from Utility.ReturnValue import ReturnValue
+from Business.Customer import BadCustomer
+from Business.Order import Order, BadOrder
+from Business.Dish import BadDish
+
+# the order ids of every process of a run are taken from its own range
+_ORDER_IDS_PER_PROCESS = 10000000
+# the throughput of a rate step that is below this share of its target rate means the system is saturated
+SATURATION_THROUGHPUT = 0.9
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    # nearest rank
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(math.ceil(q * len(ordered)) - 1, 0))]
+
+
+def _outcome(result) -> str:
+    if isinstance(result, ReturnValue):
+        return result.name
+    if isinstance(result, (BadCustomer, BadOrder, BadDish)):
+        return ReturnValue.NOT_EXISTS.name
+    return ReturnValue.OK.name
+
+
+class _Recorder:
+    # the latencies and outcomes of the calls of one process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.outcomes = {}
+
+    def record(self, name: str, latency: float, outcome: str):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(latency)
+            self.outcomes.setdefault(name, Counter())[outcome] += 1
+
+
+class LoadGenerator:
+    """
+    Drives a mix of operations through the Solution API from many threads (and processes), like the production
+    traffic does, and reports the throughput, the latency percentiles and the outcomes (ReturnValue) by function.
+    The operations:
+     - checkout - add_order, customer_placed_order and order_contains_dish of 1 to max_dishes_per_order dishes
+     - rating - customer_rated_dish
+     - lookup - get_customer / get_order / get_dish
+     - analytic - one of the Basic / Advanced analytic functions
+    With a target rate the calls are started on a fixed schedule (open loop), and a call's latency is measured from
+    the time it was scheduled, so the time it waited for a free thread counts as well - the latency of a system that
+    can not keep up grows instead of the load dropping. Without a rate every thread calls as fast as it can.
+    The tables must hold the customers / dishes / orders 1..customers / 1..dishes / 1..first_order_id - 1
+    (see benchmark.py populate), the new orders get ids from first_order_id up - every run (every step of a ramp)
+    goes on from the ids the runs before it took.
+    """
+    DEFAULT_MIX = {'checkout': 20, 'rating': 15, 'lookup': 50, 'analytic': 15}
+
+    def __init__(self, customers: int, dishes: int, first_order_id: int, mix: Optional[Dict[str, float]] = None,
+                 max_dishes_per_order: int = 4, seed: int = 0):
+        self.customers = customers
+        self.dishes = dishes
+        self.first_order_id = first_order_id
+        # the first order id of the next run
+        self.next_order_id = first_order_id
+        self.mix = dict(mix or LoadGenerator.DEFAULT_MIX)
+        unknown = set(self.mix) - set(LoadGenerator.DEFAULT_MIX)
+        if unknown:
+            raise ValueError(f'Unknown operations {sorted(unknown)}, expected some of {list(LoadGenerator.DEFAULT_MIX)}')
+        self.max_dishes_per_order = max_dishes_per_order
+        self.seed = seed
+
+    def run(self, duration: float, threads: int = 8, rate: Optional[float] = None, processes: int = 1) -> dict:
+        """
+        Runs the mix for duration seconds.
+
+        :param duration: Seconds to run.
+        :param threads: Threads per process.
+        :param rate: Operations per second of the whole run, None for as fast as possible.
+        :param processes: Processes, each with its own connections and its share of the rate.
+        :return: The report - see summarize.
+        """
+        first_order_id = self.next_order_id
+        if processes == 1:
+            recorder, elapsed, used = self._run_process(0, first_order_id, duration, threads, rate)
+            self.next_order_id += used
+            return LoadGenerator.summarize([(recorder.latencies, recorder.outcomes)], elapsed, rate)
+        work = [(self, index, first_order_id, duration, threads, rate / processes if rate else None)
+                for index in range(processes)]
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            results = pool.map(_run_process, work)
+        # the processes took ids from ranges of their own
+        self.next_order_id += processes * _ORDER_IDS_PER_PROCESS
+        return LoadGenerator.summarize([samples for samples, _ in results], max(elapsed for _, elapsed in results), rate)
+
+    def ramp(self, rates: List[float], step_duration: float, threads: int = 8, processes: int = 1,
+             p99_limit: Optional[float] = None) -> dict:
+        """
+        Runs the mix at every rate in turn, to find where the system saturates - the first rate whose throughput
+        is below SATURATION_THROUGHPUT of it, or whose p99 latency is above p99_limit seconds.
+
+        :return: {'steps': [report of every rate], 'saturation_rate': the rate (None if none of them saturated)}
+        """
+        steps = []
+        saturation_rate = None
+        for rate in rates:
+            report = self.run(step_duration, threads, rate, processes)
+            steps.append(report)
+            saturated = report['throughput'] < SATURATION_THROUGHPUT * rate or \
+                (p99_limit is not None and report['p99'] > p99_limit)
+            if saturated and saturation_rate is None:
+                saturation_rate = rate
+        return {'steps': steps, 'saturation_rate': saturation_rate}
+
+    @staticmethod
+    def summarize(samples: list, elapsed: float, rate: Optional[float] = None) -> dict:
+        """
+        :param samples: ({function: [latencies]}, {function: Counter of outcomes}) of every process.
+        :return: {'rate', 'elapsed', 'calls', 'throughput' (operations per second), 'p50' / 'p95' / 'p99' (of the
+                  operations), 'functions': {function: {'calls', 'throughput', 'p50', 'p95', 'p99', 'max',
+                  'outcomes': {ReturnValue name: calls}, 'error_rate'}}}
+                 The operations are under 'operation:<name>', the API calls under their function names.
+        """
+        latencies = {}
+        outcomes = {}
+        for process_latencies, process_outcomes in samples:
+            for name, values in process_latencies.items():
+                latencies.setdefault(name, []).extend(values)
+            for name, counts in process_outcomes.items():
+                outcomes.setdefault(name, Counter()).update(counts)
+
+        functions = {}
+        for name in sorted(latencies):
+            ordered = sorted(latencies[name])
+            calls = len(ordered)
+            functions[name] = {
+                'calls': calls,
+                'throughput': calls / elapsed if elapsed else 0.0,
+                'p50': _percentile(ordered, 0.50),
+                'p95': _percentile(ordered, 0.95),
+                'p99': _percentile(ordered, 0.99),
+                'max': ordered[-1],
+                'outcomes': dict(outcomes[name]),
+                'error_rate': 1 - outcomes[name][ReturnValue.OK.name] / calls,
+            }
+        operations = sorted(value for name, values in latencies.items() if name.startswith('operation:')
+                            for value in values)
+        return {
+            'rate': rate,
+            'elapsed': elapsed,
+            'calls': len(operations),
+            'throughput': len(operations) / elapsed if elapsed else 0.0,
+            'p50': _percentile(operations, 0.50),
+            'p95': _percentile(operations, 0.95),
+            'p99': _percentile(operations, 0.99),
+            'functions': functions,
+        }
+
+    @staticmethod
+    def format(report: dict) -> str:
+        lines = [f'{report["calls"]} operations in {report["elapsed"]:.1f} s - {report["throughput"]:.1f}/s'
+                 + (f' (target {report["rate"]:.1f}/s)' if report['rate'] else '')
+                 + f', p50 {report["p50"] * 1000:.1f} ms, p95 {report["p95"] * 1000:.1f} ms, '
+                   f'p99 {report["p99"] * 1000:.1f} ms',
+                 f'{"function":45} {"calls":>7} {"per s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8} '
+                 f'{"errors":>7}  outcomes']
+        for name, stats in report['functions'].items():
+            outcomes = ', '.join(f'{outcome} {calls}' for outcome, calls in sorted(stats['outcomes'].items()))
+            lines.append(f'{name:45} {stats["calls"]:>7} {stats["throughput"]:>8.1f} {stats["p50"] * 1000:>8.1f} '
+                         f'{stats["p95"] * 1000:>8.1f} {stats["p99"] * 1000:>8.1f} {stats["max"] * 1000:>8.1f} '
+                         f'{stats["error_rate"]:>7.1%}  {outcomes}')
+        return '\n'.join(lines)
+
+    # -> (recorder, elapsed seconds, the number of order ids taken)
+    def _run_process(self, index: int, first_order_id: int, duration: float, threads: int, rate: Optional[float]):
+        recorder = _Recorder()
+        first_order_id += index * _ORDER_IDS_PER_PROCESS
+        order_ids = itertools.count(first_order_id)
+        # the n-th operation of the process is due at start + n / rate
+        schedule = itertools.count()
+        start = time.perf_counter() + 0.01
+        end = start + duration
+
+        def worker(thread: int):
+            rng = random.Random(hash((self.seed, index, thread)))
+            names, weights = zip(*self.mix.items())
+            while True:
+                if rate:
+                    due = start + next(schedule) / rate
+                    if due >= end:
+                        return
+                    time.sleep(max(due - time.perf_counter(), 0))
+                else:
+                    due = time.perf_counter()
+                    if due >= end:
+                        return
+                operation = rng.choices(names, weights)[0]
+                outcome = getattr(self, f'_{operation}')(rng, recorder, order_ids)
+                recorder.record(f'operation:{operation}', time.perf_counter() - due, outcome)
+
+        workers = [threading.Thread(target=worker, args=(thread,), daemon=True) for thread in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return recorder, max(time.perf_counter(), end) - start, next(order_ids) - first_order_id
+
+    @staticmethod
+    def _call(recorder: _Recorder, function, *args) -> str:
+        started = time.perf_counter()
+        try:
+            outcome = _outcome(function(*args))
+        except Exception:
+            outcome = 'EXCEPTION'
+        recorder.record(function.__name__, time.perf_counter() - started, outcome)
+        return outcome
+
+    # the operations, each returns the outcome of its first failed call (OK if none failed)
+
+    def _checkout(self, rng: random.Random, recorder: _Recorder, order_ids) -> str:
+        order_id = next(order_ids)
+        day = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(365 * 86400))
+        outcomes = [LoadGenerator._call(recorder, Solution.add_order, Order(order_id, day, rng.choice([0, 2.5, 5]),
+                                                                            'Load street')),
+                    LoadGenerator._call(recorder, Solution.customer_placed_order, rng.randint(1, self.customers),
+                                        order_id)]
+        for dish_id in rng.sample(range(1, self.dishes + 1), min(rng.randint(1, self.max_dishes_per_order),
+                                                                 self.dishes)):
+            outcomes.append(LoadGenerator._call(recorder, Solution.order_contains_dish, order_id, dish_id,
+                                                rng.randint(1, 4)))
+        return next((outcome for outcome in outcomes if outcome != ReturnValue.OK.name), ReturnValue.OK.name)
+
+    def _rating(self, rng: random.Random, recorder: _Recorder, order_ids) -> str:
+        return LoadGenerator._call(recorder, Solution.customer_rated_dish, rng.randint(1, self.customers),
+                                   rng.randint(1, self.dishes), rng.randint(1, 5))
+
+    def _lookup(self, rng: random.Random, recorder: _Recorder, order_ids) -> str:
+        function, key = rng.choice([(Solution.get_customer, self.customers), (Solution.get_dish, self.dishes),
+                                    (Solution.get_order, max(self.first_order_id - 1, 1))])
+        return LoadGenerator._call(recorder, function, rng.randint(1, key))
+
+    def _analytic(self, rng: random.Random, recorder: _Recorder, order_ids) -> str:
+        start = datetime(2024, 1, 1) + timedelta(days=rng.randrange(365))
+        call = rng.choice([
+            (Solution.get_order_total_price, rng.randint(1, max(self.first_order_id - 1, 1))),
+            (Solution.get_customers_spent_max_avg_amount_money,),
+            (Solution.get_most_ordered_dish_in_period, start, start + timedelta(days=rng.randint(1, 90))),
+            (Solution.did_customer_order_top_rated_dishes, rng.randint(1, self.customers)),
+            (Solution.get_customers_rated_but_not_ordered,),
+            (Solution.get_non_worth_price_increase,),
+            (Solution.get_cumulative_profit_per_month, rng.choice([2024, 2025])),
+            (Solution.get_potential_dish_recommendations, rng.randint(1, self.customers)),
+        ])
+        return LoadGenerator._call(recorder, *call)
+
+
+# the work of one process of a run, ((latencies, outcomes), elapsed seconds)
+def _run_process(work: tuple):
+    generator, index, first_order_id, duration, threads, rate = work
+    recorder, elapsed, _ = generator._run_process(index, first_order_id, duration, threads, rate)
+    return (recorder.latencies, recorder.outcomes), elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Load test of the Yummy database API')
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--dishes', type=int, default=200)
+    parser.add_argument('--orders-per-customer', type=int, default=5)
+    parser.add_argument('--dishes-per-order', type=int, default=4)
+    parser.add_argument('--ratings-per-customer', type=int, default=5)
+    parser.add_argument('--mix', default=','.join(f'{name}={weight}' for name, weight in LoadGenerator.DEFAULT_MIX.items()),
+                        help='weights of the operations, e.g. checkout=20,rating=15,lookup=50,analytic=15')
+    parser.add_argument('--threads', type=int, default=8, help='threads per process')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=30, help='seconds (of every rate with --rates)')
+    parser.add_argument('--rate', type=float, default=None, help='operations per second (default: as fast as possible)')
+    parser.add_argument('--rates', default=None, help='comma separated rates to step through, to find the saturation')
+    parser.add_argument('--p99-limit', type=float, default=None, help='seconds, a higher p99 latency is saturation')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    populate(args.customers, args.dishes, args.orders_per_customer, args.dishes_per_order, args.ratings_per_customer)
+    mix = {name: float(weight) for name, weight in (item.split('=') for item in args.mix.split(','))}
+    generator = LoadGenerator(args.customers, args.dishes, args.customers * args.orders_per_customer + 1, mix,
+                              args.dishes_per_order, args.seed)
+
+    if args.rates is None:
+        print(LoadGenerator.format(generator.run(args.duration, args.threads, args.rate, args.processes)))
+    else:
+        result = generator.ramp([float(rate) for rate in args.rates.split(',')], args.duration, args.threads,
+                                args.processes, args.p99_limit)
+        for report in result['steps']:
+            print(LoadGenerator.format(report))
+            print()
+        print(f'saturation at {result["saturation_rate"]:.1f}/s' if result['saturation_rate'] is not None
+              else 'no saturation up to the highest rate')
+    if args.processes == 1:
+        for lane, metrics in Solution.SCHEDULER.metrics().items():
+            print(f'{lane} lane: limit {metrics["limit"]}, admitted {metrics["admitted"]}, '
+                  f'rejected {metrics["rejected"]}, wait p99 {metrics["wait_p99"] * 1000:.1f} ms')
+        print('top queries by total time:')
+        for row in Solution.QUERY_LOG.stats(top=10)['fingerprints']:
+            print(f'  [{row["id"]}] {row["count"]:>7} calls {row["total"]:>8.2f} s total {row["max"] * 1000:>8.1f} ms max '
+                  f'{row["errors"]:>5} errors  {row["fingerprint"][:100]}')
+    Solution.drop_tables()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
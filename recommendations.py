@@ -0,0 +1,27 @@
+# Precompute the dish recommendations of every customer into Customer_Recommendations, e.g:
+#   python recommendations.py --processes 8
+#   python recommendations.py --resume        (continue a run that was interrupted)
+import argparse
+import sys
+
+import Solution
+from Utility.ReturnValue import ReturnValue
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Precompute the dish recommendations of every customer')
+    parser.add_argument('--processes', type=int, default=None, help='size of the process pool (default: CPUs)')
+    parser.add_argument('--resume', action='store_true', help='continue the previous run instead of starting over')
+    args = parser.parse_args()
+
+    def progress(done: int, total: int):
+        print(f'\r{done}/{total} customers', end='', file=sys.stderr, flush=True)
+
+    result = Solution.precompute_recommendations(args.processes, args.resume, progress)
+    print(file=sys.stderr)
+    print(f'precompute_recommendations: {result.name}')
+    return 0 if result == ReturnValue.OK else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+# Export / restore all the tables through COPY, e.g:
+#   python snapshot.py export /backups/yummy --format csv
+#   python snapshot.py restore /backups/yummy
+import argparse
+import sys
+
+import Solution
+from Utility.ReturnValue import ReturnValue
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Snapshot and restore the Yummy tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='write a snapshot of all the tables')
+    export_parser.add_argument('path', help='snapshot directory')
+    export_parser.add_argument('--format', choices=list(Solution.SNAPSHOT_FORMATS), default='binary')
+
+    restore_parser = commands.add_parser('restore', help='replace all the tables with a snapshot')
+    restore_parser.add_argument('path', help='snapshot directory')
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        result = Solution.export_snapshot(args.path, args.format)
+    else:
+        result = Solution.restore_snapshot(args.path)
+
+    print(f'{args.command}: {result.name}')
+    return 0 if result == ReturnValue.OK else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
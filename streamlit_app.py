@@ -5,6 +5,7 @@ from streamlit import columns
 
 from Solution import *
 from Business.Customer import Customer
+from Utility.TablePager import TablePager, BROWSABLE, OPERATORS
 from datetime import datetime
 import psycopg2
 
@@ -16,6 +17,63 @@ DB_PARAMS = {
     "port": 5432
 }
 
+PAGE_SIZES = [25, 100, 500]
+
+
+def get_connection() -> Connector.DBConnector:
+    # one connection per browser session, kept in the session state and reused by every rerun of the script
+    if st.session_state.get("db_conn") is None:
+        st.session_state.db_conn = Connector.DBConnector(read_only=True)
+    return st.session_state.db_conn
+
+
+def close_connection():
+    conn = st.session_state.pop("db_conn", None)
+    if conn is not None:
+        conn.close()
+    st.session_state.pop("pager", None)
+    st.session_state.pop("pager_settings", None)
+
+
+def table_viewer():
+    table = st.selectbox("Table", list(BROWSABLE))
+    columns, _ = BROWSABLE[table]
+    sort_column, direction, size_column = st.columns(3)
+    sort = sort_column.selectbox("Sort by", columns)
+    descending = direction.selectbox("Order", ["Ascending", "Descending"]) == "Descending"
+    page_size = size_column.selectbox("Rows per page", PAGE_SIZES)
+    filter_column, filter_operator, filter_value = st.columns(3)
+    column = filter_column.selectbox("Filter column", columns)
+    operator = filter_operator.selectbox("Filter", list(OPERATORS))
+    value = filter_value.text_input("Value")
+    filters = [(column, operator, value)] if value else []
+
+    # the pager (and the pages visited with it) lives as long as its settings do
+    settings = (table, sort, descending, page_size, tuple(filters))
+    if st.session_state.get("pager_settings") != settings:
+        st.session_state.pager = TablePager(get_connection(), table, page_size, sort, descending, filters)
+        st.session_state.pager_settings = settings
+    pager = st.session_state.pager
+
+    try:
+        rows = pager.page()
+        estimate = pager.estimate()
+    except DatabaseException.ConnectionInvalid:
+        close_connection()
+        st.error("Lost the connection to the database, reload to reconnect.")
+        return
+    except Exception as e:
+        pager.conn.rollback()
+        st.error(f"Could not read {table}: {e}")
+        return
+
+    previous_button, page_info, next_button = st.columns(3)
+    # the callbacks move the pager before the rerun they trigger, so the page shown is the new one
+    previous_button.button("Previous", on_click=pager.previous, disabled=not pager.has_previous())
+    page_info.write(f"Page {pager.page_number} of about {max(-(-estimate // page_size), 1)} (~{estimate} rows)")
+    next_button.button("Next", on_click=pager.next, disabled=not pager.has_next())
+    st.dataframe(pd.DataFrame(rows, columns=columns))
+
 
 def main():
     st.title("Yummify")
@@ -24,6 +82,7 @@ def main():
         st.session_state.db_initialized = False
 
     if st.button("Initialize Database (Drop/Create)"):
+        close_connection()
         drop_tables()
         create_tables()
         st.session_state.db_initialized = True
@@ -138,21 +197,11 @@ def main():
                     st.error("An unexpected error occurred.")
 
     elif action == "Visualize Tables":
-        st.subheader("Customers")
-        res = Connector.DBConnector().execute("SELECT * FROM customers")[1]
-        st.dataframe(pd.DataFrame(res.rows, columns=['Customer ID', 'Customer Name', 'Customer Age', 'Customer Phone Number']))
-
-        st.subheader("Orders")
-        res = Connector.DBConnector().execute("SELECT * FROM orders")[1]
-        st.dataframe(pd.DataFrame(res.rows, columns=['Order ID', 'Order Date', 'Order Address', 'Order Delivery Fee']))
-
-        st.subheader("Dishes")
-        res = Connector.DBConnector().execute("SELECT * FROM dishes")[1]
-        st.dataframe(pd.DataFrame(res.rows, columns=['Dish ID', 'Dish Name', 'Dish Price', 'Is Active?']))
+        table_viewer()
 
 
     elif action == "Total Price of Every Order": 
-        res = Connector.DBConnector().execute("SELECT * FROM orders")[1]
+        res = get_connection().execute("SELECT * FROM orders")[1]
         df = []
         for row in res.rows:
             currOrderID = row[0]
@@ -175,7 +224,7 @@ def main():
 
 
     elif action == "Dishes ordered":
-        res = Connector.DBConnector().execute("SELECT * FROM orders")[1]
+        res = get_connection().execute("SELECT * FROM orders")[1]
         allOrderedDishes = []
         for row in res.rows:
             currOrderDishList = get_all_order_items(row[0])